@@ -0,0 +1,179 @@
+"""
+ABC (Pareto) classification of products
+
+Products are ranked by revenue and, separately, by gross profit over a
+period. Class A holds the products that together make the first
+``ABC_THRESHOLDS[0]`` percent of the total, B the next ones up to
+``ABC_THRESHOLDS[1]`` percent, and C the rest, including products that did
+not sell or lost money.
+
+Per-product totals come from one aggregate query (sale items of completed
+sales grouped by product, outer joined to every product so non-sellers are
+ranked too); ranking, shares and cumulative shares are computed over the
+whole result with NumPy. Results are cached with the other reports.
+"""
+import numpy as np
+from flask import current_app
+
+from extensions import db
+from models import Product, Sale, SaleItem, Supplier
+from report_cache import cached_report
+from report_exports import completed_sales_between
+
+CLASSES = ('A', 'B', 'C')
+
+ABC_EXPORT_HEADER = [
+    'Rank', 'SKU', 'Name', 'Category', 'Supplier', 'Units Sold', 'Revenue', 'Revenue Share %',
+    'Cumulative Revenue %', 'Revenue Class', 'Gross Profit', 'Profit Share %', 'Profit Class'
+]
+
+
+def _totals_query(start=None, end=None, category=None, supplier_id=None):
+    """Units, revenue and gross profit per product, zero for products without sales."""
+    unit_cost = db.func.coalesce(SaleItem.unit_cost, Product.cost_price, 0)
+    sold = completed_sales_between(
+        db.session.query(
+            SaleItem.product_id.label('product_id'),
+            db.func.sum(SaleItem.quantity).label('units'),
+            db.func.sum(SaleItem.total_price).label('revenue'),
+            db.func.sum(SaleItem.total_price - SaleItem.quantity * unit_cost).label('gross_profit')
+        ).join(Sale, Sale.id == SaleItem.sale_id).join(Product, Product.id == SaleItem.product_id),
+        start, end
+    ).group_by(SaleItem.product_id).subquery()
+
+    query = db.session.query(
+        Product.id,
+        Product.sku,
+        Product.name,
+        Product.category,
+        Supplier.name,
+        db.func.coalesce(sold.c.units, 0),
+        db.func.coalesce(sold.c.revenue, 0.0),
+        db.func.coalesce(sold.c.gross_profit, 0.0)
+    ).outerjoin(sold, sold.c.product_id == Product.id).outerjoin(Supplier, Supplier.id == Product.supplier_id)
+
+    if category:
+        query = query.filter(Product.category == category)
+    if supplier_id:
+        query = query.filter(Product.supplier_id == supplier_id)
+    return query
+
+
+def classify(values, thresholds=(80, 95)):
+    """
+    ABC class, share and cumulative share of each value.
+
+    Values are ranked largest first; a product is in A while the share of
+    the total made by the products ranked above it is below the first
+    threshold, so the product that crosses it is still A. Values of zero or
+    less are always C.
+
+    Returns:
+        tuple: (order, classes, shares, cumulative) where order ranks the
+        input and the other arrays follow the input order (shares in percent)
+    """
+    values = np.asarray(values, dtype=float)
+    positive = np.where(values > 0, values, 0.0)
+    total = positive.sum()
+
+    order = np.lexsort((np.arange(len(values)), -values))
+    shares = positive / total * 100 if total else np.zeros(len(values))
+    cumulative = np.empty(len(values))
+    cumulative[order] = np.cumsum(shares[order])
+    before = cumulative - shares
+
+    classes = np.full(len(values), 'C', dtype='<U1')
+    classes[(before < thresholds[1]) & (positive > 0)] = 'B'
+    classes[(before < thresholds[0]) & (positive > 0)] = 'A'
+    return order, classes, shares, cumulative
+
+
+def compute_abc(start=None, end=None, category=None, supplier_id=None):
+    """
+    ABC classification of products by revenue and by gross profit.
+
+    Args:
+        start, end: naive UTC range [start, end) of completed sales
+        category: only products in this category
+        supplier_id: only products from this supplier
+
+    Returns:
+        dict: products (dicts in revenue rank order) and summary (per class
+        product count and share of products, revenue and gross profit)
+    """
+    rows = _totals_query(start, end, category, supplier_id).all()
+    thresholds = tuple(current_app.config.get('ABC_THRESHOLDS', (80, 95)))
+    if not rows:
+        return {'products': [], 'summary': [], 'thresholds': thresholds}
+
+    ids, skus, names, categories, suppliers, units, revenue, profit = (list(column) for column in zip(*rows))
+    revenue = np.array(revenue, dtype=float)
+    profit = np.array(profit, dtype=float)
+
+    order, revenue_class, revenue_share, revenue_cumulative = classify(revenue, thresholds)
+    _, profit_class, profit_share, _ = classify(profit, thresholds)
+
+    products = [
+        {
+            'rank': rank,
+            'product_id': ids[i],
+            'sku': skus[i],
+            'name': names[i],
+            'category': categories[i],
+            'supplier': suppliers[i],
+            'units': int(units[i]),
+            'revenue': float(revenue[i]),
+            'revenue_share': float(revenue_share[i]),
+            'cumulative_share': float(revenue_cumulative[i]),
+            'revenue_class': str(revenue_class[i]),
+            'gross_profit': float(profit[i]),
+            'profit_share': float(profit_share[i]),
+            'profit_class': str(profit_class[i])
+        }
+        for rank, i in enumerate(order.tolist(), start=1)
+    ]
+
+    count = len(rows)
+    total_revenue = max(revenue[revenue > 0].sum(), 0)
+    total_profit = max(profit[profit > 0].sum(), 0)
+    summary = []
+    for name in CLASSES:
+        by_revenue = revenue_class == name
+        by_profit = profit_class == name
+        summary.append({
+            'class': name,
+            'products': int(by_revenue.sum()),
+            'product_share': float(by_revenue.sum() / count * 100),
+            'revenue_share': float(revenue[by_revenue & (revenue > 0)].sum() / total_revenue * 100) if total_revenue else 0.0,
+            'profit_products': int(by_profit.sum()),
+            'profit_share': float(profit[by_profit & (profit > 0)].sum() / total_profit * 100) if total_profit else 0.0
+        })
+    return {'products': products, 'summary': summary, 'thresholds': thresholds}
+
+
+def abc_report(start=None, end=None, category=None, supplier_id=None):
+    """compute_abc through the report cache."""
+    return cached_report(
+        'abc', (start, end, category, supplier_id),
+        lambda: compute_abc(start, end, category, supplier_id)
+    )
+
+
+def abc_export_rows(report):
+    """A report's products as ABC_EXPORT_HEADER rows."""
+    for product in report['products']:
+        yield (
+            product['rank'],
+            product['sku'],
+            product['name'],
+            product['category'] or 'N/A',
+            product['supplier'] or 'N/A',
+            product['units'],
+            round(product['revenue'], 2),
+            round(product['revenue_share'], 2),
+            round(product['cumulative_share'], 2),
+            product['revenue_class'],
+            round(product['gross_profit'], 2),
+            round(product['profit_share'], 2),
+            product['profit_class']
+        )
@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from extensions import db
-from models import User, Product, Sale, Customer, Supplier, UserActivityLog
+from models import User, Product, ProductForecast, Sale, Customer, Supplier, UserActivityLog
+from demand_forecast import low_stock_query
+from sales_rollup import summary_totals, business_today
+from sales_timeseries import sales_series
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
 from functools import wraps
@@ -24,32 +27,26 @@ def dashboard():
     # Get dashboard statistics
     total_users = User.query.count()
     total_products = Product.query.count()
-    total_sales = Sale.query.filter_by(status='completed').count()
+    total_sales, _ = summary_totals()
     total_customers = Customer.query.count()
     
     # Recent sales (increased limit for better scrolling experience)
     recent_sales = Sale.query.filter_by(status='completed').order_by(Sale.created_at.desc()).limit(15).all()
     
-    # Low stock products
-    low_stock_products = Product.query.filter(
-        Product.stock_quantity <= Product.low_stock_threshold
+    # Low stock products, soonest to run out first
+    low_stock_products = low_stock_query().order_by(
+        ProductForecast.days_of_cover.is_(None), ProductForecast.days_of_cover, Product.stock_quantity
     ).limit(5).all()
     
     # Recent user activities
     recent_activities = UserActivityLog.query.order_by(UserActivityLog.timestamp.desc()).limit(20).all()
     
     # Sales chart data (last 7 days)
-    sales_data = []
-    for i in range(7):
-        date = datetime.now() - timedelta(days=i)
-        daily_sales = Sale.query.filter(
-            Sale.created_at >= date.replace(hour=0, minute=0, second=0),
-            Sale.created_at < date.replace(hour=23, minute=59, second=59),
-            Sale.status == 'completed'
-        ).count()
-        sales_data.append({'date': date.strftime('%m/%d'), 'sales': daily_sales})
-    
-    sales_data.reverse()
+    today = business_today()
+    sales_data = [
+        {'date': point['bucket'].strftime('%m/%d'), 'sales': point['count']}
+        for point in sales_series(today - timedelta(days=6), today, 'day')
+    ]
     
     # Ensure we have at least some data for the chart
     if not sales_data or all(item['sales'] == 0 for item in sales_data):
@@ -44,6 +44,38 @@ app.register_blueprint(suppliers_bp, url_prefix='/suppliers')
 app.register_blueprint(reports_bp, url_prefix='/reports')
 app.register_blueprint(settings_bp, url_prefix='/settings')
 
+# Background email sender
+from email_outbox import init_email_outbox
+init_email_outbox(app)
+
+# Idempotency keys for form resubmits
+from idempotency import init_idempotency
+init_idempotency(app)
+
+# Daily sales rollup rebuild command
+from sales_rollup import init_sales_rollup
+init_sales_rollup(app)
+
+# Background report workers
+from report_jobs import init_report_jobs
+init_report_jobs(app)
+
+# Columnar sales snapshot export command
+from sales_snapshot import init_sales_snapshot
+init_sales_snapshot(app)
+
+# Demand forecast command
+from demand_forecast import init_demand_forecast
+init_demand_forecast(app)
+
+# Basket analysis command
+from basket_analysis import init_basket_analysis
+init_basket_analysis(app)
+
+# Query plan check for the hot query paths
+from query_plans import init_query_plans
+init_query_plans(app)
+
 # Import models after db initialization
 from models import User, Product, Sale, Customer, Supplier, BusinessSettings
 
@@ -0,0 +1,355 @@
+"""
+Market-basket analysis: products frequently bought together
+
+Mines frequent product pairs and triples from the columnar sales snapshot
+(sale items are stored contiguously per sale) with an Apriori-style
+sequence of passes, each streaming the item columns in chunks cut on sale
+boundaries:
+
+1. count the baskets containing each product;
+2. count pairs of frequent products: within a chunk sorted by (sale,
+   product), every pair is an element and the one ``offset`` places after
+   it in the same sale, so pairs are generated for whole chunks at once and
+   tallied as sparse integer keys with ``np.unique``;
+3. count triples whose three sub-pairs are all frequent, the same way with
+   two offsets.
+
+From the counts come association rules (A -> B and A, B -> C) with
+support, confidence and lift. Results are written to ``baskets.json`` in
+the snapshot directory and served from memory until the next run.
+
+Run ``flask analyze-baskets`` from cron, or let the report workers rerun
+it every ``BASKET_ANALYSIS_INTERVAL`` seconds.
+"""
+import json
+import math
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+
+from extensions import db
+from models import Product
+from sales_analytics import epoch_bounds, load_snapshot
+from sales_rollup import business_today
+from sales_snapshot import refresh_snapshot, snapshot_dir
+
+CHUNK_ITEMS = 1_000_000  # item rows per pass step
+# Combinations are only formed between a sale's first this many candidate
+# products (in id order), the rest of the basket is ignored; larger baskets
+# are rare and would dominate the work, triples growing with the square of
+# the basket size
+MAX_PAIR_BASKET_ITEMS = 100
+MAX_TRIPLE_BASKET_ITEMS = 30
+
+_results = {}  # path -> (mtime, results)
+_last_attempt = None  # time.monotonic() of this process's last scheduled run
+
+
+def _results_path():
+    return os.path.join(snapshot_dir(), 'baskets.json')
+
+
+def _chunks(snapshot, start, end):
+    """(sale_id, product_id) arrays of completed sales' distinct items, a few sales at a time."""
+    items = snapshot.items
+    total = len(items['sale_id'])
+    position = 0
+    while position < total:
+        stop = min(position + CHUNK_ITEMS, total)
+        if stop < total:
+            # Do not split a sale across chunks
+            sale_ids = items['sale_id'][position:stop + 1]
+            boundaries = np.flatnonzero(sale_ids[1:] != sale_ids[:-1])
+            if len(boundaries):
+                stop = position + boundaries[-1] + 1
+
+        sale_id = np.asarray(items['sale_id'][position:stop])
+        product_id = np.asarray(items['product_id'][position:stop]).astype(np.int64)
+        created_at = items['created_at'][position:stop]
+        mask = ~np.isin(sale_id, snapshot.refunded) & (product_id >= 0)
+        if start is not None:
+            mask &= created_at >= start
+        if end is not None:
+            mask &= created_at < end
+        position = stop
+
+        if mask.any():
+            # Sort by sale then product, and count a product once per sale
+            pairs = np.unique(np.stack([sale_id[mask], product_id[mask]], axis=1), axis=0)
+            yield pairs[:, 0], pairs[:, 1]
+
+
+def _tally(keys, counts, new_keys):
+    """Merge occurrences of new_keys into sorted (keys, counts)."""
+    if not len(new_keys):
+        return keys, counts
+    new_keys, new_counts = np.unique(new_keys, return_counts=True)
+    merged, inverse = np.unique(np.concatenate([keys, new_keys]), return_inverse=True)
+    return merged, np.bincount(inverse, weights=np.concatenate([counts, new_counts])).astype(np.int64)
+
+
+def _basket_lengths(sale_ids):
+    """Number of items in each basket of a sale-sorted chunk."""
+    starts = np.flatnonzero(np.concatenate(([True], sale_ids[1:] != sale_ids[:-1])))
+    return np.diff(np.append(starts, len(sale_ids)))
+
+
+def _offset_combinations(sale_ids, codes, size):
+    """
+    Sorted code combinations of ``size`` products bought in the same sale.
+
+    Baskets are sorted by code, so combining each element with the ones
+    ``offset`` places after it (still in the same sale) enumerates every
+    combination exactly once, in ascending code order. Baskets are first cut
+    to their lowest ``MAX_*_BASKET_ITEMS`` codes.
+    """
+    cap = MAX_PAIR_BASKET_ITEMS if size == 2 else MAX_TRIPLE_BASKET_ITEMS
+    lengths = _basket_lengths(sale_ids)
+    if len(lengths) and lengths.max() > cap:
+        # Position of each element within its basket
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        keep = np.arange(len(sale_ids)) - starts < cap
+        sale_ids, codes = sale_ids[keep], codes[keep]
+        lengths = np.minimum(lengths, cap)
+    longest = int(lengths.max()) if len(lengths) else 0
+    combos = []
+    if size == 2:
+        for offset in range(1, longest):
+            same = sale_ids[:-offset] == sale_ids[offset:]
+            combos.append(np.stack([codes[:-offset][same], codes[offset:][same]], axis=1))
+    else:
+        for first in range(1, longest - 1):
+            for second in range(first + 1, longest):
+                same = sale_ids[:-second] == sale_ids[second:]
+                middle = codes[first:len(codes) - second + first]
+                combos.append(np.stack([codes[:-second][same], middle[same], codes[second:][same]], axis=1))
+    if not combos:
+        return np.empty((0, size), dtype=np.int64)
+    return np.concatenate(combos)
+
+
+def mine_baskets(start_day=None, end_day=None, min_support=0.005, min_confidence=0.1, max_rules=500, snapshot=None):
+    """
+    Frequent pairs and triples and the rules they support.
+
+    Args:
+        start_day, end_day: optional business days (inclusive)
+        min_support: share of baskets an itemset must appear in
+        min_confidence: minimum confidence of a reported rule
+        max_rules: keep only this many rules, highest lift first
+        snapshot: defaults to load_snapshot()
+
+    Returns:
+        dict: baskets (number of sales), items (product_id -> basket count),
+        itemsets (products, count, support) and rules (antecedent,
+        consequent, support, confidence, lift)
+    """
+    snapshot = snapshot or load_snapshot()
+    start, end = epoch_bounds(start_day, end_day)
+
+    # Pass 1: baskets per product
+    baskets = 0
+    products = np.empty(0, dtype=np.int64)
+    product_counts = np.empty(0, dtype=np.int64)
+    for sale_ids, product_ids in _chunks(snapshot, start, end):
+        baskets += len(np.unique(sale_ids))
+        products, product_counts = _tally(products, product_counts, product_ids)
+    if not baskets:
+        return {'baskets': 0, 'items': {}, 'itemsets': [], 'rules': []}
+
+    min_count = max(2, math.ceil(min_support * baskets))
+    frequent = products[product_counts >= min_count]
+    support_of = dict(zip(products.tolist(), product_counts.tolist()))
+    width = len(frequent)  # codes are positions in `frequent`
+
+    # Pass 2: pairs of frequent products, keyed a * width + b
+    pair_keys = np.empty(0, dtype=np.int64)
+    pair_counts = np.empty(0, dtype=np.int64)
+    for sale_ids, product_ids in _chunks(snapshot, start, end):
+        keep = np.isin(product_ids, frequent)
+        sale_ids, codes = sale_ids[keep], np.searchsorted(frequent, product_ids[keep])
+        pairs = _offset_combinations(sale_ids, codes, 2)
+        pair_keys, pair_counts = _tally(pair_keys, pair_counts, pairs[:, 0] * width + pairs[:, 1])
+    keep = pair_counts >= min_count
+    frequent_pairs = pair_keys[keep]
+    pair_count_of = dict(zip(frequent_pairs.tolist(), pair_counts[keep].tolist()))
+
+    # Pass 3: triples whose sub-pairs are all frequent, keyed (a * width + b) * width + c
+    triple_keys = np.empty(0, dtype=np.int64)
+    triple_counts = np.empty(0, dtype=np.int64)
+    in_pairs = np.unique(np.concatenate([frequent_pairs // width, frequent_pairs % width])) if len(frequent_pairs) else []
+    if len(in_pairs) >= 3:
+        for sale_ids, product_ids in _chunks(snapshot, start, end):
+            codes = np.searchsorted(frequent, product_ids)
+            keep = np.isin(product_ids, frequent)
+            keep[keep] = np.isin(codes[keep], in_pairs)
+            sale_ids, codes = sale_ids[keep], codes[keep]
+            triples = _offset_combinations(sale_ids, codes, 3)
+            if not len(triples):
+                continue
+            a, b, c = triples[:, 0], triples[:, 1], triples[:, 2]
+            candidate = (np.isin(a * width + b, frequent_pairs) & np.isin(a * width + c, frequent_pairs)
+                         & np.isin(b * width + c, frequent_pairs))
+            keys = ((a * width + b) * width + c)[candidate]
+            triple_keys, triple_counts = _tally(triple_keys, triple_counts, keys)
+    keep = triple_counts >= min_count
+    triple_keys, triple_counts = triple_keys[keep], triple_counts[keep]
+
+    # Itemsets and rules
+    def product(code):
+        return int(frequent[code])
+
+    itemsets = []
+    rules = []
+
+    def add_rule(antecedent, consequent, count, antecedent_count):
+        confidence = count / antecedent_count
+        if confidence < min_confidence:
+            return
+        rules.append({
+            'antecedent': antecedent,
+            'consequent': consequent,
+            'support': count / baskets,
+            'confidence': confidence,
+            'lift': confidence / (support_of[consequent] / baskets)
+        })
+
+    for key, count in pair_count_of.items():
+        a, b = product(key // width), product(key % width)
+        itemsets.append({'products': [a, b], 'count': count, 'support': count / baskets})
+        add_rule([a], b, count, support_of[a])
+        add_rule([b], a, count, support_of[b])
+
+    for key, count in zip(triple_keys.tolist(), triple_counts.tolist()):
+        codes = (key // (width * width), key // width % width, key % width)
+        a, b, c = (product(code) for code in codes)
+        itemsets.append({'products': [a, b, c], 'count': count, 'support': count / baskets})
+        for (x, y), z, pair in (((a, b), c, codes[0] * width + codes[1]),
+                                ((a, c), b, codes[0] * width + codes[2]),
+                                ((b, c), a, codes[1] * width + codes[2])):
+            add_rule([x, y], z, count, pair_count_of[pair])
+
+    itemsets.sort(key=lambda itemset: (-itemset['count'], itemset['products']))
+    rules.sort(key=lambda rule: (-rule['lift'], -rule['confidence'], rule['antecedent'], rule['consequent']))
+    return {
+        'baskets': baskets,
+        'items': {str(product_id): count for product_id, count in support_of.items() if count >= min_count},
+        'itemsets': itemsets,
+        'rules': rules[:max_rules]
+    }
+
+
+def run_basket_analysis(refresh=True):
+    """
+    Mine the last BASKET_HISTORY_DAYS of sales and publish the results.
+
+    Returns:
+        dict: the results, as written to baskets.json
+    """
+    config = current_app.config
+    if refresh:
+        refresh_snapshot()
+    end_day = business_today()
+    start_day = end_day - timedelta(days=config.get('BASKET_HISTORY_DAYS', 90) - 1)
+
+    results = mine_baskets(
+        start_day, end_day,
+        min_support=config.get('BASKET_MIN_SUPPORT', 0.005),
+        min_confidence=config.get('BASKET_MIN_CONFIDENCE', 0.1),
+        max_rules=config.get('BASKET_MAX_RULES', 500)
+    )
+    results.update({
+        'start_date': start_day.isoformat(),
+        'end_date': end_day.isoformat(),
+        'computed_at': datetime.utcnow().isoformat()
+    })
+
+    path = _results_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(results, f)
+    os.replace(tmp_path, path)
+    db.session.commit()  # end the read transactions
+    return results
+
+
+def basket_results():
+    """Latest published results, or None before the first run."""
+    path = _results_path()
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _results.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        results = json.load(f)
+    _results[path] = (mtime, results)
+    return results
+
+
+def named_rules(results, product_id=None, size=None, limit=100):
+    """
+    Rules with product names, optionally only those involving one product.
+
+    Args:
+        results: basket_results()
+        product_id: keep rules mentioning this product
+        size: 2 for pair rules (A -> B), 3 for triple rules (A, B -> C)
+        limit: maximum number of rules returned
+    """
+    rules = results['rules'] if results else []
+    if product_id:
+        rules = [rule for rule in rules if product_id in rule['antecedent'] or rule['consequent'] == product_id]
+    if size:
+        rules = [rule for rule in rules if len(rule['antecedent']) == size - 1]
+    rules = rules[:limit]
+
+    product_ids = {rule['consequent'] for rule in rules}
+    product_ids.update(product_id for rule in rules for product_id in rule['antecedent'])
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_(product_ids))) if product_ids else {}
+    return [
+        dict(rule,
+             antecedent_names=[names.get(product_id, f'#{product_id}') for product_id in rule['antecedent']],
+             consequent_name=names.get(rule['consequent'], f"#{rule['consequent']}"))
+        for rule in rules
+    ]
+
+
+def maybe_run_basket_analysis():
+    """
+    Rerun if the published results are older than BASKET_ANALYSIS_INTERVAL.
+
+    A process also waits that long after its own last attempt, so a failing
+    run is not retried on every poll.
+    """
+    global _last_attempt
+    interval = current_app.config.get('BASKET_ANALYSIS_INTERVAL', 86400)
+    if interval <= 0:
+        return
+    if _last_attempt is not None and time.monotonic() - _last_attempt < interval:
+        return
+    path = _results_path()
+    if os.path.exists(path) and datetime.now().timestamp() - os.path.getmtime(path) < interval:
+        return
+    _last_attempt = time.monotonic()
+    try:
+        run_basket_analysis()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not run basket analysis: {str(e)}")
+
+
+def init_basket_analysis(app):
+    """Register the basket analysis command."""
+
+    @app.cli.command('analyze-baskets')
+    def analyze_baskets_command():
+        """Mine frequently bought together products from recent sales."""
+        results = run_basket_analysis()
+        print(f"Analysed {results['baskets']} sales: {len(results['itemsets'])} frequent itemsets, "
+              f"{len(results['rules'])} rules")
@@ -0,0 +1,281 @@
+"""
+Server-side cart storage for the POS System
+
+Carts are kept out of the signed session cookie. The cookie only carries a
+short terminal id; the cart itself lives in one of the backends below,
+selected with the ``CART_STORE`` config value:
+
+- ``memory``: in-process LRU (single worker / development)
+- ``database``: ``CartSession`` table, shared by all gunicorn workers
+- ``redis``: any Redis-compatible server at ``CART_STORE_REDIS_URL``
+
+A cart is an insertion-ordered dict of product_id -> cart line, so adding,
+updating and removing a line are plain dict operations. Lines are
+normalised on the way in, so product_id and quantity are always ints and
+price and total floats whatever the client sent.
+
+Database and Redis carts expire ``CART_STORE_TTL`` seconds after their last
+save; expired ``cart_session`` rows are purged by the workers that save
+carts.
+"""
+import json
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app, request, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+
+_last_purge = 0
+
+
+class MemoryCartStore:
+    """In-process LRU cart store."""
+
+    def __init__(self, max_carts=1024):
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, cart_id):
+        with self._lock:
+            cart = self._carts.get(cart_id)
+            if cart is None:
+                return {}
+            self._carts.move_to_end(cart_id)
+            return cart
+
+    def save(self, cart_id, cart):
+        with self._lock:
+            self._carts[cart_id] = cart
+            self._carts.move_to_end(cart_id)
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def delete(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+
+class DatabaseCartStore:
+    """Cart store backed by the ``cart_session`` table (SQLite or PostgreSQL)."""
+
+    def load(self, cart_id):
+        from models import CartSession
+        row = db.session.get(CartSession, cart_id)
+        if row is None or not row.items or row.updated_at < _expired_before():
+            return {}
+        return _from_lines(row.items)
+
+    def save(self, cart_id, cart):
+        """Insert or replace the cart; two first saves of one cart may race."""
+        from models import CartSession
+        values = {'id': cart_id, 'user_id': _user_id(), 'items': to_lines(cart), 'updated_at': datetime.utcnow()}
+        table = CartSession.__table__
+
+        dialect = db.engine.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).values(**values)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['id'],
+                set_={'items': stmt.excluded['items'], 'updated_at': stmt.excluded.updated_at}
+            ))
+        else:
+            update = (
+                db.update(table)
+                .where(table.c.id == cart_id)
+                .values(items=values['items'], updated_at=values['updated_at'])
+            )
+            if not db.session.execute(update).rowcount:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(db.insert(table), [values])
+                except IntegrityError:
+                    db.session.execute(update)
+        db.session.commit()
+        _maybe_purge()
+
+    def delete(self, cart_id):
+        from models import CartSession
+        CartSession.query.filter_by(id=cart_id).delete()
+        db.session.commit()
+
+
+class RedisCartStore:
+    """Cart store for any Redis-compatible server."""
+
+    def __init__(self, url, ttl=86400):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CART_STORE='redis' requires the 'redis' package to be installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _key(self, cart_id):
+        return f'pos:cart:{cart_id}'
+
+    def load(self, cart_id):
+        data = self.client.get(self._key(cart_id))
+        if not data:
+            return {}
+        return _from_lines(json.loads(data))
+
+    def save(self, cart_id, cart):
+        self.client.set(self._key(cart_id), json.dumps(to_lines(cart)), ex=self.ttl)
+
+    def delete(self, cart_id):
+        self.client.delete(self._key(cart_id))
+
+
+def to_lines(cart):
+    """Convert a cart dict to the list of lines used by templates and the API."""
+    return list(cart.values())
+
+
+def _normalise_line(line):
+    """
+    Copy of a cart line with typed product_id, quantity, price and total.
+
+    Raises:
+        KeyError, TypeError, ValueError: if the line is malformed
+    """
+    line = dict(line)
+    line['product_id'] = int(line['product_id'])
+    line['quantity'] = int(line['quantity'])
+    line['price'] = float(line['price'])
+    if line['quantity'] <= 0 or not math.isfinite(line['price']) or line['price'] < 0:
+        raise ValueError('Invalid cart line')
+    line['total'] = line['price'] * line['quantity']
+    return line
+
+
+def _from_lines(lines, strict=False):
+    """
+    Cart dict from a list of lines.
+
+    Malformed lines are dropped, or raise ValueError when ``strict``.
+    """
+    cart = {}
+    for line in lines or []:
+        try:
+            line = _normalise_line(line)
+        except (KeyError, TypeError, ValueError):
+            if strict:
+                raise ValueError('Invalid cart line')
+            continue
+        cart[line['product_id']] = line
+    return cart
+
+
+def _expired_before():
+    return datetime.utcnow() - timedelta(seconds=current_app.config.get('CART_STORE_TTL', 86400))
+
+
+def purge_expired_carts():
+    """Delete database carts not saved within CART_STORE_TTL. Returns the number removed."""
+    from models import CartSession
+    result = db.session.execute(
+        db.delete(CartSession)
+        .where(CartSession.updated_at < _expired_before())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _maybe_purge():
+    # At most once per interval per worker
+    global _last_purge
+    interval = current_app.config.get('CART_STORE_PURGE_INTERVAL', 3600)
+    if time.monotonic() - _last_purge < interval:
+        return
+    _last_purge = time.monotonic()
+    try:
+        purge_expired_carts()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not purge expired carts: {str(e)}")
+
+
+def _user_id():
+    return current_user.id if current_user and current_user.is_authenticated else None
+
+
+def get_cart_store():
+    """Return the configured cart store, creating it once per application."""
+    store = current_app.extensions.get('cart_store')
+    if store is None:
+        backend = current_app.config.get('CART_STORE', 'database')
+        if backend == 'memory':
+            store = MemoryCartStore(current_app.config.get('CART_STORE_MAX_CARTS', 1024))
+        elif backend == 'redis':
+            store = RedisCartStore(
+                current_app.config.get('CART_STORE_REDIS_URL', 'redis://localhost:6379/0'),
+                current_app.config.get('CART_STORE_TTL', 86400)
+            )
+        elif backend == 'database':
+            store = DatabaseCartStore()
+        else:
+            raise RuntimeError(f'Unknown CART_STORE backend: {backend}')
+        current_app.extensions['cart_store'] = store
+    return store
+
+
+def current_cart_id():
+    """
+    Cart id for the current user and terminal.
+
+    Terminals can identify themselves with an ``X-Terminal-Id`` header;
+    otherwise a short random id is kept in the session cookie.
+    """
+    terminal_id = request.headers.get('X-Terminal-Id')
+    if not terminal_id:
+        terminal_id = session.get('terminal_id')
+        if not terminal_id:
+            terminal_id = uuid.uuid4().hex[:12]
+            session['terminal_id'] = terminal_id
+    return f'{_user_id()}:{terminal_id}'
+
+
+def load_cart():
+    """Load the current terminal's cart as a product_id -> line dict."""
+    return get_cart_store().load(current_cart_id())
+
+
+def save_cart(cart):
+    """Persist the current terminal's cart; an empty cart is deleted."""
+    if cart:
+        get_cart_store().save(current_cart_id(), cart)
+    else:
+        clear_cart()
+
+
+def clear_cart():
+    """Remove the current terminal's cart."""
+    get_cart_store().delete(current_cart_id())
+
+
+def get_cart_lines():
+    """Current terminal's cart as a list of lines."""
+    return to_lines(load_cart())
+
+
+def set_cart_lines(lines):
+    """
+    Replace the current terminal's cart with the given lines.
+
+    Raises:
+        ValueError: if a line is malformed
+    """
+    save_cart(_from_lines(lines, strict=True))
@@ -0,0 +1,110 @@
+"""
+Catalog delta sync for POS terminals
+
+Terminals keep a local copy of the catalog and ask only for what changed
+since their last cursor. Changes come from ``Product.updated_at`` (bumped
+on every ORM and Core update, including checkout stock decrements) and
+deletions from ``ProductTombstone`` rows.
+
+The cursor is ``<microseconds since epoch>-<product id>`` of the last
+change returned. Both streams are read in (timestamp, product id) order so
+the cursor only ever moves forward. Changes newer than
+``CATALOG_SYNC_LAG_SECONDS`` are held back until the next poll, giving
+transactions that stamped an earlier time but committed later a chance to
+become visible before the cursor passes them.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from models import Product, ProductTombstone
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a sync cursor cannot be parsed."""
+
+
+def encode_cursor(timestamp, product_id):
+    micros = (timestamp - EPOCH) // timedelta(microseconds=1)
+    return f'{micros}-{product_id}'
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (timestamp, product_id), or (None, 0) for a full sync
+    """
+    if not cursor:
+        return None, 0
+    try:
+        micros, product_id = cursor.split('-', 1)
+        return EPOCH + timedelta(microseconds=int(micros)), int(product_id)
+    except (ValueError, OverflowError):
+        raise InvalidCursor(f'Invalid cursor: {cursor}')
+
+
+def _after(column, id_column, timestamp, product_id):
+    if timestamp is None:
+        return db.true()
+    return db.or_(
+        column > timestamp,
+        db.and_(column == timestamp, id_column > product_id)
+    )
+
+
+def catalog_changes(cursor=None, limit=500):
+    """
+    Products changed and deleted after the cursor.
+
+    Returns:
+        dict: products (changed rows), deleted (product ids), cursor (pass
+        back on the next call) and has_more (another page is ready now)
+    """
+    timestamp, product_id = decode_cursor(cursor)
+    lag = current_app.config.get('CATALOG_SYNC_LAG_SECONDS', 2)
+    horizon = datetime.utcnow() - timedelta(seconds=lag)
+
+    products = Product.query.filter(
+        _after(Product.updated_at, Product.id, timestamp, product_id),
+        Product.updated_at <= horizon
+    ).order_by(Product.updated_at, Product.id).limit(limit + 1).all()
+
+    tombstones = ProductTombstone.query.filter(
+        _after(ProductTombstone.deleted_at, ProductTombstone.product_id, timestamp, product_id),
+        ProductTombstone.deleted_at <= horizon
+    ).order_by(ProductTombstone.deleted_at, ProductTombstone.product_id).limit(limit + 1).all()
+
+    # Merge both streams in cursor order and keep the first page
+    events = sorted(
+        [(p.updated_at, p.id, p) for p in products] +
+        [(t.deleted_at, t.product_id, None) for t in tombstones],
+        key=lambda event: (event[0], event[1])
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    if events:
+        cursor = encode_cursor(events[-1][0], events[-1][1])
+
+    return {
+        'products': [{
+            'id': product.id,
+            'name': product.name,
+            'sku': product.sku,
+            'barcode': product.barcode,
+            'category': product.category,
+            'price': product.price,
+            'stock': product.stock_quantity
+        } for _, _, product in events if product is not None],
+        'deleted': [event_id for _, event_id, product in events if product is None],
+        'cursor': cursor or '',
+        'has_more': has_more
+    }
+
+
+def record_product_deletion(product_id):
+    """Stage a tombstone for a deleted product in the current transaction."""
+    db.session.add(ProductTombstone(product_id=product_id))
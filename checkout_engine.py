@@ -0,0 +1,432 @@
+"""
+Checkout engine for the POS System
+"""
+import math
+from datetime import datetime, timezone
+
+from extensions import db
+from models import Customer, Product, Sale, SaleItem, Receipt, UserActivityLog
+from sales_rollup import record_sales
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be turned into a completed sale."""
+
+
+def _cart_quantities(cart):
+    """Collapse cart lines into {product_id: total quantity}."""
+    quantities = {}
+    for item in cart:
+        product_id = int(item['product_id'])
+        quantity = int(item['quantity'])
+        if quantity <= 0:
+            raise CheckoutError(f'Invalid quantity for {item.get("name", product_id)}')
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def lock_products(product_ids):
+    """
+    Load products with a single ``IN (...)`` query.
+
+    On PostgreSQL the rows are locked ``FOR UPDATE`` in id order so
+    concurrent terminals queue behind each other instead of deadlocking;
+    SQLite ignores the lock clause but serialises writers itself.
+
+    Returns:
+        dict: product_id -> Product
+    """
+    return {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(sorted(product_ids)))
+        .order_by(Product.id)
+        .with_for_update()
+        .all()
+    }
+
+
+def decrement_stock(quantities):
+    """
+    Take quantities from stock with one guarded ``UPDATE``.
+
+    The ``WHERE stock_quantity >= qty`` guard means a line that lost a race
+    leaves its row untouched, and the mismatch in affected rows refuses the
+    whole decrement.
+
+    Raises:
+        CheckoutError: if any product no longer has enough stock
+    """
+    product_ids = sorted(quantities)
+    requested = db.case(quantities, value=Product.id)
+    result = db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(product_ids), Product.stock_quantity >= requested)
+        .values(stock_quantity=Product.stock_quantity - requested)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(product_ids):
+        raise CheckoutError('Stock changed while processing the sale. Please try again.')
+
+
+def restock(quantities):
+    """Return quantities to stock with one atomic ``UPDATE``."""
+    if not quantities:
+        return
+    returned = db.case(quantities, value=Product.id)
+    db.session.execute(
+        db.update(Product)
+        .where(Product.id.in_(sorted(quantities)))
+        .values(stock_quantity=Product.stock_quantity + returned)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reserve_stock(quantities):
+    """
+    Lock the cart's products and decrement their stock.
+
+    Args:
+        quantities: dict of product_id -> quantity to take from stock
+
+    Returns:
+        dict: product_id -> Product for every product in the cart
+
+    Raises:
+        CheckoutError: if a product is missing or has insufficient stock
+    """
+    products = lock_products(quantities)
+
+    for product_id in sorted(quantities):
+        product = products.get(product_id)
+        if not product:
+            raise CheckoutError(f'Product not found: {product_id}')
+        if product.stock_quantity < quantities[product_id]:
+            raise CheckoutError(
+                f'Insufficient stock for {product.name}. '
+                f'Available: {product.stock_quantity}, Requested: {quantities[product_id]}'
+            )
+
+    decrement_stock(quantities)
+
+    # Keep the already loaded instances in step with the database
+    for product in products.values():
+        db.session.expire(product, ['stock_quantity', 'updated_at'])
+
+    return products
+
+
+def build_sale(cart, cashier_id, payment_method, customer_id=None, discount_amount=0.0):
+    """
+    Stage a completed sale for the given cart in the current transaction.
+
+    Nothing is committed here so callers can batch several sales into one
+    transaction; use ``process_checkout`` for the normal single-sale path.
+
+    Args:
+        cart: list of cart lines (product_id, name, price, quantity, total)
+        cashier_id: id of the user processing the sale
+        payment_method: one of the Sale.payment_method values
+        customer_id: optional customer id
+        discount_amount: discount applied to the cart subtotal
+
+    Returns:
+        tuple: (sale: Sale, receipt: Receipt)
+
+    Raises:
+        CheckoutError: if the cart is empty or stock cannot be reserved
+    """
+    if not cart:
+        raise CheckoutError('Cart is empty')
+
+    quantities = _cart_quantities(cart)
+    products = reserve_stock(quantities)
+
+    subtotal = sum(item['total'] for item in cart)
+    total_amount = subtotal - discount_amount
+
+    sale = Sale(
+        cashier_id=cashier_id,
+        customer_id=customer_id,
+        total_amount=total_amount,
+        discount_amount=discount_amount,
+        payment_method=payment_method,
+        status='completed'
+    )
+    db.session.add(sale)
+    db.session.flush()  # Get sale ID
+    record_sales([sale])
+
+    db.session.execute(db.insert(SaleItem), [
+        {
+            'sale_id': sale.id,
+            'product_id': item['product_id'],
+            'quantity': item['quantity'],
+            'unit_price': item['price'],
+            'unit_cost': products[item['product_id']].cost_price,
+            'total_price': item['total']
+        }
+        for item in cart
+    ])
+
+    receipt = Receipt(
+        sale_id=sale.id,
+        receipt_number=f"R{sale.id:06d}"
+    )
+    db.session.add(receipt)
+
+    activity = UserActivityLog(
+        user_id=cashier_id,
+        action=f"Processed sale #{sale.id} for {total_amount}"
+    )
+    db.session.add(activity)
+
+    return sale, receipt
+
+
+def process_checkout(cart, cashier_id, payment_method, customer_id=None, discount_amount=0.0):
+    """
+    Turn a cart into a completed sale with exactly one commit.
+
+    Returns:
+        tuple: (sale: Sale, receipt: Receipt)
+
+    Raises:
+        CheckoutError: if the sale cannot be completed; the transaction is
+            rolled back before the error propagates
+    """
+    try:
+        sale, receipt = build_sale(cart, cashier_id, payment_method, customer_id, discount_amount)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return sale, receipt
+
+
+PAYMENT_METHODS = ('cash', 'card', 'mobile_money', 'split')
+
+
+def _offline_ids(values):
+    """Integer ids among ``values``, ignoring malformed ones."""
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+def _parse_offline_sale(entry, products, remaining, customer_ids):
+    """
+    Validate one offline sale against the remaining stock snapshot.
+
+    ``customer_ids`` is the set of existing customer ids referenced by the
+    batch.
+
+    Returns:
+        tuple: (lines, quantities, created_at, customer_id, discount_amount)
+
+    Raises:
+        CheckoutError: if the sale is malformed or cannot be fulfilled
+    """
+    if entry.get('payment_method') not in PAYMENT_METHODS:
+        raise CheckoutError('Invalid payment method')
+
+    lines = []
+    for item in entry.get('items') or []:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Invalid item')
+        product = products.get(product_id)
+        if not product:
+            raise CheckoutError(f'Product not found: {product_id}')
+        if quantity <= 0:
+            raise CheckoutError(f'Invalid quantity for {product.name}')
+        try:
+            price = float(item.get('price', product.price))
+        except (TypeError, ValueError):
+            raise CheckoutError(f'Invalid price for {product.name}')
+        if not math.isfinite(price) or price < 0:
+            raise CheckoutError(f'Invalid price for {product.name}')
+        lines.append({
+            'product_id': product_id,
+            'quantity': quantity,
+            'unit_price': price,
+            'unit_cost': product.cost_price,
+            'total_price': price * quantity
+        })
+    if not lines:
+        raise CheckoutError('Sale has no items')
+
+    customer_id = entry.get('customer_id') or None
+    if customer_id is not None:
+        try:
+            customer_id = int(customer_id)
+        except (TypeError, ValueError):
+            raise CheckoutError('Invalid customer_id')
+        if customer_id not in customer_ids:
+            raise CheckoutError(f'Customer not found: {customer_id}')
+
+    try:
+        discount_amount = float(entry.get('discount_amount') or 0)
+    except (TypeError, ValueError):
+        raise CheckoutError('Invalid discount_amount')
+    if not math.isfinite(discount_amount):
+        raise CheckoutError('Invalid discount_amount')
+    subtotal = sum(line['total_price'] for line in lines)
+    discount_amount = min(max(discount_amount, 0.0), subtotal)
+
+    quantities = {}
+    for line in lines:
+        quantities[line['product_id']] = quantities.get(line['product_id'], 0) + line['quantity']
+    for product_id, quantity in quantities.items():
+        if remaining[product_id] < quantity:
+            product = products[product_id]
+            raise CheckoutError(
+                f'Insufficient stock for {product.name}. '
+                f'Available: {remaining[product_id]}, Requested: {quantity}'
+            )
+
+    created_at = None
+    if entry.get('created_at'):
+        try:
+            created_at = datetime.fromisoformat(str(entry['created_at']).replace('Z', '+00:00'))
+        except ValueError:
+            raise CheckoutError('Invalid created_at')
+        if created_at.tzinfo:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return lines, quantities, created_at, customer_id, discount_amount
+
+
+def ingest_sales(entries, cashier_id):
+    """
+    Record a batch of sales completed offline by a terminal.
+
+    Each entry carries a client-generated ``idempotency_key`` (stored as
+    ``Sale.client_ref``) so a terminal can resend the same batch safely.
+    All products are locked with one query, every sale is checked against a
+    running stock snapshot in submission order, and accepted sales are
+    written with bulk inserts, one guarded stock decrement and one commit.
+
+    Args:
+        entries: list of dicts with idempotency_key, items (product_id,
+            quantity, price), payment_method and optional customer_id,
+            discount_amount and created_at (ISO 8601)
+        cashier_id: id of the user the terminal is logged in as
+
+    Returns:
+        list: one result per entry, in order, with ``status`` 'created',
+        'duplicate' or 'rejected' plus ``sale_id``/``receipt_number`` or
+        ``error``
+
+    Raises:
+        CheckoutError: if stock changed concurrently; nothing is written
+    """
+    results = [None] * len(entries)
+    keys = [str(entry.get('idempotency_key') or '')[:64] for entry in entries]
+
+    existing = dict(
+        db.session.query(Sale.client_ref, Sale.id).filter(Sale.client_ref.in_([k for k in keys if k]))
+    ) if any(keys) else {}
+
+    product_ids = _offline_ids(
+        item.get('product_id') for entry in entries for item in entry.get('items') or []
+        if isinstance(item, dict)
+    )
+    products = lock_products(product_ids) if product_ids else {}
+    customer_ids = _offline_ids(entry.get('customer_id') for entry in entries if entry.get('customer_id'))
+    customer_ids = set(db.session.scalars(
+        db.select(Customer.id).where(Customer.id.in_(customer_ids))
+    )) if customer_ids else set()
+    remaining = {product_id: product.stock_quantity for product_id, product in products.items()}
+
+    accepted = []
+    batch_keys = {}
+    total_quantities = {}
+    for index, (entry, key) in enumerate(zip(entries, keys)):
+        if not key:
+            results[index] = {'status': 'rejected', 'error': 'Missing idempotency_key'}
+            continue
+        if key in existing:
+            results[index] = {'idempotency_key': key, 'status': 'duplicate', 'sale_id': existing[key]}
+            continue
+        if key in batch_keys:
+            results[index] = {'idempotency_key': key, 'status': 'duplicate', 'of_index': batch_keys[key]}
+            continue
+        try:
+            lines, quantities, created_at, customer_id, discount_amount = _parse_offline_sale(
+                entry, products, remaining, customer_ids
+            )
+        except (CheckoutError, TypeError, ValueError) as e:
+            results[index] = {'idempotency_key': key, 'status': 'rejected', 'error': str(e)}
+            continue
+
+        for product_id, quantity in quantities.items():
+            remaining[product_id] -= quantity
+            total_quantities[product_id] = total_quantities.get(product_id, 0) + quantity
+        batch_keys[key] = index
+        accepted.append((index, key, entry, lines, created_at, customer_id, discount_amount))
+
+    if accepted:
+        decrement_stock(total_quantities)
+
+        now = datetime.utcnow()
+        sale_rows = []
+        for index, key, entry, lines, created_at, customer_id, discount_amount in accepted:
+            subtotal = sum(line['total_price'] for line in lines)
+            sale_rows.append({
+                'cashier_id': cashier_id,
+                'customer_id': customer_id,
+                'total_amount': subtotal - discount_amount,
+                'discount_amount': discount_amount,
+                'payment_method': entry['payment_method'],
+                'status': 'completed',
+                'client_ref': key,
+                'created_at': created_at or now
+            })
+        sale_ids = db.session.scalars(
+            db.insert(Sale).returning(Sale.id, sort_by_parameter_order=True),
+            sale_rows
+        ).all()
+
+        item_rows = []
+        receipt_rows = []
+        for sale_id, (index, key, entry, lines, *_) in zip(sale_ids, accepted):
+            item_rows.extend(dict(line, sale_id=sale_id) for line in lines)
+            receipt_rows.append({'sale_id': sale_id, 'receipt_number': f"R{sale_id:06d}"})
+            results[index] = {
+                'idempotency_key': key,
+                'status': 'created',
+                'sale_id': sale_id,
+                'receipt_number': f"R{sale_id:06d}"
+            }
+        db.session.execute(db.insert(SaleItem), item_rows)
+        db.session.execute(db.insert(Receipt), receipt_rows)
+        record_sales(sale_rows)
+
+        db.session.add(UserActivityLog(
+            user_id=cashier_id,
+            action=f"Synced {len(accepted)} offline sales (#{sale_ids[0]} - #{sale_ids[-1]})"
+        ))
+
+    # Point in-batch duplicates at the sale created for their first copy
+    for result in results:
+        if result.get('of_index') is not None:
+            result['sale_id'] = results[result.pop('of_index')].get('sale_id')
+
+    return results
+
+
+def process_sale_batch(entries, cashier_id):
+    """Run ``ingest_sales`` and commit once; rolls back on any error."""
+    try:
+        results = ingest_sales(entries, cashier_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return results
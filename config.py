@@ -13,10 +13,69 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'static', 'uploads')
     
+    # Rendered receipt PDFs (see receipt_pdf.py)
+    RECEIPT_CACHE_DIR = os.getenv('RECEIPT_CACHE_DIR', os.path.join(os.getcwd(), 'receipts'))
+    
     # Session settings
     SESSION_TYPE = 'filesystem'
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hour
     
+    # Cart storage: 'memory', 'database' or 'redis' (see cart_store.py)
+    CART_STORE = os.getenv('CART_STORE', 'database')
+    CART_STORE_MAX_CARTS = int(os.getenv('CART_STORE_MAX_CARTS', 1024))
+    CART_STORE_REDIS_URL = os.getenv('CART_STORE_REDIS_URL', 'redis://localhost:6379/0')
+    CART_STORE_TTL = int(os.getenv('CART_STORE_TTL', 86400))  # seconds a cart is kept after its last change
+    CART_STORE_PURGE_INTERVAL = int(os.getenv('CART_STORE_PURGE_INTERVAL', 3600))  # seconds
+    
+    # Seconds before a worker rebuilds its barcode/SKU scan index
+    SCAN_INDEX_TTL = int(os.getenv('SCAN_INDEX_TTL', 300))
+    
+    # Product search backend: 'auto', 'postgresql', 'sqlite' or 'memory' (see product_search.py)
+    PRODUCT_SEARCH_BACKEND = os.getenv('PRODUCT_SEARCH_BACKEND', 'auto')
+    
+    # Catalog changes newer than this are held back from delta sync (see catalog_sync.py)
+    CATALOG_SYNC_LAG_SECONDS = int(os.getenv('CATALOG_SYNC_LAG_SECONDS', 2))
+    
+    # Idempotency keys on write endpoints (see idempotency.py), in seconds
+    IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 86400))
+    IDEMPOTENCY_PENDING_TIMEOUT = int(os.getenv('IDEMPOTENCY_PENDING_TIMEOUT', 120))
+    IDEMPOTENCY_PURGE_INTERVAL = int(os.getenv('IDEMPOTENCY_PURGE_INTERVAL', 600))
+    
+    # Background report jobs (see report_jobs.py); set REPORT_JOB_WORKERS=0 when
+    # running them in a separate `flask run-report-jobs` process
+    REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 2))
+    REPORT_JOB_DIR = os.getenv('REPORT_JOB_DIR')  # defaults to ./report_files
+    REPORT_JOB_TTL = int(os.getenv('REPORT_JOB_TTL', 86400))  # seconds a download link stays valid
+    
+    # Report result cache (see report_cache.py)
+    REPORT_CACHE_TTL = int(os.getenv('REPORT_CACHE_TTL', 60))  # seconds
+    REPORT_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', 128))
+    
+    # Longest range /reports/api/sales-chart serves, in days
+    SALES_CHART_MAX_DAYS = int(os.getenv('SALES_CHART_MAX_DAYS', 366))
+    
+    # Columnar sales snapshot for analytics (see sales_snapshot.py); report
+    # workers refresh it every interval seconds, 0 leaves it to cron
+    SALES_SNAPSHOT_DIR = os.getenv('SALES_SNAPSHOT_DIR')  # defaults to ./sales_snapshot
+    SALES_SNAPSHOT_INTERVAL = int(os.getenv('SALES_SNAPSHOT_INTERVAL', 300))
+    
+    # Demand forecasts and reorder points (see demand_forecast.py)
+    FORECAST_HISTORY_DAYS = int(os.getenv('FORECAST_HISTORY_DAYS', 365))
+    FORECAST_LEAD_TIME_DAYS = int(os.getenv('FORECAST_LEAD_TIME_DAYS', 7))
+    FORECAST_SERVICE_LEVEL = float(os.getenv('FORECAST_SERVICE_LEVEL', 0.95))  # chance of not running out
+    FORECAST_MIN_HISTORY_DAYS = int(os.getenv('FORECAST_MIN_HISTORY_DAYS', 14))
+    FORECAST_INTERVAL = int(os.getenv('FORECAST_INTERVAL', 86400))  # seconds; 0 leaves it to cron
+    
+    # ABC classification cut-offs, cumulative percent of revenue/profit (see abc_analysis.py)
+    ABC_THRESHOLDS = (80, 95)
+    
+    # Frequently bought together analysis (see basket_analysis.py)
+    BASKET_HISTORY_DAYS = int(os.getenv('BASKET_HISTORY_DAYS', 90))
+    BASKET_MIN_SUPPORT = float(os.getenv('BASKET_MIN_SUPPORT', 0.005))  # share of sales
+    BASKET_MIN_CONFIDENCE = float(os.getenv('BASKET_MIN_CONFIDENCE', 0.1))
+    BASKET_MAX_RULES = int(os.getenv('BASKET_MAX_RULES', 500))
+    BASKET_ANALYSIS_INTERVAL = int(os.getenv('BASKET_ANALYSIS_INTERVAL', 86400))  # seconds; 0 leaves it to cron
+    
     # Pagination
     ITEMS_PER_PAGE = 20
     
@@ -28,6 +87,14 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', os.getenv('MAIL_USERNAME'))
+    
+    # Email outbox (see email_outbox.py); set EMAIL_OUTBOX_WORKER=False when
+    # running the sender as a separate `flask send-emails` process
+    EMAIL_OUTBOX_WORKER = os.getenv('EMAIL_OUTBOX_WORKER', 'True').lower() == 'true'
+    EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 20))
+    EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+    EMAIL_OUTBOX_RETRY_BASE = int(os.getenv('EMAIL_OUTBOX_RETRY_BASE', 30))  # seconds
+    EMAIL_OUTBOX_POLL_INTERVAL = int(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', 5))  # seconds
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -53,6 +120,8 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    EMAIL_OUTBOX_WORKER = False
+    REPORT_JOB_WORKERS = 0
 
 # Configuration dictionary
 config = {
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from extensions import db
 from models import Customer, Sale, CreditTransaction, UserActivityLog
+from idempotency import idempotent
 from datetime import datetime
 from functools import wraps
 
@@ -120,6 +121,7 @@ def customer_detail(customer_id):
 @customers_bp.route('/customers/<int:customer_id>/add-credit', methods=['GET', 'POST'])
 @login_required
 @admin_required
+@idempotent
 def add_credit(customer_id):
     customer = Customer.query.get_or_404(customer_id)
     
@@ -154,6 +156,7 @@ def add_credit(customer_id):
 @customers_bp.route('/customers/<int:customer_id>/record-payment', methods=['GET', 'POST'])
 @login_required
 @admin_required
+@idempotent
 def record_payment(customer_id):
     customer = Customer.query.get_or_404(customer_id)
     
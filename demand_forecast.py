@@ -0,0 +1,221 @@
+"""
+Sales-velocity demand forecasts and reorder points
+
+``recompute_forecasts`` builds a products x days matrix of units sold from
+the columnar sales snapshot (one ``np.bincount`` over the item columns)
+and derives, for every product at once:
+
+- daily velocity and its standard deviation, over the days since the
+  product was created (at most ``FORECAST_HISTORY_DAYS``), so new products
+  are not diluted by days they could not sell;
+- lead-time demand, velocity x ``FORECAST_LEAD_TIME_DAYS``;
+- a reorder point, lead-time demand plus safety stock
+  z x std x sqrt(lead time) for the ``FORECAST_SERVICE_LEVEL``;
+- days of cover at the current stock level.
+
+Results replace the rows of ``ProductForecast``. Products with less than
+``FORECAST_MIN_HISTORY_DAYS`` of history get no reorder point and keep
+using their manual ``low_stock_threshold`` (see ``Product.reorder_level``).
+
+Run ``flask forecast-demand`` from cron, or let the report workers
+recompute every ``FORECAST_INTERVAL`` seconds.
+"""
+import time
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+from flask import current_app
+
+from extensions import db
+from models import Product, ProductForecast
+from sales_analytics import EPOCH_DATE, business_days, epoch_bounds, load_snapshot
+from sales_rollup import business_date, business_timezone, business_today
+from sales_snapshot import refresh_snapshot
+
+_last_attempt = None  # time.monotonic() of this process's last scheduled recompute
+
+FORECAST_FIELDS = ('daily_velocity', 'daily_std', 'lead_time_demand', 'reorder_point',
+                   'days_of_cover', 'history_days', 'computed_at')
+
+
+def _settings():
+    config = current_app.config
+    return (
+        config.get('FORECAST_HISTORY_DAYS', 365),
+        config.get('FORECAST_LEAD_TIME_DAYS', 7),
+        config.get('FORECAST_SERVICE_LEVEL', 0.95),
+        config.get('FORECAST_MIN_HISTORY_DAYS', 14)
+    )
+
+
+def reorder_level():
+    """SQL expression for Product.reorder_level; outer join ProductForecast to use it."""
+    return db.func.coalesce(ProductForecast.reorder_point, Product.low_stock_threshold)
+
+
+def low_stock_query():
+    """Products at or below their reorder level, with forecasts loaded."""
+    return Product.query.outerjoin(ProductForecast).options(
+        db.contains_eager(Product.forecast)
+    ).filter(Product.stock_quantity <= reorder_level())
+
+
+def demand_matrix(product_ids, start_day, end_day, snapshot=None, tz=None):
+    """
+    Units sold per product and business day.
+
+    Returns:
+        ndarray: shape (len(product_ids), days), rows in product_ids order
+    """
+    snapshot = snapshot or load_snapshot()
+    tz = tz or business_timezone()
+    days = (end_day - start_day).days + 1
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+
+    items = snapshot.items
+    mask = snapshot.item_mask(*epoch_bounds(start_day, end_day, tz))
+    sold = items['product_id'][mask]
+
+    # Row of each item's product; items of unknown products are dropped
+    order = np.argsort(product_ids)
+    position = np.searchsorted(product_ids, sold, sorter=order)
+    position = np.minimum(position, len(product_ids) - 1)
+    rows = order[position]
+    known = product_ids[rows] == sold
+
+    columns = business_days(items['created_at'][mask][known], tz) - (start_day - EPOCH_DATE).days
+    matrix = np.bincount(
+        rows[known] * days + columns,
+        weights=items['quantity'][mask][known],
+        minlength=len(product_ids) * days
+    )
+    return matrix.reshape(len(product_ids), days)
+
+
+def compute_forecasts(today=None, snapshot=None):
+    """
+    Forecast rows for every product, without writing them.
+
+    Returns:
+        list: dicts with product_id and the ProductForecast fields
+    """
+    history, lead_time, service_level, min_history = _settings()
+    tz = business_timezone()
+    end_day = (today or business_today(tz)) - timedelta(days=1)  # today is not over yet
+    start_day = end_day - timedelta(days=history - 1)
+
+    products = db.session.query(Product.id, Product.created_at, Product.stock_quantity).order_by(Product.id).all()
+    if not products:
+        return []
+    product_ids = [product.id for product in products]
+    matrix = demand_matrix(product_ids, start_day, end_day, snapshot, tz)
+
+    # Only the days since each product was created count towards its history
+    first_day = np.array([
+        max((business_date(product.created_at, tz) - start_day).days, 0) if product.created_at else 0
+        for product in products
+    ])
+    active = np.arange(history) >= first_day[:, None]
+    history_days = active.sum(axis=1)
+    observed = np.maximum(history_days, 1)
+
+    velocity = matrix.sum(axis=1) / observed
+    variance = (matrix ** 2).sum(axis=1) / observed - velocity ** 2
+    std = np.sqrt(np.maximum(variance, 0))
+
+    z = NormalDist().inv_cdf(service_level)
+    lead_time_demand = velocity * lead_time
+    reorder_point = np.ceil(lead_time_demand + z * std * np.sqrt(lead_time)).astype(int)
+    stock = np.array([max(product.stock_quantity or 0, 0) for product in products], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(velocity > 0, stock / velocity, np.nan)
+
+    computed_at = datetime.utcnow()
+    return [
+        {
+            'product_id': product_ids[i],
+            'daily_velocity': float(velocity[i]),
+            'daily_std': float(std[i]),
+            'lead_time_demand': float(lead_time_demand[i]),
+            'reorder_point': int(reorder_point[i]) if history_days[i] >= min_history else None,
+            'days_of_cover': None if np.isnan(days_of_cover[i]) else float(days_of_cover[i]),
+            'history_days': int(history_days[i]),
+            'computed_at': computed_at
+        }
+        for i in range(len(product_ids))
+    ]
+
+
+def _store(rows):
+    """Upsert forecast rows in one statement per dialect."""
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(ProductForecast.__table__)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['product_id'],
+            set_={field: stmt.excluded[field] for field in FORECAST_FIELDS}
+        ), rows)
+        return
+
+    db.session.execute(db.delete(ProductForecast))
+    db.session.execute(db.insert(ProductForecast), rows)
+
+
+def recompute_forecasts(refresh=True):
+    """
+    Recompute and store forecasts for all products.
+
+    Args:
+        refresh: bring the sales snapshot up to date first
+
+    Returns:
+        int: number of products forecast
+    """
+    if refresh:
+        refresh_snapshot()
+    rows = compute_forecasts()
+    _store(rows)
+    db.session.commit()
+    return len(rows)
+
+
+def maybe_recompute_forecasts():
+    """
+    Recompute if the stored forecasts are older than FORECAST_INTERVAL.
+
+    Attempts are also spaced by FORECAST_INTERVAL within the process, so an
+    empty catalog or a failed run waits for the next interval instead of
+    retrying on every worker poll.
+    """
+    global _last_attempt
+    interval = current_app.config.get('FORECAST_INTERVAL', 86400)
+    if interval <= 0:
+        return
+    if _last_attempt is not None and time.monotonic() - _last_attempt < interval:
+        return
+    last = db.session.query(db.func.max(ProductForecast.computed_at)).scalar()
+    if last and datetime.utcnow() - last < timedelta(seconds=interval):
+        return
+    _last_attempt = time.monotonic()
+    try:
+        recompute_forecasts()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not recompute demand forecasts: {str(e)}")
+
+
+def init_demand_forecast(app):
+    """Register the forecast command."""
+
+    @app.cli.command('forecast-demand')
+    def forecast_demand_command():
+        """Recompute sales velocity and reorder points for all products."""
+        count = recompute_forecasts()
+        print(f"Forecast {count} products")
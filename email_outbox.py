@@ -0,0 +1,205 @@
+"""
+Email outbox and background sender for the POS System
+
+Request handlers never talk to SMTP. ``queue_message`` stores a Flask-Mail
+``Message`` in the ``email_outbox`` table and wakes the sender thread,
+which delivers due messages in batches over a single SMTP connection.
+Failed messages are retried with exponential backoff until
+``EMAIL_OUTBOX_MAX_ATTEMPTS`` is reached and then marked ``failed``.
+
+Rows are claimed with a conditional UPDATE and a lease, so several gunicorn
+workers (or a separate ``flask send-emails`` process) can run senders
+against the same table without sending a message twice; a claim left
+behind by a crashed process is picked up again when its lease expires.
+"""
+import base64
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+
+from extensions import db, mail
+from models import EmailOutbox
+
+CLAIM_LEASE = timedelta(minutes=5)
+
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def queue_message(msg):
+    """
+    Store a Flask-Mail message for background delivery.
+
+    Returns:
+        EmailOutbox: the queued row
+    """
+    sender = msg.sender
+    if isinstance(sender, tuple):
+        sender = f'{sender[0]} <{sender[1]}>'
+
+    entry = EmailOutbox(
+        sender=sender,
+        recipients=list(msg.recipients),
+        subject=msg.subject,
+        body=msg.body,
+        html=msg.html,
+        attachments=[{
+            'filename': attachment.filename,
+            'content_type': attachment.content_type,
+            'data': base64.b64encode(attachment.data).decode('ascii')
+        } for attachment in msg.attachments],
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    db.session.commit()
+
+    ensure_worker(current_app._get_current_object())
+    _wakeup.set()
+    return entry
+
+
+def _to_message(entry):
+    msg = Message(
+        subject=entry.subject,
+        sender=entry.sender,
+        recipients=entry.recipients,
+        body=entry.body,
+        html=entry.html
+    )
+    for attachment in entry.attachments or []:
+        msg.attach(
+            filename=attachment['filename'],
+            content_type=attachment['content_type'],
+            data=base64.b64decode(attachment['data'])
+        )
+    return msg
+
+
+def _claim_due(batch_size):
+    """Claim up to batch_size due messages for this sender."""
+    now = datetime.utcnow()
+    candidates = db.session.query(EmailOutbox.id, EmailOutbox.status).filter(
+        EmailOutbox.status.in_(['pending', 'sending']),
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.next_attempt_at).limit(batch_size).all()
+
+    claimed = []
+    for entry_id, status in candidates:
+        result = db.session.execute(
+            db.update(EmailOutbox)
+            .where(
+                EmailOutbox.id == entry_id,
+                EmailOutbox.status == status,
+                EmailOutbox.next_attempt_at <= now
+            )
+            .values(status='sending', next_attempt_at=now + CLAIM_LEASE)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            claimed.append(entry_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all()
+
+
+def _record_failure(entry, error):
+    max_attempts = current_app.config.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    retry_base = current_app.config.get('EMAIL_OUTBOX_RETRY_BASE', 30)
+
+    entry.attempts = (entry.attempts or 0) + 1
+    entry.last_error = str(error)[:500]
+    if entry.attempts >= max_attempts:
+        entry.status = 'failed'
+    else:
+        entry.status = 'pending'
+        entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_base * 2 ** (entry.attempts - 1))
+
+
+def deliver_pending(batch_size=None):
+    """
+    Send one batch of due messages over a single SMTP connection.
+
+    Returns:
+        tuple: (sent: int, failed: int)
+    """
+    batch_size = batch_size or current_app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 20)
+    entries = _claim_due(batch_size)
+    if not entries:
+        return 0, 0
+
+    sent = failed = 0
+    try:
+        with mail.connect() as conn:
+            for entry in entries:
+                try:
+                    conn.send(_to_message(entry))
+                except Exception as e:
+                    _record_failure(entry, e)
+                    failed += 1
+                else:
+                    entry.status = 'sent'
+                    entry.attempts = (entry.attempts or 0) + 1
+                    entry.sent_at = datetime.utcnow()
+                    entry.last_error = None
+                    sent += 1
+                db.session.commit()
+    except Exception as e:
+        # Could not connect (or the connection dropped): retry the rest later
+        current_app.logger.error(f"Email outbox delivery failed: {str(e)}")
+        for entry in entries:
+            if entry.status == 'sending':
+                _record_failure(entry, e)
+                failed += 1
+        db.session.commit()
+
+    return sent, failed
+
+
+def run_worker(app, stop_event=None):
+    """Deliver queued email until stop_event is set."""
+    poll_interval = app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', 5)
+    while not (stop_event and stop_event.is_set()):
+        _wakeup.clear()
+        with app.app_context():
+            try:
+                sent, failed = deliver_pending()
+            except Exception as e:
+                app.logger.error(f"Email outbox worker error: {str(e)}")
+                sent = failed = 0
+            finally:
+                db.session.remove()
+        if not sent and not failed:
+            _wakeup.wait(poll_interval)
+
+
+def ensure_worker(app):
+    """Start this process's background sender thread if it is not running."""
+    global _worker
+    if not app.config.get('EMAIL_OUTBOX_WORKER', True):
+        return
+    if _worker is not None and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=run_worker, args=(app,), name='email-outbox', daemon=True)
+            _worker.start()
+
+
+def init_email_outbox(app):
+    """Register the outbox sender with the application."""
+
+    @app.before_request
+    def start_email_worker():
+        ensure_worker(app)
+
+    @app.cli.command('send-emails')
+    def send_emails_command():
+        """Run the email outbox sender in the foreground."""
+        run_worker(app)
@@ -1,14 +1,18 @@
 """
 Email utility functions for the POS System
+
+Receipts and alerts are queued in the email outbox and delivered by the
+background sender (see email_outbox.py), so callers never wait on SMTP.
 """
 from flask import current_app
 from flask_mail import Message
 from extensions import mail
+from email_outbox import queue_message
 import logging
 
 def send_receipt_email(sale, pdf_buffer):
     """
-    Send receipt email with PDF attachment
+    Queue receipt email with PDF attachment
     
     Args:
         sale: Sale object
@@ -61,15 +65,15 @@ Best regards,
             pdf_buffer.getvalue()
         )
         
-        mail.send(msg)
-        return True, f'Receipt emailed successfully to {sale.customer.email}!'
+        queue_message(msg)
+        return True, f'Receipt queued for delivery to {sale.customer.email}!'
         
     except Exception as e:
         return False, f"Failed to send email: {str(e)}"
 
 def send_receipt_email_to_address(sale, pdf_buffer, recipient_email, custom_message=""):
     """
-    Send receipt PDF to any email address with optional custom message
+    Queue receipt PDF for any email address with optional custom message
     """
     try:
         from flask_mail import Message
@@ -126,15 +130,15 @@ def send_receipt_email_to_address(sale, pdf_buffer, recipient_email, custom_mess
             data=pdf_buffer.read()
         )
         
-        mail.send(msg)
-        return True, f"Receipt sent successfully to {recipient_email}"
+        queue_message(msg)
+        return True, f"Receipt queued for delivery to {recipient_email}"
         
     except Exception as e:
         return False, f"Failed to send email: {str(e)}"
 
 def send_low_stock_alert(products):
     """
-    Send low stock alert email to admin users
+    Queue low stock alert email to admin users
     
     Args:
         products: List of products with low stock
@@ -180,8 +184,8 @@ Best regards,
 {business_name} System
         """
         
-        mail.send(msg)
-        return True, f'Low stock alert sent to {len(admin_emails)} admin(s)!'
+        queue_message(msg)
+        return True, f'Low stock alert queued for {len(admin_emails)} admin(s)!'
         
     except Exception as e:
         logging.error(f"Error sending low stock alert: {str(e)}")
@@ -190,6 +194,9 @@ Best regards,
 def test_email_configuration():
     """
     Test email configuration by sending a test email
+
+    Sent synchronously, bypassing the outbox, so SMTP errors are reported
+    straight back to the admin running the test.
     
     Returns:
         tuple: (success: bool, message: str)
@@ -0,0 +1,125 @@
+"""
+Held (parked) sales for the POS System
+
+Held carts are stored as ``on_hold`` Sale rows with their SaleItems so they
+survive cookie expiry and can be resumed from any terminal. Stock is not
+reserved while a sale is on hold; it is checked again at checkout.
+"""
+from extensions import db
+from models import Product, Sale, SaleItem
+
+
+def hold_cart(cart, cashier_id):
+    """
+    Park a cart as an ``on_hold`` sale.
+
+    Args:
+        cart: list of cart lines (product_id, name, price, quantity, total)
+        cashier_id: id of the user holding the sale
+
+    Returns:
+        Sale: the held sale; its id is the hold id
+    """
+    sale = Sale(
+        cashier_id=cashier_id,
+        total_amount=sum(item['total'] for item in cart),
+        discount_amount=0,
+        status='on_hold'
+    )
+    db.session.add(sale)
+    db.session.flush()  # Get sale ID
+
+    db.session.execute(db.insert(SaleItem), [
+        {
+            'sale_id': sale.id,
+            'product_id': item['product_id'],
+            'quantity': item['quantity'],
+            'unit_price': item['price'],
+            'total_price': item['total']
+        }
+        for item in cart
+    ])
+    db.session.commit()
+    return sale
+
+
+def list_held_sales(cashier_id, page=1, per_page=20):
+    """
+    One page of a cashier's held sales, newest first.
+
+    Uses a single query on the (cashier_id, status) index with the item
+    count aggregated in SQL. One extra row is fetched to detect a next page
+    instead of running a separate COUNT.
+
+    Returns:
+        tuple: (held_sales: list of dicts, has_next: bool)
+    """
+    page = max(page, 1)
+    rows = db.session.query(
+        Sale.id,
+        Sale.created_at,
+        Sale.total_amount,
+        db.func.count(SaleItem.id).label('item_count')
+    ).outerjoin(SaleItem, SaleItem.sale_id == Sale.id).filter(
+        Sale.cashier_id == cashier_id,
+        Sale.status == 'on_hold'
+    ).group_by(Sale.id, Sale.created_at, Sale.total_amount).order_by(
+        Sale.id.desc()
+    ).offset((page - 1) * per_page).limit(per_page + 1).all()
+
+    held_sales = [{
+        'id': row.id,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'total': row.total_amount or 0,
+        'item_count': row.item_count
+    } for row in rows[:per_page]]
+    return held_sales, len(rows) > per_page
+
+
+def take_held_sale(hold_id, cashier_id):
+    """
+    Remove a held sale and return its lines as a cart.
+
+    Returns:
+        list: cart lines, or None if no such held sale belongs to the cashier
+    """
+    rows = db.session.query(SaleItem, Product.name).join(
+        Sale, Sale.id == SaleItem.sale_id
+    ).join(Product, Product.id == SaleItem.product_id).filter(
+        Sale.id == hold_id,
+        Sale.cashier_id == cashier_id,
+        Sale.status == 'on_hold'
+    ).order_by(SaleItem.id).all()
+
+    if not rows:
+        return None
+
+    cart = [{
+        'product_id': item.product_id,
+        'name': name,
+        'price': item.unit_price,
+        'quantity': item.quantity,
+        'total': item.total_price
+    } for item, name in rows]
+
+    _delete_held(Sale.id == hold_id, Sale.cashier_id == cashier_id)
+    db.session.commit()
+    return cart
+
+
+def clear_held_sales(cashier_id):
+    """
+    Delete all of a cashier's held sales.
+
+    Returns:
+        int: number of held sales removed
+    """
+    cleared_count = _delete_held(Sale.cashier_id == cashier_id)
+    db.session.commit()
+    return cleared_count
+
+
+def _delete_held(*criteria):
+    held_ids = db.select(Sale.id).where(Sale.status == 'on_hold', *criteria)
+    SaleItem.query.filter(SaleItem.sale_id.in_(held_ids)).delete(synchronize_session=False)
+    return Sale.query.filter(Sale.status == 'on_hold', *criteria).delete(synchronize_session=False)
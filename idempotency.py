@@ -0,0 +1,208 @@
+"""
+Idempotency keys for write endpoints
+
+Forms carry a one-time ``idempotency_key`` field (API clients can send an
+``Idempotency-Key`` header instead). The first request with a key stages an
+``IdempotencyKey`` row in the same transaction as the view's own writes, so
+the key is committed together with the sale or credit transaction it
+protects. Once the view has answered, the response (redirect target, flashed
+messages, or a JSON body) is stored on the row.
+
+A replay of a completed key gets the stored response back without running
+the view again. A replay that arrives while the first request is still
+running is told so instead of waiting; the unique index on the key makes
+the database serialise two workers that race on the same key. Rows expire
+after ``IDEMPOTENCY_KEY_TTL`` seconds and are purged in the background of
+later requests.
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, flash, jsonify, redirect, request, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import IdempotencyKey
+
+FORM_FIELD = 'idempotency_key'
+HEADER = 'Idempotency-Key'
+
+_last_purge = 0
+
+
+def new_idempotency_key():
+    """Fresh key for a form; expose as ``idempotency_key()`` in templates."""
+    return uuid.uuid4().hex
+
+
+def _request_key():
+    key = request.headers.get(HEADER) or request.form.get(FORM_FIELD)
+    return (key or '').strip()[:64] or None
+
+
+def _request_hash():
+    """Fingerprint of the request payload, minus the key itself."""
+    digest = hashlib.sha256(request.path.encode('utf-8'))
+    for name, value in sorted(request.form.items(multi=True)):
+        if name != FORM_FIELD:
+            digest.update(f'\0{name}={value}'.encode('utf-8'))
+    if request.is_json:
+        digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def purge_expired_keys():
+    """Delete expired keys. Returns the number of rows removed."""
+    result = db.session.execute(
+        db.delete(IdempotencyKey)
+        .where(IdempotencyKey.expires_at < datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _maybe_purge():
+    # At most once per interval per worker
+    global _last_purge
+    interval = current_app.config.get('IDEMPOTENCY_PURGE_INTERVAL', 600)
+    if time.monotonic() - _last_purge < interval:
+        return
+    _last_purge = time.monotonic()
+    try:
+        purge_expired_keys()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not purge idempotency keys: {str(e)}")
+
+
+def _conflict(message):
+    if request.is_json or request.headers.get(HEADER):
+        return jsonify({'error': message}), 409
+    flash(message, 'error')
+    return redirect(request.referrer or request.url)
+
+
+def _replay(record):
+    """Answer from a stored key, or None if the view should run."""
+    now = datetime.utcnow()
+    if record.expires_at < now:
+        return None
+    if record.user_id != current_user.id or record.endpoint != request.endpoint or \
+            record.request_hash != _request_hash():
+        return _conflict('This form was already submitted with different details. Please reload and try again.')
+    if record.status == 'pending':
+        timeout = current_app.config.get('IDEMPOTENCY_PENDING_TIMEOUT', 120)
+        if record.created_at + timedelta(seconds=timeout) < now:
+            return None  # the original request died before answering
+        return _conflict('This request is already being processed.')
+
+    for category, message in record.flashes or []:
+        flash(message, category)
+    if record.response_location:
+        return redirect(record.response_location, code=record.response_status or 302)
+    return current_app.response_class(
+        record.response_body or '',
+        status=record.response_status or 200,
+        mimetype='application/json'
+    )
+
+
+def _claim(key):
+    """Stage the key row in the current transaction."""
+    ttl = current_app.config.get('IDEMPOTENCY_KEY_TTL', 86400)
+    now = datetime.utcnow()
+    record = IdempotencyKey(
+        key=key,
+        user_id=current_user.id,
+        endpoint=request.endpoint,
+        request_hash=_request_hash(),
+        status='pending',
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl)
+    )
+    db.session.add(record)
+    db.session.flush()
+    return record
+
+
+def _store_response(record, response, flashes):
+    if response.status_code in (301, 302, 303, 307, 308):
+        record.response_location = response.headers.get('Location')
+    elif response.mimetype == 'application/json' and response.status_code < 500:
+        record.response_body = response.get_data(as_text=True)
+    else:
+        # Rendered pages are not replayed; let the next submit run again
+        db.session.delete(record)
+        db.session.commit()
+        return
+    record.status = 'completed'
+    record.response_status = response.status_code
+    record.flashes = flashes
+    db.session.commit()
+
+
+def idempotent(view):
+    """
+    Make a POST view safe to resubmit with the same idempotency key.
+
+    Requests without a key run the view unchanged. Apply below
+    ``login_required`` so the key can be scoped to the user.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        key = _request_key()
+        if request.method != 'POST' or not key:
+            return view(*args, **kwargs)
+
+        _maybe_purge()
+
+        record = None
+        for attempt in range(2):
+            existing = IdempotencyKey.query.filter_by(key=key).first()
+            if existing is not None:
+                response = _replay(existing)
+                if response is not None:
+                    db.session.rollback()
+                    return response
+                # Expired or abandoned: take the key over
+                db.session.delete(existing)
+                db.session.flush()
+            try:
+                record = _claim(key)
+                break
+            except IntegrityError:
+                # Another worker claimed the key first; answer from its row
+                db.session.rollback()
+        if record is None:
+            return _conflict('This request is already being processed.')
+
+        seen_flashes = len(session.get('_flashes', []))
+        response = current_app.make_response(view(*args, **kwargs))
+
+        # A view that rolled back (e.g. checkout out of stock) dropped the key
+        if record in db.session:
+            try:
+                _store_response(record, response, [list(f) for f in session.get('_flashes', [])[seen_flashes:]])
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Could not store idempotent response: {str(e)}")
+        return response
+    return decorated_function
+
+
+def init_idempotency(app):
+    """Expose ``idempotency_key()`` to templates and register the purge command."""
+
+    @app.context_processor
+    def inject_idempotency_key():
+        return dict(idempotency_key=new_idempotency_key)
+
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Delete expired idempotency keys."""
+        print(f"Removed {purge_expired_keys()} expired idempotency keys")
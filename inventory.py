@@ -2,6 +2,10 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from extensions import db
 from models import Product, Supplier, StockAdjustment, UserActivityLog
+from product_index import invalidate_scan_index
+from product_search import product_search_filter
+from catalog_sync import record_product_deletion
+from demand_forecast import low_stock_query
 from datetime import datetime
 from functools import wraps
 
@@ -26,13 +30,7 @@ def products():
     query = Product.query
     
     if search:
-        query = query.filter(
-            db.or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.sku.ilike(f'%{search}%'),
-                Product.barcode.ilike(f'%{search}%')
-            )
-        )
+        query = query.filter(product_search_filter(search))
     
     if category:
         query = query.filter(Product.category == category)
@@ -86,6 +84,7 @@ def create_product():
             )
             db.session.add(activity)
             db.session.commit()
+            invalidate_scan_index()
             
             flash('Product created successfully!', 'success')
             return redirect(url_for('inventory.products'))
@@ -118,6 +117,7 @@ def edit_product(product_id):
             )
             db.session.add(activity)
             db.session.commit()
+            invalidate_scan_index()
             
             flash('Product updated successfully!', 'success')
             return redirect(url_for('inventory.products'))
@@ -143,6 +143,7 @@ def delete_product(product_id):
         flash('Cannot delete product with sales history', 'error')
     else:
         db.session.delete(product)
+        record_product_deletion(product.id)
         
         # Log activity
         activity = UserActivityLog(
@@ -151,6 +152,7 @@ def delete_product(product_id):
         )
         db.session.add(activity)
         db.session.commit()
+        invalidate_scan_index()
         
         flash('Product deleted successfully!', 'success')
     
@@ -229,9 +231,8 @@ def low_stock():
         db.session.commit()
         flash(f'Fixed {len(products_with_negative_stock)} products with negative stock', 'warning')
     
-    products = Product.query.filter(
-        Product.stock_quantity <= Product.low_stock_threshold
-    ).order_by(Product.stock_quantity).all()
+    # Forecast reorder points where there is enough sales history
+    products = low_stock_query().order_by(Product.stock_quantity).all()
     return render_template('inventory/low_stock.html', products=products)
 
 @inventory_bp.route('/suppliers')
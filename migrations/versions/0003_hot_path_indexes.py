@@ -0,0 +1,45 @@
+"""hot path indexes
+
+Indexes for the filters nearly every screen runs: completed sales by date,
+sale items by product, a customer's credit history and the activity log by
+time. On PostgreSQL they are built CONCURRENTLY so the sale tables stay
+writable while a large store migrates; that cannot run inside a transaction,
+hence the autocommit block.
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_series_tables
+Create Date: 2026-10-17 04:49:13.757670
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_path_indexes'
+down_revision = '0002_series_tables'
+branch_labels = None
+depends_on = None
+
+COMPLETED = sa.text("status = 'completed'")
+
+INDEXES = [
+    ('ix_sale_status_created_at', 'sale', ['status', 'created_at'], {}),
+    ('ix_sale_completed_created_at', 'sale', ['created_at', 'id'],
+     {'postgresql_where': COMPLETED, 'sqlite_where': COMPLETED}),
+    ('ix_sale_item_product_sale', 'sale_item', ['product_id', 'sale_id'], {}),
+    ('ix_credit_transaction_customer_created', 'credit_transaction', ['customer_id', 'created_at'], {}),
+    ('ix_user_activity_log_timestamp', 'user_activity_log', ['timestamp'], {}),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, kw in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, **kw)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
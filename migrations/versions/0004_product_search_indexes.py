@@ -0,0 +1,53 @@
+"""product search indexes
+
+Indexes behind product_search.py: on PostgreSQL the pg_trgm extension and
+trigram GIN indexes on lower(name) and lower(sku), built CONCURRENTLY so
+product stays writable; on SQLite an expression index on lower(sku) for
+SKU prefix range scans. The SQLite FTS shadow table is not part of the
+schema; product_search.py creates and rebuilds it at runtime.
+
+Creating the extension needs a role allowed to CREATE EXTENSION.
+
+Revision ID: 0004_product_search_indexes
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-17 05:20:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_product_search_indexes'
+down_revision = '0003_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = [
+    ('ix_product_name_trgm', 'lower(name) gin_trgm_ops'),
+    ('ix_product_sku_trgm', 'lower(sku) gin_trgm_ops'),
+]
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        with op.get_context().autocommit_block():
+            for name, expression in TRIGRAM_INDEXES:
+                op.create_index(
+                    name, 'product', [sa.text(expression)],
+                    postgresql_using='gin', postgresql_concurrently=True
+                )
+    elif dialect == 'sqlite':
+        op.create_index('ix_product_sku_lower', 'product', [sa.text('lower(sku)')])
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, _ in reversed(TRIGRAM_INDEXES):
+                op.drop_index(name, table_name='product', postgresql_concurrently=True)
+    elif dialect == 'sqlite':
+        op.drop_index('ix_product_sku_lower', table_name='product')
@@ -1,5 +1,6 @@
 from extensions import db
 from flask_login import UserMixin
+from sqlalchemy import DDL, event
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -34,7 +35,7 @@ class UserActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     action = db.Column(db.String(255))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 # Inventory
 class Product(db.Model):
@@ -42,7 +43,7 @@ class Product(db.Model):
     name = db.Column(db.String(120), nullable=False)
     sku = db.Column(db.String(50), unique=True, nullable=False)
     barcode = db.Column(db.String(50), unique=True)
-    category = db.Column(db.String(50))
+    category = db.Column(db.String(50), index=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'))
     price = db.Column(db.Float, nullable=False)
     cost_price = db.Column(db.Float)
@@ -56,6 +57,51 @@ class Product(db.Model):
     sale_items = db.relationship('SaleItem', backref='product', lazy=True)
     stock_adjustments = db.relationship('StockAdjustment', backref='product', lazy=True)
     purchase_items = db.relationship('PurchaseItem', backref='product', lazy=True)
+    forecast = db.relationship('ProductForecast', backref='product', lazy=True, uselist=False, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_product_updated_at_id', 'updated_at', 'id'),
+        # Product search indexes (see product_search.py)
+        db.Index('ix_product_sku_lower', db.func.lower(sku)).ddl_if(dialect='sqlite'),
+        db.Index(
+            'ix_product_name_trgm', db.func.lower(name).label('lower_name'),
+            postgresql_using='gin', postgresql_ops={'lower_name': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql'),
+        db.Index(
+            'ix_product_sku_trgm', db.func.lower(sku).label('lower_sku'),
+            postgresql_using='gin', postgresql_ops={'lower_sku': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql'),
+    )
+    
+    @property
+    def reorder_level(self):
+        """Forecast reorder point, or the manual threshold if there is none."""
+        if self.forecast and self.forecast.reorder_point is not None:
+            return self.forecast.reorder_point
+        return self.low_stock_threshold
+
+# pg_trgm has to exist before create_all() builds the trigram indexes
+event.listen(
+    Product.__table__, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
+class ProductForecast(db.Model):
+    """Demand forecast and suggested reorder point per product (see demand_forecast.py)"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    daily_velocity = db.Column(db.Float, nullable=False, default=0)  # mean units sold per day
+    daily_std = db.Column(db.Float, nullable=False, default=0)
+    lead_time_demand = db.Column(db.Float, nullable=False, default=0)  # expected units sold over the lead time
+    reorder_point = db.Column(db.Integer)  # None until there is enough history
+    days_of_cover = db.Column(db.Float)  # None when nothing sells
+    history_days = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ProductTombstone(db.Model):
+    """Deleted product ids, so terminals syncing catalog changes can drop them"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class StockAdjustment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -76,19 +122,36 @@ class Sale(db.Model):
     payment_method = db.Column(db.Enum("cash", "card", "mobile_money", "split", name="payment_methods"))
     status = db.Column(db.Enum("completed", "on_hold", "refunded", name="sale_status"))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    client_ref = db.Column(db.String(64), unique=True)  # idempotency key of sales synced from terminals
     
     # Relationships
     items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
     receipt = db.relationship('Receipt', backref='sale', lazy=True, uselist=False)
     credit_transactions = db.relationship('CreditTransaction', backref='sale', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_sale_cashier_status', 'cashier_id', 'status'),
+        db.Index('ix_sale_status_created_at', 'status', 'created_at'),
+        # Reports only read completed sales, newest first and keyset paged on (created_at, id)
+        db.Index(
+            'ix_sale_completed_created_at', 'created_at', 'id',
+            postgresql_where=db.text("status = 'completed'"),
+            sqlite_where=db.text("status = 'completed'")
+        ),
+    )
 
 class SaleItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'))
+    sale_id = db.Column(db.Integer, db.ForeignKey('sale.id'), index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'))
     quantity = db.Column(db.Integer, nullable=False)
     unit_price = db.Column(db.Float, nullable=False)
+    unit_cost = db.Column(db.Float)  # product cost price at the time of sale
     total_price = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_sale_item_product_sale', 'product_id', 'sale_id'),
+    )
 
 class Receipt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -97,6 +160,13 @@ class Receipt(db.Model):
     file_path = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class CartSession(db.Model):
+    """Server-side cart for one user/terminal (see cart_store.py)"""
+    id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    items = db.Column(db.JSON)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 # Customers (Credit Sales)
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -117,6 +187,10 @@ class CreditTransaction(db.Model):
     amount = db.Column(db.Float)
     type = db.Column(db.Enum("credit", "payment", name="credit_types"))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_credit_transaction_customer_created', 'customer_id', 'created_at'),
+    )
 
 # Suppliers & Purchases
 class Supplier(db.Model):
@@ -183,6 +257,89 @@ class BusinessSettings(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class EmailOutbox(db.Model):
+    """Queued outgoing email, delivered by the background sender in email_outbox.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(255))
+    recipients = db.Column(db.JSON, nullable=False)
+    subject = db.Column(db.String(255))
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    attachments = db.Column(db.JSON)  # [{filename, content_type, data (base64)}]
+    status = db.Column(db.Enum("pending", "sending", "sent", "failed", name="email_status"), default="pending", nullable=False)
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+class DailySalesSummary(db.Model):
+    """Completed sales per business day, payment method and cashier, see sales_rollup.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    payment_method = db.Column(db.String(20), nullable=False, default='')
+    cashier_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    sales_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+    discount_amount = db.Column(db.Float, nullable=False, default=0)
+    refunded_count = db.Column(db.Integer, nullable=False, default=0)
+    refunded_amount = db.Column(db.Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('date', 'payment_method', 'cashier_id', name='uq_daily_sales_summary_bucket'),
+    )
+
+class CacheVersion(db.Model):
+    """Data version counters for cross-worker cache invalidation, see report_cache.py"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    """One-time request key for write endpoints, see idempotency.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    endpoint = db.Column(db.String(100))
+    request_hash = db.Column(db.String(64))
+    status = db.Column(db.Enum("pending", "completed", name="idempotency_status"), default="pending", nullable=False)
+    response_status = db.Column(db.Integer)
+    response_location = db.Column(db.String(500))
+    response_body = db.Column(db.Text)
+    flashes = db.Column(db.JSON)  # [[category, message]] flashed by the original request
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class ReportJob(db.Model):
+    """Report rendered in the background, see report_jobs.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    report_type = db.Column(db.String(20), nullable=False)  # sales, inventory, staff, products
+    format = db.Column(db.String(10), nullable=False)  # pdf, csv, xlsx
+    start_date = db.Column(db.Date)
+    end_date = db.Column(db.Date)
+    status = db.Column(db.Enum("queued", "running", "completed", "failed", "expired", name="report_job_status"), default="queued", nullable=False)
+    progress = db.Column(db.Integer, default=0)  # percent
+    total_rows = db.Column(db.Integer)
+    file_path = db.Column(db.String(255))
+    download_token = db.Column(db.String(64), unique=True)
+    error = db.Column(db.String(500))
+    lease_until = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+    
+    # Relationships
+    user = db.relationship('User', backref='report_jobs', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_report_job_status_created', 'status', 'created_at'),
+    )
+
 class BackupLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     file_path = db.Column(db.String(255))
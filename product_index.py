@@ -0,0 +1,98 @@
+"""
+In-memory barcode/SKU index for scanner lookups
+
+Scans are exact matches, so instead of running the ``ilike`` search for
+every beep we keep a per-process hash of barcode -> product id and
+sku -> product id. The index only stores ids; the product itself is read by
+primary key so price and stock are always current.
+
+The index is built lazily on the first scan and dropped whenever products
+are created, edited, deleted or received on a purchase order in this
+process. Other gunicorn workers pick up changes through a TTL rebuild and
+a verified fallback to the unique barcode/sku columns, so a stale entry can
+never return the wrong product.
+"""
+import threading
+import time
+
+from flask import current_app
+
+from extensions import db
+from models import Product
+
+
+class ScanIndex:
+    """Hash index of barcode and SKU codes to product ids."""
+
+    def __init__(self):
+        self._barcodes = None
+        self._skus = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._barcodes = None
+            self._skus = None
+
+    def _ensure_built(self):
+        ttl = current_app.config.get('SCAN_INDEX_TTL', 300)
+        if self._barcodes is not None and time.monotonic() - self._built_at < ttl:
+            return
+        with self._lock:
+            if self._barcodes is not None and time.monotonic() - self._built_at < ttl:
+                return
+            barcodes = {}
+            skus = {}
+            for product_id, barcode, sku in db.session.query(Product.id, Product.barcode, Product.sku):
+                if barcode:
+                    barcodes[barcode] = product_id
+                if sku:
+                    skus[sku] = product_id
+            self._barcodes = barcodes
+            self._skus = skus
+            self._built_at = time.monotonic()
+
+    def lookup(self, code):
+        """
+        Find the product for a scanned barcode or SKU.
+
+        Barcodes take precedence over SKUs.
+
+        Returns:
+            Product or None
+        """
+        code = (code or '').strip()
+        if not code:
+            return None
+
+        self._ensure_built()
+        product_id = self._barcodes.get(code) or self._skus.get(code)
+        if product_id is not None:
+            product = db.session.get(Product, product_id)
+            if product and code in (product.barcode, product.sku):
+                return product
+
+        # Not indexed yet or changed by another worker: use the unique columns
+        product = Product.query.filter(Product.barcode == code).first() or \
+            Product.query.filter(Product.sku == code).first()
+        if product:
+            with self._lock:
+                if self._barcodes is not None:
+                    if product.barcode:
+                        self._barcodes[product.barcode] = product.id
+                    self._skus[product.sku] = product.id
+        return product
+
+
+scan_index = ScanIndex()
+
+
+def lookup_product_code(code):
+    """Find a product by exact barcode or SKU."""
+    return scan_index.lookup(code)
+
+
+def invalidate_scan_index():
+    """Drop the scan index after product codes may have changed."""
+    scan_index.invalidate()
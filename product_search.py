@@ -0,0 +1,344 @@
+"""
+Product search for POS typeahead and the inventory list
+
+Every backend implements the same matching rules so results are identical
+whichever database is in use:
+
+1. exact barcode
+2. SKU prefix (case-insensitive)
+3. name tokens: every query token is a prefix of some word in the name
+
+Words are runs of ``[0-9a-z]`` after lower-casing. Within a tier results
+are ordered by name (binary collation) and then id.
+
+Backends, selected with ``PRODUCT_SEARCH_BACKEND`` ('auto' picks by
+database dialect):
+
+- ``postgresql``: pg_trgm GIN indexes on lower(name) and lower(sku)
+- ``sqlite``: FTS5 shadow table ``product_search`` holding the normalised
+  name words, kept in sync by Product mapper events, and an index on
+  lower(sku)
+- ``memory``: per-process sorted prefix index, used when neither of the
+  above is available
+
+The indexes are schema (declared on Product, created by migration
+0004_product_search_indexes); only the FTS table, which SQLite cannot
+describe to Alembic, is created here at runtime.
+"""
+import bisect
+import re
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+
+from extensions import db
+from models import Product
+
+_WORD_RE = re.compile(r'[0-9a-z]+')
+
+_ensured = set()
+_ensure_lock = threading.Lock()
+
+
+def name_tokens(text):
+    """Normalised words used for name matching."""
+    return _WORD_RE.findall((text or '').lower())
+
+
+def _backend():
+    backend = current_app.config.get('PRODUCT_SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        backend = db.engine.dialect.name
+        if backend not in ('postgresql', 'sqlite'):
+            backend = 'memory'
+    if backend != 'memory' and not ensure_search_index(backend):
+        backend = 'memory'
+    return backend
+
+
+def ensure_search_index(backend=None):
+    """
+    Prepare the database search backend for the current engine.
+
+    PostgreSQL needs nothing at runtime. On SQLite the FTS table is created
+    once per process and engine, and rebuilt when it is out of step with
+    the product table.
+
+    Returns:
+        bool: True if the database backend can be used
+    """
+    backend = backend or db.engine.dialect.name
+    if backend == 'postgresql':
+        return True
+    if backend != 'sqlite':
+        return False
+
+    key = str(db.engine.url)
+    if key in _ensured:
+        return True
+
+    with _ensure_lock:
+        if key in _ensured:
+            return True
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(db.text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS product_search "
+                    "USING fts5(name_tokens, tokenize='ascii')"
+                ))
+                indexed = conn.execute(db.text('SELECT count(*) FROM product_search')).scalar()
+                products = conn.execute(db.text('SELECT count(*) FROM product')).scalar()
+                if indexed != products:
+                    rebuild_fts(conn)
+        except Exception as e:
+            current_app.logger.warning(f'Product search index unavailable, using in-memory index: {e}')
+            return False
+
+        _ensured.add(key)
+        return True
+
+
+def rebuild_fts(conn):
+    """Repopulate the SQLite FTS shadow table from the product table."""
+    conn.execute(db.text('DELETE FROM product_search'))
+    rows = conn.execute(db.text('SELECT id, name FROM product')).all()
+    if rows:
+        conn.execute(
+            db.text('INSERT INTO product_search(rowid, name_tokens) VALUES (:id, :tokens)'),
+            [{'id': row.id, 'tokens': ' '.join(name_tokens(row.name))} for row in rows]
+        )
+
+
+class PrefixIndex:
+    """
+    In-memory fallback index.
+
+    Holds sorted (word, id) and (lower sku, id) lists so every prefix lookup
+    is a bisect range scan, plus a barcode dict for exact matches.
+    """
+
+    def __init__(self):
+        self._data = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+    def _get(self):
+        ttl = current_app.config.get('SCAN_INDEX_TTL', 300)
+        data = self._data
+        if data is not None and time.monotonic() - self._built_at < ttl:
+            return data
+        with self._lock:
+            if self._data is None or time.monotonic() - self._built_at >= ttl:
+                barcodes = {}
+                skus = []
+                words = []
+                names = {}
+                categories = {}
+                rows = db.session.query(
+                    Product.id, Product.name, Product.sku, Product.barcode, Product.category
+                )
+                for product_id, name, sku, barcode, category in rows:
+                    if barcode:
+                        barcodes[barcode] = product_id
+                    skus.append(((sku or '').lower(), product_id))
+                    words.extend((word, product_id) for word in set(name_tokens(name)))
+                    names[product_id] = name or ''
+                    categories[product_id] = category
+                skus.sort()
+                words.sort()
+                self._data = (barcodes, skus, words, names, categories)
+                self._built_at = time.monotonic()
+            return self._data
+
+    @staticmethod
+    def _prefix_ids(pairs, prefix):
+        start = bisect.bisect_left(pairs, (prefix,))
+        ids = set()
+        for key, product_id in pairs[start:]:
+            if not key.startswith(prefix):
+                break
+            ids.add(product_id)
+        return ids
+
+    def ranked_ids(self, query, category=None):
+        """All matching product ids, best tier first."""
+        barcodes, skus, words, names, categories = self._get()
+        tiers = []
+
+        barcode_id = barcodes.get(query)
+        tiers.append({barcode_id} if barcode_id is not None else set())
+        tiers.append(self._prefix_ids(skus, query.lower()))
+
+        tokens = name_tokens(query)
+        if tokens:
+            ids = None
+            for token in tokens:
+                matches = self._prefix_ids(words, token)
+                ids = matches if ids is None else ids & matches
+                if not ids:
+                    break
+            tiers.append(ids or set())
+
+        ranked = []
+        seen = set()
+        for ids in tiers:
+            ids = [i for i in ids if i not in seen and (not category or categories.get(i) == category)]
+            ids.sort(key=lambda i: (names[i], i))
+            seen.update(ids)
+            ranked.extend(ids)
+        return ranked
+
+
+prefix_index = PrefixIndex()
+
+
+def _tier_criteria(query, backend):
+    """SQL criteria for each ranking tier."""
+    criteria = [Product.barcode == query]
+
+    sku_prefix = query.lower()
+    if backend == 'postgresql':
+        escaped = sku_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        criteria.append(db.func.lower(Product.sku).like(escaped + '%', escape='\\'))
+    else:
+        # Range scan on the lower(sku) expression index
+        upper = sku_prefix[:-1] + chr(ord(sku_prefix[-1]) + 1)
+        criteria.append(db.and_(
+            db.func.lower(Product.sku) >= sku_prefix,
+            db.func.lower(Product.sku) < upper
+        ))
+
+    tokens = name_tokens(query)
+    if tokens:
+        if backend == 'postgresql':
+            criteria.append(db.and_(*[
+                db.func.lower(Product.name).op('~')(f'(^|[^0-9a-z]){token}')
+                for token in tokens
+            ]))
+        else:
+            match = ' '.join(f'"{token}"*' for token in tokens)
+            criteria.append(Product.id.in_(
+                db.select(db.literal_column('rowid'))
+                .select_from(db.table('product_search'))
+                .where(db.text('product_search MATCH :match').bindparams(match=match))
+            ))
+    return criteria
+
+
+def _name_order(backend):
+    if backend == 'postgresql':
+        return Product.name.collate('C')
+    return Product.name
+
+
+def product_search_filter(query):
+    """
+    Criterion matching any search tier, for listing pages that apply their
+    own ordering and pagination.
+    """
+    query = (query or '').strip()
+    if not query:
+        return db.true()
+    backend = _backend()
+    if backend == 'memory':
+        return Product.id.in_(prefix_index.ranked_ids(query))
+    return db.or_(*_tier_criteria(query, backend))
+
+
+def search_products(query, limit=10, in_stock=False, category=None):
+    """
+    Ranked product search.
+
+    Args:
+        query: text typed or scanned by the user
+        limit: maximum number of products returned
+        in_stock: only return products with stock_quantity > 0
+        category: optional category filter
+
+    Returns:
+        list: Product objects, best match first
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+
+    filters = []
+    if in_stock:
+        filters.append(Product.stock_quantity > 0)
+    if category:
+        filters.append(Product.category == category)
+
+    backend = _backend()
+    if backend == 'memory':
+        ranked = prefix_index.ranked_ids(query, category=category)
+        results = []
+        # Fetch in ranked chunks; stock is only known to the database
+        chunk_size = max(limit * 2, 20)
+        for start in range(0, len(ranked), chunk_size):
+            chunk = ranked[start:start + chunk_size]
+            found = {p.id: p for p in Product.query.filter(Product.id.in_(chunk), *filters)}
+            results.extend(found[i] for i in chunk if i in found)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    results = []
+    seen = set()
+    for criterion in _tier_criteria(query, backend):
+        if len(results) >= limit:
+            break
+        rows = Product.query.filter(criterion, *filters).order_by(
+            _name_order(backend), Product.id
+        ).limit(limit + len(seen)).all()
+        for product in rows:
+            if product.id not in seen:
+                seen.add(product.id)
+                results.append(product)
+    return results[:limit]
+
+
+def invalidate_search_index():
+    """Drop the in-memory fallback index in this process."""
+    prefix_index.invalidate()
+
+
+def _sqlite_fts_exists(connection):
+    return connection.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'"
+    )).first() is not None
+
+
+def _sync_fts(connection, product_id, name=None, delete=False):
+    if connection.dialect.name != 'sqlite' or not _sqlite_fts_exists(connection):
+        return
+    connection.execute(db.text('DELETE FROM product_search WHERE rowid = :id'), {'id': product_id})
+    if not delete:
+        connection.execute(
+            db.text('INSERT INTO product_search(rowid, name_tokens) VALUES (:id, :tokens)'),
+            {'id': product_id, 'tokens': ' '.join(name_tokens(name))}
+        )
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    _sync_fts(connection, target.id, target.name)
+    prefix_index.invalidate()
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    if db.inspect(target).attrs.name.history.has_changes():
+        _sync_fts(connection, target.id, target.name)
+    prefix_index.invalidate()
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    _sync_fts(connection, target.id, delete=True)
+    prefix_index.invalidate()
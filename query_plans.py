@@ -0,0 +1,115 @@
+"""
+Query plan check for the hot query paths
+
+``flask check-query-plans`` runs EXPLAIN on the queries nearly every screen
+issues (completed sales by date, held sales, a product's sale items, a
+customer's credit history, the activity log) and exits non-zero if any of
+them reads its table with a full sequential scan, i.e. if an index from
+``migrations/versions/0003_hot_path_indexes.py`` is missing or unusable.
+
+On PostgreSQL sequential scans are disabled for the check, so the planner
+picks an index whenever one applies, however small the tables are; SQLite
+prefers a usable index on its own. Run it against a seeded database after
+changing these queries or the indexes.
+
+Low stock lists are not checked: they compare stock with each product's
+forecast or manual reorder level, which no index can search.
+"""
+import json
+from datetime import datetime, timedelta
+
+import click
+
+from extensions import db
+from models import CreditTransaction, Sale, SaleItem, UserActivityLog
+from report_exports import completed_sales_between
+
+
+def hot_queries():
+    """(name, query) for each hot path, with representative parameters."""
+    end = datetime.utcnow()
+    start = end - timedelta(days=30)
+    return [
+        ('completed sales in a date range',
+         completed_sales_between(db.session.query(Sale.id, Sale.total_amount), start, end)),
+        ('sales report page',
+         completed_sales_between(Sale.query, start, end).order_by(Sale.created_at.desc(), Sale.id.desc()).limit(50)),
+        ('held sales',
+         Sale.query.filter(Sale.status == 'on_hold').order_by(Sale.created_at.desc())),
+        ('units sold of a product',
+         db.session.query(db.func.sum(SaleItem.quantity)).filter(SaleItem.product_id == 1)),
+        ('customer credit history',
+         CreditTransaction.query.filter_by(customer_id=1).order_by(CreditTransaction.created_at.desc())),
+        ('recent activity',
+         UserActivityLog.query.order_by(UserActivityLog.timestamp.desc()).limit(20)),
+    ]
+
+
+def _explain(query):
+    """Plan lines and the tables read with a sequential scan."""
+    statement = query.statement
+    dialect = db.engine.dialect
+    # Render with :name parameters so text() can bind them on any backend
+    compiled = statement.compile(dialect=type(dialect)(paramstyle='named'))
+
+    if dialect.name == 'postgresql':
+        result = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {compiled}'), compiled.params).scalar()
+        plan = result if isinstance(result, list) else json.loads(result)
+        lines, scanned = [], []
+        nodes = [(plan[0]['Plan'], 0)]
+        while nodes:
+            node, depth = nodes.pop()
+            relation = node.get('Relation Name')
+            lines.append('  ' * depth + node['Node Type'] + (f' on {relation}' if relation else ''))
+            if node['Node Type'] == 'Seq Scan':
+                scanned.append(relation)
+            nodes.extend((child, depth + 1) for child in reversed(node.get('Plans', [])))
+        return lines, scanned
+
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}'), compiled.params).all()
+    lines = [row[-1] for row in rows]
+    scanned = [
+        line.split()[1] for line in lines
+        if line.startswith('SCAN ') and ' USING ' not in line
+    ]
+    return lines, scanned
+
+
+def check_query_plans():
+    """
+    EXPLAIN every hot query.
+
+    Returns:
+        list: (name, plan lines, tables read with a sequential scan)
+    """
+    results = []
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        for name, query in hot_queries():
+            lines, scanned = _explain(query)
+            results.append((name, lines, scanned))
+    finally:
+        db.session.rollback()
+    return results
+
+
+def init_query_plans(app):
+    """Register the query plan check command."""
+
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='Print every plan, not only failing ones')
+    def check_query_plans_command(verbose):
+        """Fail if a hot query falls back to a sequential scan."""
+        failed = 0
+        for name, lines, scanned in check_query_plans():
+            if scanned:
+                failed += 1
+                print(f"FAIL {name}: sequential scan on {', '.join(scanned)}")
+            else:
+                print(f"ok   {name}")
+            if scanned or verbose:
+                for line in lines:
+                    print(f"       {line}")
+        if failed:
+            raise SystemExit(1)
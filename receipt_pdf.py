@@ -0,0 +1,248 @@
+"""
+Thermal receipt PDF rendering for the POS System
+
+Styles are built once at import. Rendered PDFs are cached by sale id and a
+version hash of everything printed on the receipt that can still change
+(sale status, amounts, customer, business settings): first in an
+in-process LRU, then on disk at ``Receipt.file_path``. A reprint is a
+memory hit or a file read instead of a ReportLab layout pass.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from flask import current_app
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from extensions import db
+from models import BusinessSettings
+
+# 80mm thermal receipt (3.15 inches wide), long receipt format
+THERMAL_PAGESIZE = (3.15*inch, 11*inch)
+
+STYLES = getSampleStyleSheet()
+
+TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=STYLES['Heading1'],
+    fontSize=12,
+    spaceAfter=6,
+    alignment=1  # Center alignment for thermal receipt
+)
+
+CONTACT_STYLE = ParagraphStyle(
+    'ContactInfo',
+    parent=STYLES['Normal'],
+    fontSize=8,
+    spaceAfter=3,
+    alignment=1  # Center alignment
+)
+
+SALE_INFO_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+
+ITEMS_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (2, 0), (3, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 7),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
+])
+
+
+class PDFCache:
+    """Small thread-safe LRU of rendered PDFs."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._entries[key] = data
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+pdf_cache = PDFCache()
+
+
+def render_receipt_pdf(sale, business_settings=None):
+    """
+    Lay out the thermal receipt for a sale.
+
+    Returns:
+        bytes: the PDF document
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=THERMAL_PAGESIZE, leftMargin=0.1*inch, rightMargin=0.1*inch, topMargin=0.2*inch, bottomMargin=0.2*inch)
+    elements = []
+
+    # Title
+    business_name = "SALE RECEIPT"
+    if business_settings and business_settings.business_name:
+        business_name = f"{business_settings.business_name} - SALE RECEIPT"
+
+    elements.append(Paragraph(business_name, TITLE_STYLE))
+
+    # Add business contact information
+    if business_settings:
+        if business_settings.contact_email:
+            elements.append(Paragraph(f"Email: {business_settings.contact_email}", CONTACT_STYLE))
+
+        if business_settings.contact:
+            elements.append(Paragraph(f"Phone: {business_settings.contact}", CONTACT_STYLE))
+
+    elements.append(Spacer(1, 10))
+
+    # Sale information
+    sale_info = [
+        ['Sale ID:', f"#{sale.id}"],
+        ['Date:', sale.created_at.strftime('%d/%m/%Y %H:%M')],
+        ['Cashier:', sale.cashier.username],
+        ['Payment Method:', sale.payment_method.title()],
+        ['Status:', sale.status.title()]
+    ]
+
+    if sale.customer:
+        sale_info.extend([
+            ['Customer:', sale.customer.name],
+            ['Phone:', sale.customer.phone or 'N/A'],
+            ['Email:', sale.customer.email or 'N/A']
+        ])
+
+    sale_table = Table(sale_info, colWidths=[0.8*inch, 2.2*inch])
+    sale_table.setStyle(SALE_INFO_TABLE_STYLE)
+    elements.append(sale_table)
+    elements.append(Spacer(1, 20))
+
+    # Items table
+    elements.append(Paragraph("Items Purchased", STYLES['Heading2']))
+    elements.append(Spacer(1, 10))
+
+    # Table header - simplified for thermal receipt
+    items_data = [['Product', 'Qty', 'Price', 'Total']]
+
+    for item in sale.items:
+        items_data.append([
+            item.product.name[:20],  # Truncate long product names
+            str(item.quantity),
+            f"GH₵{item.unit_price:.2f}",
+            f"GH₵{item.total_price:.2f}"
+        ])
+
+    # Add totals rows
+    subtotal = sale.total_amount + sale.discount_amount
+    items_data.append(['', '', 'Subtotal:', f"GH₵{subtotal:.2f}"])
+
+    if sale.discount_amount > 0:
+        items_data.append(['', '', 'Discount:', f"-GH₵{sale.discount_amount:.2f}"])
+
+    items_data.append(['', '', 'Total:', f"GH₵{sale.total_amount:.2f}"])
+
+    items_table = Table(items_data, colWidths=[1.4*inch, 0.4*inch, 0.4*inch, 0.7*inch])
+    items_table.setStyle(ITEMS_TABLE_STYLE)
+
+    elements.append(items_table)
+    elements.append(Spacer(1, 20))
+
+    # Footer
+    elements.append(Paragraph("Thank you for your purchase!", STYLES['Normal']))
+    elements.append(Paragraph(f"Receipt Number: {sale.receipt.receipt_number}", STYLES['Normal']))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def receipt_version(sale, business_settings=None):
+    """Short hash of the receipt content that can change after checkout."""
+    parts = [
+        sale.id,
+        sale.status,
+        sale.total_amount,
+        sale.discount_amount,
+        sale.payment_method,
+        sale.customer_id,
+        business_settings.updated_at.isoformat() if business_settings and business_settings.updated_at else None,
+    ]
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def _receipt_dir():
+    return current_app.config.get('RECEIPT_CACHE_DIR') or os.path.join(os.getcwd(), 'receipts')
+
+
+def get_receipt_pdf(sale):
+    """
+    Cached receipt PDF for a sale.
+
+    Returns:
+        bytes: the PDF document
+    """
+    business_settings = BusinessSettings.query.first()
+    version = receipt_version(sale, business_settings)
+    key = (sale.id, version)
+
+    pdf = pdf_cache.get(key)
+    if pdf is not None:
+        return pdf
+
+    receipt = sale.receipt
+    filename = f"receipt_{receipt.receipt_number}_{version}.pdf"
+    path = os.path.join(_receipt_dir(), filename)
+
+    # Another worker (or an earlier request) may already have rendered it
+    if receipt.file_path and os.path.basename(receipt.file_path) == filename and os.path.exists(receipt.file_path):
+        with open(receipt.file_path, 'rb') as f:
+            pdf = f.read()
+        pdf_cache.put(key, pdf)
+        return pdf
+
+    pdf = render_receipt_pdf(sale, business_settings)
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+
+        old_path = receipt.file_path
+        receipt.file_path = path
+        db.session.commit()
+
+        if old_path and old_path != path and os.path.exists(old_path):
+            os.remove(old_path)
+    except OSError as e:
+        # The disk copy is only a cache; serve the rendered PDF anyway
+        db.session.rollback()
+        current_app.logger.warning(f"Could not store receipt {receipt.receipt_number}: {e}")
+
+    pdf_cache.put(key, pdf)
+    return pdf
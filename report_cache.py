@@ -0,0 +1,161 @@
+"""
+Report result cache for the POS System
+
+Heavy report queries are cached per process, keyed by report name and
+parameters, with a TTL and LRU eviction. Every entry remembers the
+``reports`` data version it was computed at. The version lives in the
+``cache_version`` table and is bumped after any committed write to sales,
+sale items or products, so an invalidation made by one gunicorn worker is
+seen by all of them. A cache hit costs the one query that reads the version.
+
+Writes are detected with session events rather than at each call site:
+ORM flushes of Sale/SaleItem/Product rows and Core INSERT/UPDATE/DELETE
+statements against their tables both mark the session, and the bump runs
+once that session has committed, in its own short transaction. Bumping
+inside the writer's transaction would hold the lock on the shared
+``cache_version`` row until commit and serialise every checkout behind it.
+A result computed between the commit and the bump is stored under the old
+version and dropped by the bump; if the bump itself fails, entries expire
+after ``REPORT_CACHE_TTL``.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import CacheVersion, Product, Sale, SaleItem
+
+REPORTS_VERSION = 'reports'
+
+WATCHED_MODELS = (Sale, SaleItem, Product)
+WATCHED_TABLES = frozenset(model.__tablename__ for model in WATCHED_MODELS)
+
+
+class ReportCache:
+    """Thread-safe LRU of report results with a TTL and a data version."""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, ttl):
+        """Cached value, or None if missing, expired or from an older version."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_version, stored_at, value = entry
+            if entry_version != version or time.monotonic() - stored_at > ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+report_cache = ReportCache()
+
+
+def current_version(name=REPORTS_VERSION):
+    version = db.session.query(CacheVersion.version).filter(CacheVersion.name == name).scalar()
+    return version or 0
+
+
+def bump_version(connection, name=REPORTS_VERSION):
+    """Bump a version in the connection's current transaction."""
+    table = CacheVersion.__table__
+    bump = (
+        db.update(table)
+        .where(table.c.name == name)
+        .values(version=table.c.version + 1)
+    )
+    if connection.execute(bump).rowcount:
+        return
+    # First bump ever; another worker may be creating the row too
+    try:
+        with connection.begin_nested():
+            connection.execute(db.insert(table), [{'name': name, 'version': 1}])
+    except IntegrityError:
+        connection.execute(bump)
+
+
+def cached_report(name, params, compute):
+    """
+    Report result from the cache, computing and storing it on a miss.
+
+    Args:
+        name: report name
+        params: hashable tuple of everything the result depends on
+        compute: callable returning the result; it must be plain data
+            (dicts, lists, numbers), not ORM instances bound to a session
+
+    Returns:
+        the cached or freshly computed result
+    """
+    ttl = current_app.config.get('REPORT_CACHE_TTL', 60)
+    report_cache.max_entries = current_app.config.get('REPORT_CACHE_MAX_ENTRIES', 128)
+    version = current_version()
+    key = (name, params)
+
+    value = report_cache.get(key, version, ttl)
+    if value is None:
+        value = compute()
+        report_cache.put(key, version, value)
+    return value
+
+
+@event.listens_for(Session, 'before_flush')
+def _mark_flushed_writes(session, flush_context, instances):
+    if session.info.get('bump_reports'):
+        return
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, WATCHED_MODELS):
+            session.info['bump_reports'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if table is not None and table.name in WATCHED_TABLES:
+        orm_execute_state.session.info['bump_reports'] = True
+
+
+@event.listens_for(Session, 'before_commit')
+def _flush_before_commit(session):
+    session.flush()  # commit would flush after this hook; pending writes must mark the session first
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    if not session.info.pop('bump_reports', None):
+        return
+    # The session cannot run SQL here; use a separate short transaction
+    try:
+        with session.get_bind(CacheVersion).begin() as connection:
+            bump_version(connection)
+    except Exception as e:
+        current_app.logger.warning(f"Could not bump the reports cache version: {str(e)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_writes(session):
+    session.info.pop('bump_reports', None)
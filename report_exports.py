@@ -0,0 +1,394 @@
+"""
+Report exports for the POS System
+
+Each export is a header plus a generator of plain row tuples read with one
+query: related names are joined in, per-sale item counts are computed in
+SQL, and rows are fetched in ``EXPORT_BATCH_SIZE`` batches
+(``yield_per``, a server-side cursor on PostgreSQL). Writers consume the
+generator as it is produced, so memory use does not grow with the number
+of rows.
+
+CSV is streamed straight to the client. XLSX workbooks are written with
+openpyxl's write-only mode to a temporary file, which is then sent and
+removed; summary sheets are accumulated while the detail rows stream past,
+so every workbook is a single pass over its query. PDF reports are drawn
+row by row on a ReportLab canvas rather than laid out as one platypus
+Table, so a year of sales renders in bounded memory.
+"""
+import csv
+import io
+import os
+import tempfile
+
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from extensions import db
+from models import Customer, Product, Sale, SaleItem, Supplier, User
+
+EXPORT_BATCH_SIZE = 1000
+
+SALES_EXPORT_HEADER = ['Sale ID', 'Date', 'Cashier', 'Customer', 'Items', 'Subtotal', 'Discount', 'Total', 'Payment Method']
+
+INVENTORY_EXPORT_HEADER = ['SKU', 'Name', 'Category', 'Price', 'Cost Price', 'Stock', 'Low Stock Threshold', 'Supplier']
+
+STAFF_EXPORT_HEADER = ['Username', 'Role', 'Sales', 'Revenue', 'Average Sale']
+
+PRODUCT_EXPORT_HEADER = ['SKU', 'Name', 'Category', 'Stock', 'Units Sold', 'Revenue', 'COGS', 'Gross Profit', 'Margin %']
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def completed_sales_between(query, start=None, end=None):
+    """Limit a query to completed sales in the naive UTC range [start, end)."""
+    query = query.filter(Sale.status == 'completed')
+    if start:
+        query = query.filter(Sale.created_at >= start)
+    if end:
+        query = query.filter(Sale.created_at < end)
+    return query
+
+
+def sales_export_rows(start=None, end=None):
+    """Completed sales in [start, end), newest first, as SALES_EXPORT_HEADER rows."""
+    item_count = db.select(db.func.count(SaleItem.id)).where(
+        SaleItem.sale_id == Sale.id
+    ).correlate(Sale).scalar_subquery()
+
+    query = db.session.query(
+        Sale.id,
+        Sale.created_at,
+        User.username,
+        Customer.name,
+        item_count,
+        Sale.total_amount,
+        Sale.discount_amount,
+        Sale.payment_method
+    ).outerjoin(User, User.id == Sale.cashier_id).outerjoin(
+        Customer, Customer.id == Sale.customer_id
+    )
+    query = completed_sales_between(query, start, end).order_by(Sale.created_at.desc(), Sale.id.desc())
+
+    for sale_id, created_at, cashier, customer, items, total, discount, payment_method in \
+            query.execution_options(yield_per=EXPORT_BATCH_SIZE):
+        yield (
+            sale_id,
+            created_at.replace(microsecond=0),  # 'YYYY-MM-DD HH:MM:SS' in CSV, a date cell in XLSX
+            cashier or 'N/A',
+            customer or 'Walk-in',
+            items,
+            total + discount,
+            discount,
+            total,
+            payment_method
+        )
+
+
+def inventory_export_rows():
+    """All products as INVENTORY_EXPORT_HEADER rows."""
+    query = db.session.query(
+        Product.sku,
+        Product.name,
+        Product.category,
+        Product.price,
+        Product.cost_price,
+        Product.stock_quantity,
+        Product.low_stock_threshold,
+        Supplier.name
+    ).outerjoin(Supplier, Supplier.id == Product.supplier_id).order_by(Product.id)
+
+    for sku, name, category, price, cost_price, stock, threshold, supplier in \
+            query.execution_options(yield_per=EXPORT_BATCH_SIZE):
+        yield (
+            sku,
+            name,
+            category or 'N/A',
+            price,
+            cost_price or 'N/A',
+            stock,
+            threshold,
+            supplier or 'N/A'
+        )
+
+
+def product_performance_query(start=None, end=None):
+    """
+    Units sold, revenue, cost of goods and margin of completed sales per product.
+
+    Costs come from ``SaleItem.unit_cost``, the cost price recorded when the
+    item was sold; lines sold before that was recorded fall back to the
+    product's current cost price. Lines with no known cost are left out of
+    COGS, gross profit and margin rather than counted as free, so ``margin``
+    (a percentage) is None for a product none of whose sales can be costed.
+    Everything is aggregated in the one ``GROUP BY``.
+    """
+    unit_cost = db.func.coalesce(SaleItem.unit_cost, Product.cost_price)
+    costed_revenue = db.func.sum(db.case((unit_cost.isnot(None), SaleItem.total_price)))
+    cogs = db.func.sum(SaleItem.quantity * unit_cost)
+    gross_profit = costed_revenue - cogs
+
+    query = db.session.query(
+        Product.id,
+        Product.name,
+        Product.sku,
+        Product.category,
+        Product.stock_quantity,
+        db.func.sum(SaleItem.quantity).label('total_sold'),
+        db.func.sum(SaleItem.total_price).label('total_revenue'),
+        cogs.label('cogs'),
+        gross_profit.label('gross_profit'),
+        db.case(
+            (costed_revenue > 0, gross_profit * 100.0 / costed_revenue)
+        ).label('margin')
+    ).outerjoin(SaleItem).outerjoin(Sale)
+    return completed_sales_between(query, start, end).group_by(
+        Product.id, Product.name, Product.sku, Product.category, Product.stock_quantity
+    )
+
+
+def staff_performance_query(start=None, end=None):
+    """Completed sales count, revenue and average sale per user."""
+    query = db.session.query(
+        User.id,
+        User.username,
+        User.role,
+        db.func.count(Sale.id).label('total_sales'),
+        db.func.sum(Sale.total_amount).label('total_revenue'),
+        db.func.avg(Sale.total_amount).label('avg_sale')
+    ).outerjoin(Sale)
+    return completed_sales_between(query, start, end).group_by(User.id, User.username, User.role)
+
+
+def product_export_rows(start=None, end=None):
+    """Product performance as PRODUCT_EXPORT_HEADER rows, best sellers first."""
+    query = product_performance_query(start, end).order_by(db.func.sum(SaleItem.total_price).desc(), Product.id)
+    for product in query.execution_options(yield_per=EXPORT_BATCH_SIZE):
+        yield (
+            product.sku,
+            product.name,
+            product.category or 'N/A',
+            product.stock_quantity,
+            product.total_sold or 0,
+            product.total_revenue or 0,
+            product.cogs if product.cogs is not None else 'N/A',
+            product.gross_profit if product.gross_profit is not None else 'N/A',
+            round(product.margin, 1) if product.margin is not None else 'N/A'
+        )
+
+
+def staff_export_rows(start=None, end=None):
+    """Staff performance as STAFF_EXPORT_HEADER rows."""
+    query = staff_performance_query(start, end).order_by(db.func.sum(Sale.total_amount).desc(), User.id)
+    for user in query.execution_options(yield_per=EXPORT_BATCH_SIZE):
+        yield (
+            user.username,
+            user.role,
+            user.total_sales,
+            user.total_revenue or 0,
+            round(user.avg_sale or 0, 2)
+        )
+
+
+def iter_csv(header, rows, rows_per_chunk=EXPORT_BATCH_SIZE):
+    """Encode rows as CSV, yielding one bytes chunk per rows_per_chunk rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    pending = 1
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode('utf-8')
+
+
+def csv_response(filename, header, rows):
+    """Streaming CSV download; rows are read while the response is sent."""
+    return Response(
+        stream_with_context(iter_csv(header, rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def _header_row(sheet, header):
+    cells = []
+    for title in header:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    return cells
+
+
+def _new_sheet(workbook, title, header):
+    sheet = workbook.create_sheet(title)
+    sheet.append(_header_row(sheet, header))
+    return sheet
+
+
+def write_sales_workbook(path, rows=None):
+    """Sales detail plus a per-payment-method summary sheet."""
+    workbook = Workbook(write_only=True)
+    summary = _new_sheet(workbook, 'Summary', ['Payment Method', 'Sales', 'Subtotal', 'Discount', 'Total'])
+    detail = _new_sheet(workbook, 'Sales', SALES_EXPORT_HEADER)
+
+    by_method = {}
+    for row in sales_export_rows() if rows is None else rows:
+        detail.append(row)
+        totals = by_method.setdefault(row[8], [0, 0.0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += row[5]
+        totals[2] += row[6]
+        totals[3] += row[7]
+
+    for method in sorted(by_method, key=lambda m: m or ''):
+        summary.append([method or 'N/A'] + by_method[method])
+    summary.append(['Total'] + [sum(totals[i] for totals in by_method.values()) for i in range(4)])
+    workbook.save(path)
+
+
+def write_inventory_workbook(path, rows=None):
+    """Inventory detail plus a per-category stock summary sheet."""
+    workbook = Workbook(write_only=True)
+    summary = _new_sheet(workbook, 'Summary', ['Category', 'Products', 'Units in Stock', 'Stock Value (Cost)', 'Low Stock'])
+    detail = _new_sheet(workbook, 'Inventory', INVENTORY_EXPORT_HEADER)
+
+    by_category = {}
+    for row in inventory_export_rows() if rows is None else rows:
+        detail.append(row)
+        sku, name, category, price, cost_price, stock, threshold, supplier = row
+        totals = by_category.setdefault(category, [0, 0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += stock or 0
+        if cost_price != 'N/A':
+            totals[2] += (stock or 0) * cost_price
+        if threshold is not None and (stock or 0) <= threshold:
+            totals[3] += 1
+
+    for category in sorted(by_category):
+        summary.append([category] + by_category[category])
+    summary.append(['Total'] + [sum(totals[i] for totals in by_category.values()) for i in range(4)])
+    workbook.save(path)
+
+
+def write_single_sheet_workbook(path, title, header, rows):
+    workbook = Workbook(write_only=True)
+    sheet = _new_sheet(workbook, title, header)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+PDF_FONT = 'Helvetica'
+PDF_FONT_SIZE = 8
+PDF_ROW_HEIGHT = 12
+
+
+def _pdf_text(value, width):
+    """Cell text clipped to the column width."""
+    if isinstance(value, float):
+        text = f"{value:.2f}"
+    elif hasattr(value, 'strftime'):
+        text = value.strftime('%Y-%m-%d %H:%M')
+    else:
+        text = '' if value is None else str(value)
+    while text and stringWidth(text, PDF_FONT, PDF_FONT_SIZE) > width - 4:
+        text = text[:-1]
+    return text
+
+
+def write_pdf_report(path, title, header, rows, subtitle=None):
+    """
+    Draw a tabular report straight onto PDF pages.
+
+    Columns share the landscape page width equally; the header is repeated
+    on every page and a page number printed in the footer.
+    """
+    page_width, page_height = landscape(letter)
+    margin = 0.5 * inch
+    column_width = (page_width - 2 * margin) / len(header)
+    pdf = canvas.Canvas(path, pagesize=(page_width, page_height))
+    pdf.setTitle(title)
+    page = 0
+
+    def start_page():
+        nonlocal page
+        page += 1
+        y = page_height - margin
+        if page == 1:
+            pdf.setFont('Helvetica-Bold', 14)
+            pdf.drawString(margin, y - 14, title)
+            y -= 20
+            if subtitle:
+                pdf.setFont(PDF_FONT, 9)
+                pdf.drawString(margin, y - 10, subtitle)
+                y -= 14
+            y -= 6
+        pdf.setFont('Helvetica-Bold', PDF_FONT_SIZE)
+        for index, title_text in enumerate(header):
+            pdf.drawString(margin + index * column_width + 2, y - 9, _pdf_text(title_text, column_width))
+        pdf.line(margin, y - PDF_ROW_HEIGHT, page_width - margin, y - PDF_ROW_HEIGHT)
+        pdf.setFont(PDF_FONT, 7)
+        pdf.drawRightString(page_width - margin, margin / 2, f"Page {page}")
+        pdf.setFont(PDF_FONT, PDF_FONT_SIZE)
+        return y - PDF_ROW_HEIGHT
+
+    y = start_page()
+    for row in rows:
+        if y - PDF_ROW_HEIGHT < margin:
+            pdf.showPage()
+            y = start_page()
+        for index, value in enumerate(row):
+            pdf.drawString(margin + index * column_width + 2, y - 9, _pdf_text(value, column_width))
+        y -= PDF_ROW_HEIGHT
+    pdf.save()
+
+
+def _read_and_remove(path, chunk_size=64 * 1024):
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def xlsx_response(filename, write):
+    """
+    Build a workbook in a temporary file and stream it, removing the file
+    once the response is closed.
+
+    Args:
+        filename: download name
+        write: callable taking the temporary file path
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write(path)
+        size = os.path.getsize(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return Response(
+        _read_and_remove(path),
+        mimetype=XLSX_MIMETYPE,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Content-Length': str(size)
+        }
+    )
@@ -0,0 +1,322 @@
+"""
+Background report jobs for the POS System
+
+Large reports (a year of sales as PDF, for example) are too slow to build
+inside a request. ``queue_report`` stores a ``ReportJob`` and wakes the
+worker pool; a worker claims the job with a conditional UPDATE and a lease
+(as the email outbox does), renders it from the streaming row generators in
+report_exports.py into ``REPORT_JOB_DIR`` and publishes a download token
+that stops working after ``REPORT_JOB_TTL`` seconds. Expired files are
+removed by the workers, which also keep the analytics snapshot
+(sales_snapshot.py), demand forecasts (demand_forecast.py) and basket
+analysis (basket_analysis.py) fresh.
+
+Progress is published every few hundred rows. On PostgreSQL it is written
+to the job row through a separate connection so any web worker can report
+it; SQLite cannot take that write while the report query is still reading,
+so there progress is kept in process memory (SQLite deployments run a
+single process anyway) and the row is updated when the job finishes.
+"""
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from basket_analysis import maybe_run_basket_analysis
+from demand_forecast import maybe_recompute_forecasts
+from extensions import db
+from models import Product, ReportJob, Sale
+from report_exports import (
+    INVENTORY_EXPORT_HEADER, PRODUCT_EXPORT_HEADER, SALES_EXPORT_HEADER, STAFF_EXPORT_HEADER,
+    completed_sales_between, inventory_export_rows, iter_csv, product_export_rows,
+    product_performance_query, sales_export_rows, staff_export_rows, staff_performance_query,
+    write_inventory_workbook, write_pdf_report, write_sales_workbook, write_single_sheet_workbook
+)
+from sales_rollup import business_timezone, utc_bounds
+from sales_snapshot import maybe_refresh_snapshot
+
+FORMATS = ('pdf', 'csv', 'xlsx')
+
+REPORTS = {
+    'sales': {
+        'title': 'Sales Report',
+        'header': SALES_EXPORT_HEADER,
+        'rows': sales_export_rows,
+        'count': lambda start, end: completed_sales_between(db.session.query(Sale.id), start, end).count(),
+        'workbook': write_sales_workbook,
+    },
+    'inventory': {
+        'title': 'Inventory Report',
+        'header': INVENTORY_EXPORT_HEADER,
+        'rows': lambda start, end: inventory_export_rows(),
+        'count': lambda start, end: Product.query.count(),
+        'workbook': write_inventory_workbook,
+    },
+    'staff': {
+        'title': 'Staff Performance Report',
+        'header': STAFF_EXPORT_HEADER,
+        'rows': staff_export_rows,
+        'count': lambda start, end: staff_performance_query(start, end).count(),
+    },
+    'products': {
+        'title': 'Product Performance Report',
+        'header': PRODUCT_EXPORT_HEADER,
+        'rows': product_export_rows,
+        'count': lambda start, end: product_performance_query(start, end).count(),
+    },
+}
+
+JOB_LEASE = timedelta(minutes=10)
+PROGRESS_STEP = 500  # rows between progress updates
+
+_workers = []
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+_live_progress = {}  # job id -> percent, for jobs running in this process
+
+
+class ReportJobError(ValueError):
+    """Raised when a report job request is invalid."""
+
+
+def _report_dir():
+    return current_app.config.get('REPORT_JOB_DIR') or os.path.join(os.getcwd(), 'report_files')
+
+
+def queue_report(user_id, report_type, format, start_date=None, end_date=None):
+    """
+    Queue a report for background rendering.
+
+    Args:
+        user_id: user requesting the report
+        report_type: one of REPORTS
+        format: 'pdf', 'csv' or 'xlsx'
+        start_date, end_date: optional business days (inclusive)
+
+    Returns:
+        ReportJob: the queued job
+
+    Raises:
+        ReportJobError: if the report type, format or date range is invalid
+    """
+    if report_type not in REPORTS:
+        raise ReportJobError(f'Unknown report: {report_type}')
+    if format not in FORMATS:
+        raise ReportJobError(f'Unknown format: {format}')
+    if start_date and end_date and start_date > end_date:
+        raise ReportJobError('Start date must be before end date')
+
+    job = ReportJob(
+        user_id=user_id,
+        report_type=report_type,
+        format=format,
+        start_date=start_date,
+        end_date=end_date,
+        status='queued',
+        progress=0
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    ensure_workers(current_app._get_current_object())
+    _wakeup.set()
+    return job
+
+
+def job_progress(job):
+    """Percent complete, preferring the live value of a job running here."""
+    if job.status == 'running' and job.id in _live_progress:
+        return _live_progress[job.id]
+    return job.progress or 0
+
+
+def _claim_next():
+    """Claim the oldest queued (or abandoned) job; returns its id or None."""
+    now = datetime.utcnow()
+    candidates = db.session.query(ReportJob.id, ReportJob.status).filter(
+        db.or_(
+            ReportJob.status == 'queued',
+            db.and_(ReportJob.status == 'running', ReportJob.lease_until < now)
+        )
+    ).order_by(ReportJob.created_at, ReportJob.id).limit(5).all()
+
+    for job_id, status in candidates:
+        if job_id in _live_progress:
+            continue  # still running in this process
+        conditions = [ReportJob.id == job_id, ReportJob.status == status]
+        if status == 'running':
+            conditions.append(ReportJob.lease_until < now)
+        result = db.session.execute(
+            db.update(ReportJob)
+            .where(*conditions)
+            .values(status='running', progress=0, started_at=now, lease_until=now + JOB_LEASE)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            db.session.commit()
+            return job_id
+    db.session.commit()
+    return None
+
+
+def _publish_progress(job_id, percent):
+    _live_progress[job_id] = percent
+    if db.engine.dialect.name == 'sqlite':
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.update(ReportJob)
+                .where(ReportJob.id == job_id)
+                .values(progress=percent, lease_until=datetime.utcnow() + JOB_LEASE)
+            )
+    except Exception as e:
+        current_app.logger.warning(f"Could not update progress of report job {job_id}: {str(e)}")
+
+
+def _tracked(rows, job_id, total):
+    """Pass rows through, publishing progress as they are consumed."""
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % PROGRESS_STEP == 0 and total:
+            _publish_progress(job_id, min(99, done * 100 // total))
+
+
+def _render(job, path):
+    spec = REPORTS[job.report_type]
+    tz = business_timezone()
+    start = utc_bounds(job.start_date, job.start_date, tz)[0] if job.start_date else None
+    end = utc_bounds(job.end_date, job.end_date, tz)[1] if job.end_date else None
+
+    total = spec['count'](start, end)
+    job.total_rows = total
+    db.session.commit()
+    rows = _tracked(spec['rows'](start, end), job.id, total)
+
+    if job.format == 'csv':
+        with open(path, 'wb') as f:
+            for chunk in iter_csv(spec['header'], rows):
+                f.write(chunk)
+    elif job.format == 'xlsx':
+        if 'workbook' in spec:
+            spec['workbook'](path, rows)
+        else:
+            write_single_sheet_workbook(path, spec['title'].replace(' Report', ''), spec['header'], rows)
+    else:
+        period = 'All time'
+        if job.start_date or job.end_date:
+            period = f"{job.start_date or '...'} to {job.end_date or '...'}"
+        write_pdf_report(
+            path, spec['title'], spec['header'], rows,
+            subtitle=f"{period} - generated {datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC"
+        )
+
+
+def run_job(job_id):
+    """Render a claimed job and record the outcome."""
+    job = db.session.get(ReportJob, job_id)
+    directory = _report_dir()
+    token = secrets.token_urlsafe(32)
+    path = os.path.join(directory, f"report_{job.id}_{job.report_type}.{job.format}")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    _live_progress[job_id] = 0
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        _render(job, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Report job {job_id} failed: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        job = db.session.get(ReportJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)[:500]
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return False
+    finally:
+        _live_progress.pop(job_id, None)
+
+    finished = datetime.utcnow()
+    job.status = 'completed'
+    job.progress = 100
+    job.file_path = path
+    job.download_token = token
+    job.finished_at = finished
+    job.expires_at = finished + timedelta(seconds=current_app.config.get('REPORT_JOB_TTL', 86400))
+    job.lease_until = None
+    db.session.commit()
+    return True
+
+
+def purge_expired_reports():
+    """Delete files of expired reports. Returns the number of jobs expired."""
+    expired = ReportJob.query.filter(
+        ReportJob.status == 'completed',
+        ReportJob.expires_at < datetime.utcnow()
+    ).all()
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        job.status = 'expired'
+        job.file_path = None
+        job.download_token = None
+    db.session.commit()
+    return len(expired)
+
+
+def run_worker(app, stop_event=None):
+    """Render queued reports until stop_event is set."""
+    poll_interval = 5
+    while not (stop_event and stop_event.is_set()):
+        _wakeup.clear()
+        job_id = None
+        with app.app_context():
+            try:
+                purge_expired_reports()
+                maybe_refresh_snapshot()
+                maybe_recompute_forecasts()
+                maybe_run_basket_analysis()
+                job_id = _claim_next()
+                if job_id:
+                    run_job(job_id)
+            except Exception as e:
+                app.logger.error(f"Report worker error: {str(e)}")
+            finally:
+                db.session.remove()
+        if not job_id:
+            _wakeup.wait(poll_interval)
+
+
+def ensure_workers(app):
+    """Start this process's report worker threads if they are not running."""
+    size = app.config.get('REPORT_JOB_WORKERS', 2)
+    if size <= 0:
+        return
+    if len(_workers) == size and all(worker.is_alive() for worker in _workers):
+        return
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        while len(_workers) < size:
+            worker = threading.Thread(target=run_worker, args=(app,), name=f'report-worker-{len(_workers)}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def init_report_jobs(app):
+    """Register the report workers with the application."""
+
+    @app.before_request
+    def start_report_workers():
+        ensure_workers(app)
+
+    @app.cli.command('run-report-jobs')
+    def run_report_jobs_command():
+        """Run a report worker in the foreground."""
+        run_worker(app)
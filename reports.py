@@ -1,11 +1,24 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file, current_app
 from flask_login import login_required, current_user
 from extensions import db
-from models import Sale, SaleItem, Product, User, Customer
+from models import Sale, SaleItem, Product, User, Customer, Supplier, ReportJob
+from sales_rollup import business_timezone, business_today, utc_bounds, summary_totals
+from report_exports import (
+    csv_response, xlsx_response, sales_export_rows, inventory_export_rows, product_export_rows, staff_export_rows,
+    product_performance_query, staff_performance_query, write_sales_workbook, write_inventory_workbook,
+    write_single_sheet_workbook, SALES_EXPORT_HEADER, INVENTORY_EXPORT_HEADER, PRODUCT_EXPORT_HEADER, STAFF_EXPORT_HEADER
+)
+from report_jobs import queue_report, job_progress, ReportJobError, REPORTS, FORMATS
+from report_cache import cached_report
+from catalog_sync import InvalidCursor, decode_cursor, encode_cursor
+from basket_analysis import basket_results, named_rules
+from abc_analysis import abc_report, abc_export_rows, ABC_EXPORT_HEADER
+from sales_heatmap import sales_heatmap
+from sales_timeseries import sales_series, bucket_label, GRANULARITIES
 from datetime import datetime, timedelta
 from functools import wraps
-import csv
 import io
+import os
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
@@ -13,6 +26,9 @@ from reportlab.lib.styles import getSampleStyleSheet
 
 reports_bp = Blueprint('reports', __name__)
 
+SALES_REPORT_PAGE_SIZE = 50
+ABC_PAGE_SIZE = 100
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -29,64 +45,72 @@ def dashboard():
     # Get date range from request
     period = request.args.get('period', '7d')
     
-    if period == '7d':
-        start_date = datetime.now() - timedelta(days=7)
-    elif period == '30d':
-        start_date = datetime.now() - timedelta(days=30)
-    elif period == '90d':
-        start_date = datetime.now() - timedelta(days=90)
-    else:
-        start_date = datetime.now() - timedelta(days=7)
-    
-    # Sales data
-    sales = Sale.query.filter(
-        Sale.created_at >= start_date,
-        Sale.status == 'completed'
-    ).all()
+    days = {'7d': 7, '30d': 30, '90d': 90}.get(period, 7)
+    tz = business_timezone()
+    end_day = business_today(tz)
+    start_day = end_day - timedelta(days=days)
+    start_date, _ = utc_bounds(start_day, end_day, tz)
     
-    total_sales = len(sales)
-    total_revenue = sum(sale.total_amount for sale in sales)
-    avg_sale = total_revenue / total_sales if total_sales > 0 else 0
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        granularity = 'day'
     
-    # Recent sales for display
-    recent_sales = Sale.query.filter_by(status='completed').order_by(Sale.created_at.desc()).limit(20).all()
-    
-    # Top products
-    product_sales = db.session.query(
-        Product.name,
-        db.func.sum(SaleItem.quantity).label('total_quantity'),
-        db.func.sum(SaleItem.total_price).label('total_revenue')
-    ).join(SaleItem).join(Sale).filter(
-        Sale.created_at >= start_date,
-        Sale.status == 'completed'
-    ).group_by(Product.id, Product.name).order_by(
-        db.func.sum(SaleItem.total_price).desc()
-    ).limit(10).all()
-    
-    # Sales by day
-    daily_sales = []
-    current_date = start_date
-    while current_date <= datetime.now():
-        next_date = current_date + timedelta(days=1)
-        daily_count = Sale.query.filter(
-            Sale.created_at >= current_date,
-            Sale.created_at < next_date,
+    def compute():
+        # Sales totals from the daily rollup
+        total_sales, total_revenue = summary_totals(start_day, end_day)
+        
+        # Recent sales for display
+        recent_sales = [{
+            'id': sale.id,
+            'created_at': sale.created_at,
+            'cashier': {'username': sale.cashier.username} if sale.cashier else None,
+            'total_amount': sale.total_amount,
+            'payment_method': sale.payment_method,
+            'status': sale.status
+        } for sale in Sale.query.options(db.joinedload(Sale.cashier)).filter_by(
+            status='completed'
+        ).order_by(Sale.created_at.desc()).limit(20)]
+        
+        # Top products
+        product_sales = [row._asdict() for row in db.session.query(
+            Product.name,
+            db.func.sum(SaleItem.quantity).label('total_quantity'),
+            db.func.sum(SaleItem.total_price).label('total_revenue')
+        ).join(SaleItem).join(Sale).filter(
+            Sale.created_at >= start_date,
             Sale.status == 'completed'
-        ).count()
-        daily_sales.append({
-            'date': current_date.strftime('%Y-%m-%d'),
-            'sales': daily_count
-        })
-        current_date = next_date
+        ).group_by(Product.id, Product.name).order_by(
+            db.func.sum(SaleItem.total_price).desc()
+        ).limit(10)]
+        
+        # Sales per bucket (day by default)
+        daily_sales = [{
+            'date': bucket_label(point['bucket'], granularity),
+            'sales': point['count'],
+            'revenue': point['revenue'],
+            'average': point['average']
+        } for point in sales_series(start_day, end_day, granularity)]
+        
+        return {
+            'total_sales': total_sales,
+            'total_revenue': total_revenue,
+            'recent_sales': recent_sales,
+            'product_sales': product_sales,
+            'daily_sales': daily_sales
+        }
+    
+    report = cached_report('dashboard', (start_day, end_day, granularity), compute)
+    total_sales, total_revenue = report['total_sales'], report['total_revenue']
+    avg_sale = total_revenue / total_sales if total_sales > 0 else 0
     
     return render_template('reports/dashboard.html',
                          period=period,
                          total_sales=total_sales,
                          total_revenue=total_revenue,
                          avg_sale=avg_sale,
-                         product_sales=product_sales,
-                         daily_sales=daily_sales,
-                         recent_sales=recent_sales)
+                         product_sales=report['product_sales'],
+                         daily_sales=report['daily_sales'],
+                         recent_sales=report['recent_sales'])
 
 @reports_bp.route('/sales-report')
 @login_required
@@ -97,79 +121,128 @@ def sales_report():
     end_date = request.args.get('end_date')
     payment_method = request.args.get('payment_method', '')
     
-    query = Sale.query.filter(Sale.status == 'completed')
-    
-    if start_date:
-        query = query.filter(Sale.created_at >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        query = query.filter(Sale.created_at <= datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+    tz = business_timezone()
+    filters = [Sale.status == 'completed']
+    try:
+        if start_date:
+            start_day = datetime.strptime(start_date, '%Y-%m-%d').date()
+            filters.append(Sale.created_at >= utc_bounds(start_day, start_day, tz)[0])
+        if end_date:
+            end_day = datetime.strptime(end_date, '%Y-%m-%d').date()
+            filters.append(Sale.created_at < utc_bounds(end_day, end_day, tz)[1])
+    except ValueError:
+        flash('Invalid date', 'error')
+        return redirect(url_for('reports.sales_report'))
     if payment_method:
-        query = query.filter(Sale.payment_method == payment_method)
-    
-    sales = query.order_by(Sale.created_at.desc()).all()
+        filters.append(Sale.payment_method == payment_method)
     
-    # Calculate totals
-    total_sales = len(sales)
-    total_revenue = sum(sale.total_amount for sale in sales)
-    total_discounts = sum(sale.discount_amount for sale in sales)
-    
-    # Payment method breakdown
+    # Totals and payment method breakdown from one grouped query
     payment_breakdown = {}
-    for sale in sales:
-        method = sale.payment_method
-        if method not in payment_breakdown:
-            payment_breakdown[method] = {'count': 0, 'amount': 0}
-        payment_breakdown[method]['count'] += 1
-        payment_breakdown[method]['amount'] += sale.total_amount
+    total_sales, total_revenue, total_discounts = 0, 0.0, 0.0
+    for method, count, amount, discount in db.session.query(
+        Sale.payment_method,
+        db.func.count(Sale.id),
+        db.func.sum(Sale.total_amount),
+        db.func.sum(Sale.discount_amount)
+    ).filter(*filters).group_by(Sale.payment_method).order_by(Sale.payment_method):
+        payment_breakdown[method] = {'count': count, 'amount': amount or 0}
+        total_sales += count
+        total_revenue += amount or 0
+        total_discounts += discount or 0
+    
+    # One keyset page of detail rows, newest first
+    try:
+        sales, newer_cursor, older_cursor = _sales_report_page(
+            filters, request.args.get('before'), request.args.get('after')
+        )
+    except InvalidCursor as e:
+        flash(str(e), 'error')
+        return redirect(url_for('reports.sales_report', start_date=start_date, end_date=end_date, payment_method=payment_method))
     
     return render_template('reports/sales_report.html',
                          sales=sales,
+                         newer_cursor=newer_cursor,
+                         older_cursor=older_cursor,
+                         start_date=start_date,
+                         end_date=end_date,
+                         payment_method=payment_method,
                          total_sales=total_sales,
                          total_revenue=total_revenue,
                          total_discounts=total_discounts,
                          payment_breakdown=payment_breakdown)
 
+def _sales_report_page(filters, before=None, after=None, limit=SALES_REPORT_PAGE_SIZE):
+    """
+    One keyset page of sales ordered by (created_at, id) descending.
+
+    ``before`` pages towards older sales, ``after`` back towards newer ones;
+    both are cursors from catalog_sync.encode_cursor.
+    
+    Returns:
+        tuple: (sales, newer_cursor, older_cursor); a cursor is None when
+        there is no page in that direction
+    """
+    query = Sale.query.options(db.joinedload(Sale.cashier)).filter(*filters)
+    
+    if after:
+        timestamp, sale_id = decode_cursor(after)
+        query = query.filter(db.or_(
+            Sale.created_at > timestamp,
+            db.and_(Sale.created_at == timestamp, Sale.id > sale_id)
+        ))
+        # Fetch one extra row to know whether there is a page beyond
+        sales = query.order_by(Sale.created_at, Sale.id).limit(limit + 1).all()
+        has_more = len(sales) > limit
+        sales = list(reversed(sales[:limit]))
+        has_newer, has_older = has_more, True
+    else:
+        if before:
+            timestamp, sale_id = decode_cursor(before)
+            query = query.filter(db.or_(
+                Sale.created_at < timestamp,
+                db.and_(Sale.created_at == timestamp, Sale.id < sale_id)
+            ))
+        sales = query.order_by(Sale.created_at.desc(), Sale.id.desc()).limit(limit + 1).all()
+        has_newer, has_older = bool(before), len(sales) > limit
+        sales = sales[:limit]
+    
+    if not sales:
+        return [], None, None
+    newer_cursor = encode_cursor(sales[0].created_at, sales[0].id) if has_newer else None
+    older_cursor = encode_cursor(sales[-1].created_at, sales[-1].id) if has_older else None
+    return sales, newer_cursor, older_cursor
+
 @reports_bp.route('/product-report')
 @login_required
 @admin_required
 def product_report():
-    # Get product performance data
-    products = db.session.query(
-        Product.id,
-        Product.name,
-        Product.sku,
-        Product.category,
-        Product.stock_quantity,
-        db.func.sum(SaleItem.quantity).label('total_sold'),
-        db.func.sum(SaleItem.total_price).label('total_revenue')
-    ).outerjoin(SaleItem).outerjoin(Sale).filter(
-        Sale.status == 'completed'
-    ).group_by(Product.id, Product.name, Product.sku, Product.category, Product.stock_quantity).all()
-    
-    # Calculate profit margins (if cost price is available)
-    for product in products:
-        if hasattr(product, 'cost_price') and product.cost_price:
-            product.profit_margin = ((product.total_revenue or 0) - (product.total_sold or 0) * product.cost_price) / (product.total_revenue or 1) * 100
-        else:
-            product.profit_margin = 0
-    
-    return render_template('reports/product_report.html', products=products)
+    # Get product performance data (margins are computed in the query)
+    def compute():
+        products = [row._asdict() for row in product_performance_query().order_by(
+            db.func.sum(SaleItem.total_price).desc(), Product.id
+        )]
+        totals = {
+            'total_sold': sum(p['total_sold'] or 0 for p in products),
+            'total_revenue': sum(p['total_revenue'] or 0 for p in products),
+            'cogs': sum(p['cogs'] or 0 for p in products),
+            'gross_profit': sum(p['gross_profit'] or 0 for p in products)
+        }
+        costed_revenue = totals['cogs'] + totals['gross_profit']
+        totals['margin'] = totals['gross_profit'] * 100 / costed_revenue if costed_revenue else None
+        return {'products': products, 'totals': totals}
+    
+    report = cached_report('product_report', (), compute)
+    
+    return render_template('reports/product_report.html', products=report['products'], totals=report['totals'])
 
 @reports_bp.route('/staff-report')
 @login_required
 @admin_required
 def staff_report():
     # Get staff performance data
-    staff_performance = db.session.query(
-        User.id,
-        User.username,
-        User.role,
-        db.func.count(Sale.id).label('total_sales'),
-        db.func.sum(Sale.total_amount).label('total_revenue'),
-        db.func.avg(Sale.total_amount).label('avg_sale')
-    ).outerjoin(Sale).filter(
-        Sale.status == 'completed'
-    ).group_by(User.id, User.username, User.role).all()
+    staff_performance = cached_report(
+        'staff_report', (), lambda: [row._asdict() for row in staff_performance_query()]
+    )
     
     return render_template('reports/staff_report.html', staff_performance=staff_performance)
 
@@ -177,37 +250,11 @@ def staff_report():
 @login_required
 @admin_required
 def export_sales_csv():
-    # Get sales data
-    sales = Sale.query.filter_by(status='completed').order_by(Sale.created_at.desc()).all()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['Sale ID', 'Date', 'Cashier', 'Customer', 'Items', 'Subtotal', 'Discount', 'Total', 'Payment Method'])
-    
-    # Write data
-    for sale in sales:
-        items_count = len(sale.items)
-        writer.writerow([
-            sale.id,
-            sale.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            sale.cashier.username if sale.cashier else 'N/A',
-            sale.customer.name if sale.customer else 'Walk-in',
-            items_count,
-            sale.total_amount + sale.discount_amount,
-            sale.discount_amount,
-            sale.total_amount,
-            sale.payment_method
-        ])
-    
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'sales_report_{datetime.now().strftime("%Y%m%d")}.csv'
+    # Stream completed sales straight from the database
+    return csv_response(
+        f'sales_report_{datetime.now().strftime("%Y%m%d")}.csv',
+        SALES_EXPORT_HEADER,
+        sales_export_rows()
     )
 
 @reports_bp.route('/export/sales-pdf')
@@ -267,65 +314,292 @@ def export_sales_pdf():
 @login_required
 @admin_required
 def export_inventory_csv():
-    # Get inventory data
-    products = Product.query.all()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['SKU', 'Name', 'Category', 'Price', 'Cost Price', 'Stock', 'Low Stock Threshold', 'Supplier'])
-    
-    # Write data
-    for product in products:
-        writer.writerow([
-            product.sku,
-            product.name,
-            product.category or 'N/A',
-            product.price,
-            product.cost_price or 'N/A',
-            product.stock_quantity,
-            product.low_stock_threshold,
-            product.supplier.name if product.supplier else 'N/A'
-        ])
-    
-    output.seek(0)
+    # Stream inventory straight from the database
+    return csv_response(
+        f'inventory_report_{datetime.now().strftime("%Y%m%d")}.csv',
+        INVENTORY_EXPORT_HEADER,
+        inventory_export_rows()
+    )
+
+@reports_bp.route('/export/sales-xlsx')
+@login_required
+@admin_required
+def export_sales_xlsx():
+    return xlsx_response(f'sales_report_{datetime.now().strftime("%Y%m%d")}.xlsx', write_sales_workbook)
+
+@reports_bp.route('/export/inventory-xlsx')
+@login_required
+@admin_required
+def export_inventory_xlsx():
+    return xlsx_response(f'inventory_report_{datetime.now().strftime("%Y%m%d")}.xlsx', write_inventory_workbook)
+
+@reports_bp.route('/export/staff-xlsx')
+@login_required
+@admin_required
+def export_staff_xlsx():
+    return xlsx_response(
+        f'staff_report_{datetime.now().strftime("%Y%m%d")}.xlsx',
+        lambda path: write_single_sheet_workbook(path, 'Staff', STAFF_EXPORT_HEADER, staff_export_rows())
+    )
+
+@reports_bp.route('/export/product-xlsx')
+@login_required
+@admin_required
+def export_product_xlsx():
+    return xlsx_response(
+        f'product_report_{datetime.now().strftime("%Y%m%d")}.xlsx',
+        lambda path: write_single_sheet_workbook(path, 'Products', PRODUCT_EXPORT_HEADER, product_export_rows())
+    )
+
+def _job_json(job):
+    data = {
+        'id': job.id,
+        'report_type': job.report_type,
+        'format': job.format,
+        'status': job.status,
+        'progress': job_progress(job),
+        'total_rows': job.total_rows,
+        'error': job.error
+    }
+    if job.status == 'completed' and job.download_token:
+        data['download_url'] = url_for('reports.download_report', token=job.download_token)
+        data['expires_at'] = job.expires_at.isoformat()
+    return data
+
+@reports_bp.route('/jobs', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def report_jobs():
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        try:
+            start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else None
+            end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+            job = queue_report(current_user.id, data.get('report_type'), data.get('format'), start_date, end_date)
+        except (ReportJobError, ValueError) as e:
+            if request.is_json:
+                return jsonify({'error': str(e)}), 400
+            flash(str(e), 'error')
+            return redirect(url_for('reports.report_jobs'))
+        
+        if request.is_json:
+            return jsonify(_job_json(job)), 202
+        flash('Report queued. It will be ready to download shortly.', 'success')
+        return redirect(url_for('reports.report_jobs'))
+    
+    jobs = ReportJob.query.filter_by(user_id=current_user.id).order_by(ReportJob.created_at.desc()).limit(20).all()
+    return render_template('reports/jobs.html',
+                         jobs=[_job_json(job) for job in jobs],
+                         report_types=REPORTS,
+                         formats=FORMATS)
+
+@reports_bp.route('/jobs/<int:job_id>/progress')
+@login_required
+@admin_required
+def report_job_progress(job_id):
+    job = ReportJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(_job_json(job))
+
+@reports_bp.route('/jobs/download/<token>')
+@login_required
+@admin_required
+def download_report(token):
+    job = ReportJob.query.filter_by(download_token=token, status='completed').first()
+    if not job or job.expires_at < datetime.utcnow() or not job.file_path or not os.path.exists(job.file_path):
+        flash('This download link has expired. Please generate the report again.', 'error')
+        return redirect(url_for('reports.report_jobs'))
+    
+    mimetypes = {
+        'pdf': 'application/pdf',
+        'csv': 'text/csv',
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    }
     return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
-        mimetype='text/csv',
+        job.file_path,
+        mimetype=mimetypes[job.format],
         as_attachment=True,
-        download_name=f'inventory_report_{datetime.now().strftime("%Y%m%d")}.csv'
+        download_name=f'{job.report_type}_report_{job.created_at.strftime("%Y%m%d")}.{job.format}'
     )
 
+def _heatmap_args():
+    """(start_day, end_day, cashier_id, category) from the query string; the last 12 weeks by default."""
+    end_day = request.args.get('end_date')
+    end_day = datetime.strptime(end_day, '%Y-%m-%d').date() if end_day else business_today()
+    start_day = request.args.get('start_date')
+    start_day = datetime.strptime(start_day, '%Y-%m-%d').date() if start_day else end_day - timedelta(weeks=12) + timedelta(days=1)
+    if start_day > end_day:
+        raise ValueError('Start date must be before end date')
+    cashier_id = request.args.get('cashier_id', type=int)
+    category = request.args.get('category') or None
+    return start_day, end_day, cashier_id, category
+
+@reports_bp.route('/heatmap')
+@login_required
+@admin_required
+def heatmap():
+    try:
+        start_day, end_day, cashier_id, category = _heatmap_args()
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('reports.heatmap'))
+    
+    cashiers = User.query.order_by(User.username).all()
+    categories = [category for (category,) in db.session.query(Product.category).filter(
+        Product.category.isnot(None)
+    ).distinct().order_by(Product.category)]
+    
+    return render_template('reports/heatmap.html',
+                         heatmap=sales_heatmap(start_day, end_day, cashier_id, category),
+                         start_date=start_day,
+                         end_date=end_day,
+                         cashier_id=cashier_id,
+                         category=category,
+                         cashiers=cashiers,
+                         categories=categories)
+
+@reports_bp.route('/api/heatmap')
+@login_required
+@admin_required
+def heatmap_data():
+    try:
+        start_day, end_day, cashier_id, category = _heatmap_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(sales_heatmap(start_day, end_day, cashier_id, category))
+
+def _abc_args():
+    """(start_day, end_day, category, supplier_id) from the query string; the last year by default."""
+    end_day = request.args.get('end_date')
+    end_day = datetime.strptime(end_day, '%Y-%m-%d').date() if end_day else business_today()
+    start_day = request.args.get('start_date')
+    start_day = datetime.strptime(start_day, '%Y-%m-%d').date() if start_day else end_day - timedelta(days=364)
+    if start_day > end_day:
+        raise ValueError('Start date must be before end date')
+    return start_day, end_day, request.args.get('category') or None, request.args.get('supplier_id', type=int)
+
+def _abc_report(start_day, end_day, category, supplier_id):
+    start, end = utc_bounds(start_day, end_day, business_timezone())
+    return abc_report(start, end, category, supplier_id)
+
+@reports_bp.route('/abc')
+@login_required
+@admin_required
+def abc():
+    try:
+        start_day, end_day, category, supplier_id = _abc_args()
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('reports.abc'))
+    
+    report = _abc_report(start_day, end_day, category, supplier_id)
+    
+    # Only one page of products is rendered; the whole list is cached
+    page = max(request.args.get('page', 1, type=int), 1)
+    pages = max((len(report['products']) + ABC_PAGE_SIZE - 1) // ABC_PAGE_SIZE, 1)
+    products = report['products'][(page - 1) * ABC_PAGE_SIZE:page * ABC_PAGE_SIZE]
+    
+    categories = [name for (name,) in db.session.query(Product.category).filter(
+        Product.category.isnot(None)
+    ).distinct().order_by(Product.category)]
+    suppliers = Supplier.query.order_by(Supplier.name).all()
+    
+    return render_template('reports/abc.html',
+                         summary=report['summary'],
+                         thresholds=report['thresholds'],
+                         products=products,
+                         total_products=len(report['products']),
+                         page=page,
+                         pages=pages,
+                         start_date=start_day,
+                         end_date=end_day,
+                         category=category,
+                         supplier_id=supplier_id,
+                         categories=categories,
+                         suppliers=suppliers)
+
+@reports_bp.route('/export/abc-csv')
+@login_required
+@admin_required
+def export_abc_csv():
+    try:
+        start_day, end_day, category, supplier_id = _abc_args()
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('reports.abc'))
+    
+    report = _abc_report(start_day, end_day, category, supplier_id)
+    return csv_response(
+        f'abc_report_{start_day.strftime("%Y%m%d")}_{end_day.strftime("%Y%m%d")}.csv',
+        ABC_EXPORT_HEADER,
+        abc_export_rows(report)
+    )
+
+def _basket_args():
+    """(product_id, size) filters from the query string."""
+    size = request.args.get('size', type=int)
+    if size not in (None, 2, 3):
+        raise ValueError('size must be 2 or 3')
+    return request.args.get('product_id', type=int), size
+
+@reports_bp.route('/baskets')
+@login_required
+@admin_required
+def baskets():
+    try:
+        product_id, size = _basket_args()
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('reports.baskets'))
+    
+    results = basket_results()
+    product = db.session.get(Product, product_id) if product_id else None
+    return render_template('reports/baskets.html',
+                         results=results,
+                         rules=named_rules(results, product_id, size),
+                         product=product,
+                         size=size)
+
+@reports_bp.route('/api/baskets')
+@login_required
+@admin_required
+def basket_data():
+    try:
+        product_id, size = _basket_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    results = basket_results()
+    if results is None:
+        return jsonify({'error': 'Basket analysis has not run yet'}), 404
+    return jsonify({
+        'baskets': results['baskets'],
+        'start_date': results['start_date'],
+        'end_date': results['end_date'],
+        'computed_at': results['computed_at'],
+        'rules': named_rules(results, product_id, size, limit=request.args.get('limit', 100, type=int))
+    })
+
 @reports_bp.route('/api/sales-chart')
 @login_required
 @admin_required
 def sales_chart_data():
     # Get sales data for chart
-    days = int(request.args.get('days', 7))
-    start_date = datetime.now() - timedelta(days=days)
-    
-    sales_data = []
-    current_date = start_date
-    while current_date <= datetime.now():
-        next_date = current_date + timedelta(days=1)
-        daily_sales = Sale.query.filter(
-            Sale.created_at >= current_date,
-            Sale.created_at < next_date,
-            Sale.status == 'completed'
-        ).count()
-        daily_revenue = db.session.query(db.func.sum(Sale.total_amount)).filter(
-            Sale.created_at >= current_date,
-            Sale.created_at < next_date,
-            Sale.status == 'completed'
-        ).scalar() or 0
-        
-        sales_data.append({
-            'date': current_date.strftime('%Y-%m-%d'),
-            'sales': daily_sales,
-            'revenue': float(daily_revenue)
-        })
-        current_date = next_date
+    days = request.args.get('days', 7, type=int)
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': f'granularity must be one of {", ".join(GRANULARITIES)}'}), 400
+    max_days = current_app.config.get('SALES_CHART_MAX_DAYS', 366)
+    if days is None or not 0 <= days <= max_days:
+        return jsonify({'error': f'days must be between 0 and {max_days}'}), 400
+    end_day = business_today()
+    start_day = end_day - timedelta(days=days)
+    
+    sales_data = [{
+        'date': bucket_label(point['bucket'], granularity),
+        'sales': point['count'],
+        'revenue': point['revenue'],
+        'discount': point['discount'],
+        'average': point['average']
+    } for point in sales_series(start_day, end_day, granularity)]
     
     return jsonify(sales_data)
@@ -1,31 +1,84 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file
 from flask_login import login_required, current_user
 from extensions import db
 from models import Product, Sale, SaleItem, Customer, Receipt, UserActivityLog, BusinessSettings
+from checkout_engine import process_checkout, process_sale_batch, restock, CheckoutError
+from cart_store import load_cart, save_cart, get_cart_lines, set_cart_lines, current_cart_id, clear_cart as clear_stored_cart
+from product_index import lookup_product_code
+from product_search import search_products as search_product_index
+from catalog_sync import catalog_changes, InvalidCursor
+from receipt_pdf import get_receipt_pdf
+from idempotency import idempotent
+from sales_rollup import record_refund, summary_totals, business_today
+from held_sales import hold_cart, list_held_sales, take_held_sale, clear_held_sales as clear_stored_held_sales
 from datetime import datetime
-import uuid
+from io import BytesIO
+from sqlalchemy.exc import IntegrityError
 
 sales_bp = Blueprint('sales', __name__)
 
+CATALOG_PAGE_SIZE = 12
+SALE_BATCH_LIMIT = 1000
+
+def _catalog_page(after_id=None, category=None, limit=CATALOG_PAGE_SIZE):
+    """One keyset page of in-stock products ordered by id."""
+    query = Product.query.filter(Product.stock_quantity > 0)
+    if category:
+        query = query.filter(Product.category == category)
+    if after_id:
+        query = query.filter(Product.id > after_id)
+    
+    # Fetch one extra row to know whether there is a next page
+    products = query.order_by(Product.id).limit(limit + 1).all()
+    next_cursor = products[limit - 1].id if len(products) > limit else None
+    return products[:limit], next_cursor
+
 @sales_bp.route('/pos')
 @login_required
 def pos():
-    # Get products for search
-    products = Product.query.filter(Product.stock_quantity > 0).all()
-    return render_template('sales/pos.html', products=products)
+    # Only the first catalog page is rendered; the rest is fetched on demand
+    products, next_cursor = _catalog_page()
+    categories = db.session.query(Product.category).filter(
+        Product.category.isnot(None)
+    ).distinct().order_by(Product.category).all()
+    categories = [cat[0] for cat in categories if cat[0]]
+    return render_template('sales/pos.html', products=products, next_cursor=next_cursor, categories=categories)
+
+@sales_bp.route('/api/catalog')
+@login_required
+def catalog():
+    after_id = request.args.get('after', type=int)
+    category = request.args.get('category', '')
+    limit = min(request.args.get('limit', CATALOG_PAGE_SIZE, type=int), 100)
+    
+    products, next_cursor = _catalog_page(after_id, category, limit)
+    
+    return jsonify({
+        'products': [{
+            'id': p.id,
+            'name': p.name,
+            'sku': p.sku,
+            'price': p.price,
+            'stock': p.stock_quantity
+        } for p in products],
+        'next_cursor': next_cursor
+    })
+
+@sales_bp.route('/api/catalog/changes')
+@login_required
+def catalog_sync_changes():
+    limit = min(request.args.get('limit', 500, type=int), 2000)
+    try:
+        changes = catalog_changes(request.args.get('since', ''), limit=limit)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(changes)
 
 @sales_bp.route('/api/products/search')
 @login_required
 def search_products():
-    query = request.args.get('q', '').lower()
-    products = Product.query.filter(
-        db.or_(
-            Product.name.ilike(f'%{query}%'),
-            Product.sku.ilike(f'%{query}%'),
-            Product.barcode.ilike(f'%{query}%')
-        ),
-        Product.stock_quantity > 0
-    ).limit(10).all()
+    query = request.args.get('q', '')
+    products = search_product_index(query, limit=10, in_stock=True)
     
     return jsonify([{
         'id': p.id,
@@ -35,11 +88,27 @@ def search_products():
         'stock': p.stock_quantity
     } for p in products])
 
+@sales_bp.route('/api/products/scan')
+@login_required
+def scan_product():
+    product = lookup_product_code(request.args.get('code', ''))
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    return jsonify({
+        'id': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'barcode': product.barcode,
+        'price': product.price,
+        'stock': product.stock_quantity
+    })
+
 @sales_bp.route('/api/cart/add', methods=['POST'])
 @login_required
 def add_to_cart():
     data = request.get_json()
-    product_id = data.get('product_id')
+    product_id = int(data.get('product_id'))
     quantity = int(data.get('quantity', 1))
     
     product = Product.query.get_or_404(product_id)
@@ -47,61 +116,61 @@ def add_to_cart():
     if product.stock_quantity < quantity:
         return jsonify({'error': 'Insufficient stock'}), 400
     
-    # Initialize cart in session if not exists
-    if 'cart' not in session:
-        session['cart'] = []
+    cart = load_cart()
     
     # Check if product already in cart
-    cart_item = next((item for item in session['cart'] if item['product_id'] == product_id), None)
+    cart_item = cart.get(product_id)
     
     if cart_item:
         cart_item['quantity'] += quantity
+        cart_item['total'] = cart_item['price'] * cart_item['quantity']
     else:
-        session['cart'].append({
+        cart[product_id] = {
             'product_id': product_id,
             'name': product.name,
             'price': product.price,
             'quantity': quantity,
             'total': product.price * quantity
-        })
+        }
     
-    session.modified = True
-    return jsonify({'message': 'Added to cart', 'cart_count': len(session['cart'])})
+    save_cart(cart)
+    return jsonify({'message': 'Added to cart', 'cart_id': current_cart_id(), 'cart_count': len(cart)})
 
 @sales_bp.route('/api/cart/update', methods=['POST'])
 @login_required
 def update_cart():
     data = request.get_json()
-    product_id = data.get('product_id')
+    product_id = int(data.get('product_id'))
     quantity = int(data.get('quantity', 0))
     
-    if 'cart' not in session:
+    cart = load_cart()
+    if not cart:
         return jsonify({'error': 'Cart is empty'}), 400
     
-    cart_item = next((item for item in session['cart'] if item['product_id'] == product_id), None)
+    cart_item = cart.get(product_id)
     
     if cart_item:
         if quantity <= 0:
-            session['cart'].remove(cart_item)
+            del cart[product_id]
         else:
             cart_item['quantity'] = quantity
             cart_item['total'] = cart_item['price'] * quantity
-        session.modified = True
+        save_cart(cart)
     
-    return jsonify({'message': 'Cart updated'})
+    return jsonify({'message': 'Cart updated', 'cart_id': current_cart_id(), 'cart_count': len(cart)})
 
 @sales_bp.route('/api/cart/clear')
 @login_required
 def clear_cart():
-    session.pop('cart', None)
-    return jsonify({'message': 'Cart cleared'})
+    clear_stored_cart()
+    return jsonify({'message': 'Cart cleared', 'cart_id': current_cart_id()})
 
 @sales_bp.route('/api/cart')
 @login_required
 def get_cart():
-    cart = session.get('cart', [])
+    cart = get_cart_lines()
     total = sum(item['total'] for item in cart)
-    return jsonify({'cart': cart, 'total': total})
+    return jsonify({'cart_id': current_cart_id(), 'cart': cart, 'total': total})
 
 @sales_bp.route('/api/cart/sync', methods=['POST'])
 @login_required
@@ -109,35 +178,27 @@ def sync_cart():
     data = request.get_json()
     cart_data = data.get('cart', [])
     
-    # Update session cart
-    session['cart'] = cart_data
-    session.modified = True
+    # Replace the stored cart
+    try:
+        set_cart_lines(cart_data)
+    except ValueError:
+        return jsonify({'error': 'Invalid cart'}), 400
     
-    return jsonify({'message': 'Cart synced successfully'})
+    return jsonify({'message': 'Cart synced successfully', 'cart_id': current_cart_id()})
 
 @sales_bp.route('/api/held-sales')
 @login_required
 def get_held_sales():
-    # Get all held sales from session
-    held_sales = {}
-    for key in session.keys():
-        if key.startswith('hold_'):
-            hold_id = key.replace('hold_', '')
-            held_sales[hold_id] = session[key]
-    
-    return jsonify({'held_sales': held_sales})
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    held_sales, has_next = list_held_sales(current_user.id, page=page, per_page=per_page)
+    
+    return jsonify({'held_sales': held_sales, 'page': page, 'has_next': has_next})
 
 @sales_bp.route('/api/held-sales/clear', methods=['POST'])
 @login_required
 def clear_held_sales():
-    # Clear all held sales from session
-    cleared_count = 0
-    for key in list(session.keys()):
-        if key.startswith('hold_'):
-            session.pop(key)
-            cleared_count += 1
-    
-    session.modified = True
+    cleared_count = clear_stored_held_sales(current_user.id)
     
     return jsonify({
         'success': True,
@@ -147,9 +208,10 @@ def clear_held_sales():
 
 @sales_bp.route('/checkout', methods=['GET', 'POST'])
 @login_required
+@idempotent
 def checkout():
     if request.method == 'POST':
-        cart = session.get('cart', [])
+        cart = get_cart_lines()
         if not cart:
             flash('Cart is empty', 'error')
             return redirect(url_for('sales.pos'))
@@ -176,85 +238,54 @@ def checkout():
             discount_amount = subtotal
             flash('Discount amount adjusted to match subtotal', 'info')
         
-        # Validate stock availability before processing
-        for item in cart:
-            product = Product.query.get(item['product_id'])
-            if not product:
-                flash(f'Product not found: {item["name"]}', 'error')
-                return redirect(url_for('sales.checkout'))
-            
-            if product.stock_quantity < item['quantity']:
-                flash(f'Insufficient stock for {product.name}. Available: {product.stock_quantity}, Requested: {item["quantity"]}', 'error')
-                return redirect(url_for('sales.checkout'))
-        
-        # Calculate totals
-        subtotal = sum(item['total'] for item in cart)
-        total_amount = subtotal - discount_amount
-        
         try:
-            # Create sale
-            sale = Sale(
+            sale, receipt = process_checkout(
+                cart,
                 cashier_id=current_user.id,
-                customer_id=customer_id,
-                total_amount=total_amount,
-                discount_amount=discount_amount,
                 payment_method=payment_method,
-                status='completed'
-            )
-            db.session.add(sale)
-            db.session.flush()  # Get sale ID
-            
-            # Create sale items
-            for item in cart:
-                sale_item = SaleItem(
-                    sale_id=sale.id,
-                    product_id=item['product_id'],
-                    quantity=item['quantity'],
-                    unit_price=item['price'],
-                    total_price=item['total']
-                )
-                db.session.add(sale_item)
-            
-            # Create receipt
-            receipt = Receipt(
-                sale_id=sale.id,
-                receipt_number=f"R{sale.id:06d}"
-            )
-            db.session.add(receipt)
-            
-            # Log activity
-            activity = UserActivityLog(
-                user_id=current_user.id,
-                action=f"Processed sale #{sale.id} for {total_amount}"
+                customer_id=customer_id,
+                discount_amount=discount_amount
             )
-            db.session.add(activity)
-            
-            # Commit the sale first
-            db.session.commit()
-            
-            # Now update product stock after successful sale
-            for item in cart:
-                product = Product.query.get(item['product_id'])
-                product.stock_quantity -= item['quantity']
-            
-            # Commit stock updates
-            db.session.commit()
-            
-            # Clear cart
-            session.pop('cart', None)
-            
-            flash(f'Sale completed successfully! Receipt: {receipt.receipt_number}', 'success')
-            return redirect(url_for('sales.receipt', sale_id=sale.id))
-            
+        except CheckoutError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('sales.checkout'))
         except Exception as e:
-            db.session.rollback()
             flash(f'Error processing sale: {str(e)}', 'error')
             return redirect(url_for('sales.checkout'))
+        
+        # Clear cart
+        clear_stored_cart()
+        
+        flash(f'Sale completed successfully! Receipt: {receipt.receipt_number}', 'success')
+        return redirect(url_for('sales.receipt', sale_id=sale.id))
     
-    cart = session.get('cart', [])
+    cart = get_cart_lines()
     customers = Customer.query.all()
     return render_template('sales/checkout.html', cart=cart, customers=customers)
 
+@sales_bp.route('/api/sales/bulk', methods=['POST'])
+@login_required
+def bulk_sales():
+    """Record sales a terminal completed while offline."""
+    data = request.get_json(silent=True) or {}
+    entries = data.get('sales')
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        return jsonify({'error': 'Expected a list of sales'}), 400
+    if len(entries) > SALE_BATCH_LIMIT:
+        return jsonify({'error': f'At most {SALE_BATCH_LIMIT} sales per request'}), 413
+    
+    try:
+        results = process_sale_batch(entries, cashier_id=current_user.id)
+    except (CheckoutError, IntegrityError):
+        # Stock or an idempotency key was taken by a concurrent request;
+        # nothing was written, so the terminal can resend the whole batch
+        return jsonify({'error': 'Sales changed while processing the batch. Please retry.'}), 409
+    
+    return jsonify({
+        'results': results,
+        'created': sum(1 for result in results if result['status'] == 'created')
+    })
+
 @sales_bp.route('/receipt/<int:sale_id>')
 @login_required
 def receipt(sale_id):
@@ -266,138 +297,10 @@ def receipt(sale_id):
 @login_required
 def download_receipt(sale_id):
     sale = Sale.query.get_or_404(sale_id)
-    business_settings = BusinessSettings.query.first()
+    pdf = get_receipt_pdf(sale)
     
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-    from io import BytesIO
-    
-    # Create PDF buffer for 80mm thermal receipt (3.15 inches wide)
-    from reportlab.lib.pagesizes import A4
-    thermal_width = 3.15*inch  # 80mm
-    thermal_height = 11*inch   # Long receipt format
-    thermal_pagesize = (thermal_width, thermal_height)
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=thermal_pagesize, leftMargin=0.1*inch, rightMargin=0.1*inch, topMargin=0.2*inch, bottomMargin=0.2*inch)
-    elements = []
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=12,
-        spaceAfter=6,
-        alignment=1  # Center alignment for thermal receipt
-    )
-    
-    # Title
-    business_name = "SALE RECEIPT"
-    if business_settings and business_settings.business_name:
-        business_name = f"{business_settings.business_name} - SALE RECEIPT"
-    
-    elements.append(Paragraph(business_name, title_style))
-    
-    # Add business contact information
-    if business_settings:
-        contact_style = ParagraphStyle(
-            'ContactInfo',
-            parent=styles['Normal'],
-            fontSize=8,
-            spaceAfter=3,
-            alignment=1  # Center alignment
-        )
-        
-        if business_settings.contact_email:
-            elements.append(Paragraph(f"Email: {business_settings.contact_email}", contact_style))
-        
-        if business_settings.contact:
-            elements.append(Paragraph(f"Phone: {business_settings.contact}", contact_style))
-    
-    elements.append(Spacer(1, 10))
-    
-    # Sale information
-    sale_info = [
-        ['Sale ID:', f"#{sale.id}"],
-        ['Date:', sale.created_at.strftime('%d/%m/%Y %H:%M')],
-        ['Cashier:', sale.cashier.username],
-        ['Payment Method:', sale.payment_method.title()],
-        ['Status:', sale.status.title()]
-    ]
-    
-    if sale.customer:
-        sale_info.extend([
-            ['Customer:', sale.customer.name],
-            ['Phone:', sale.customer.phone or 'N/A'],
-            ['Email:', sale.customer.email or 'N/A']
-        ])
-    
-    sale_table = Table(sale_info, colWidths=[0.8*inch, 2.2*inch])
-    sale_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-    ]))
-    elements.append(sale_table)
-    elements.append(Spacer(1, 20))
-    
-    # Items table
-    elements.append(Paragraph("Items Purchased", styles['Heading2']))
-    elements.append(Spacer(1, 10))
-    
-    # Table header - simplified for thermal receipt
-    items_data = [['Product', 'Qty', 'Price', 'Total']]
-    
-    # Add items
-    for item in sale.items:
-        items_data.append([
-            item.product.name[:20],  # Truncate long product names
-            str(item.quantity),
-            f"GH₵{item.unit_price:.2f}",
-            f"GH₵{item.total_price:.2f}"
-        ])
-    
-    # Add totals row
-    subtotal = sale.total_amount + sale.discount_amount
-    items_data.append(['', '', 'Subtotal:', f"GH₵{subtotal:.2f}"])
-    
-    if sale.discount_amount > 0:
-        items_data.append(['', '', 'Discount:', f"-GH₵{sale.discount_amount:.2f}"])
-    
-    items_data.append(['', '', 'Total:', f"GH₵{sale.total_amount:.2f}"])
-    
-    items_table = Table(items_data, colWidths=[1.4*inch, 0.4*inch, 0.4*inch, 0.7*inch])
-    items_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (2, 0), (3, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 7),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    
-    elements.append(items_table)
-    elements.append(Spacer(1, 20))
-    
-    # Footer
-    elements.append(Paragraph("Thank you for your purchase!", styles['Normal']))
-    elements.append(Paragraph(f"Receipt Number: {sale.receipt.receipt_number}", styles['Normal']))
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
-    from flask import send_file
     return send_file(
-        buffer,
+        BytesIO(pdf),
         as_attachment=True,
         download_name=f"receipt_{sale.receipt.receipt_number}.pdf",
         mimetype='application/pdf'
@@ -421,142 +324,15 @@ def email_receipt(sale_id):
         return redirect(url_for('sales.view_sale', sale_id=sale_id))
     
     try:
-        # Generate PDF receipt using the same thermal format as download_receipt
-        business_settings = BusinessSettings.query.first()
-        
-        # Create PDF buffer for 80mm thermal receipt (3.15 inches wide)
-        from reportlab.lib.pagesizes import A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib import colors
-        from io import BytesIO
-        
-        thermal_width = 3.15*inch  # 80mm
-        thermal_height = 11*inch   # Long receipt format
-        thermal_pagesize = (thermal_width, thermal_height)
-        
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=thermal_pagesize, leftMargin=0.1*inch, rightMargin=0.1*inch, topMargin=0.2*inch, bottomMargin=0.2*inch)
-        elements = []
-        
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=12,
-            spaceAfter=6,
-            alignment=1  # Center alignment for thermal receipt
-        )
-        
-        # Title
-        business_name = "SALE RECEIPT"
-        if business_settings and business_settings.business_name:
-            business_name = f"{business_settings.business_name} - SALE RECEIPT"
-        
-        elements.append(Paragraph(business_name, title_style))
-        
-        # Add business contact information
-        if business_settings:
-            contact_style = ParagraphStyle(
-                'ContactInfo',
-                parent=styles['Normal'],
-                fontSize=8,
-                spaceAfter=3,
-                alignment=1  # Center alignment
-            )
-            
-            if business_settings.contact_email:
-                elements.append(Paragraph(f"Email: {business_settings.contact_email}", contact_style))
-            
-            if business_settings.contact:
-                elements.append(Paragraph(f"Phone: {business_settings.contact}", contact_style))
-        
-        elements.append(Spacer(1, 8))
-        
-        # Sale information
-        sale_info = [
-            ['Sale ID:', f"#{sale.id}"],
-            ['Date:', sale.created_at.strftime('%d/%m/%Y %H:%M')],
-            ['Cashier:', sale.cashier.username],
-            ['Payment Method:', sale.payment_method.title()],
-            ['Status:', sale.status.title()]
-        ]
-        
-        if sale.customer:
-            sale_info.extend([
-                ['Customer:', sale.customer.name],
-                ['Phone:', sale.customer.phone or 'N/A'],
-                ['Email:', sale.customer.email or 'N/A']
-            ])
-        
-        sale_table = Table(sale_info, colWidths=[0.8*inch, 2.2*inch])
-        sale_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ]))
-        elements.append(sale_table)
-        elements.append(Spacer(1, 10))
-        
-        # Items table
-        items_heading_style = ParagraphStyle(
-            'ItemsHeading',
-            parent=styles['Heading2'],
-            fontSize=10,
-            spaceAfter=4,
-            alignment=1
-        )
-        elements.append(Paragraph("Items Purchased", items_heading_style))
-        elements.append(Spacer(1, 6))
-        
-        items_data = [['Product', 'Qty', 'Price', 'Total']]
-        
-        for item in sale.items:
-            items_data.append([
-                item.product.name[:20],  # Truncate long product names
-                str(item.quantity),
-                f"GH₵{item.unit_price:.2f}",
-                f"GH₵{item.total_price:.2f}"
-            ])
-        
-        subtotal = sale.total_amount + sale.discount_amount
-        items_data.append(['', '', 'Subtotal:', f"GH₵{subtotal:.2f}"])
-        
-        if sale.discount_amount > 0:
-            items_data.append(['', '', 'Discount:', f"-GH₵{sale.discount_amount:.2f}"])
-        
-        items_data.append(['', '', 'Total:', f"GH₵{sale.total_amount:.2f}"])
-        
-        items_table = Table(items_data, colWidths=[1.4*inch, 0.4*inch, 0.4*inch, 0.7*inch])
-        items_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (2, 0), (3, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 7),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('FONTNAME', (0, -3), (-1, -1), 'Helvetica-Bold'),
-        ]))
-        
-        elements.append(items_table)
-        elements.append(Spacer(1, 10))
-        elements.append(Paragraph("Thank you for your purchase!", styles['Normal']))
-        elements.append(Paragraph(f"Receipt Number: {sale.receipt.receipt_number}", styles['Normal']))
-        
-        doc.build(elements)
-        buffer.seek(0)
+        # Same thermal receipt as download_receipt, served from the receipt cache
+        buffer = BytesIO(get_receipt_pdf(sale))
         
         # Send email using utility function with custom recipient and message
         from email_utils import send_receipt_email_to_address
         success, message = send_receipt_email_to_address(sale, buffer, recipient_email, custom_message)
         
         if success:
-            flash(f'Receipt successfully sent to {recipient_email}', 'success')
+            flash(f'Receipt queued for delivery to {recipient_email}', 'success')
         else:
             flash(f'Failed to send receipt: {message}', 'error')
         
@@ -569,7 +345,7 @@ def email_receipt(sale_id):
 @login_required
 def new_sale():
     # Clear any existing cart only (don't clear held sales)
-    session.pop('cart', None)
+    clear_stored_cart()
     
     flash('Starting new sale', 'info')
     return redirect(url_for('sales.pos'))
@@ -577,12 +353,7 @@ def new_sale():
 @sales_bp.route('/clear-all-held-sales')
 @login_required
 def clear_all_held_sales():
-    # Clear all held sales
-    held_sales_count = 0
-    for key in list(session.keys()):
-        if key.startswith('hold_'):
-            session.pop(key)
-            held_sales_count += 1
+    held_sales_count = clear_stored_held_sales(current_user.id)
     
     if held_sales_count > 0:
         flash(f'Cleared {held_sales_count} held sales', 'info')
@@ -594,28 +365,23 @@ def clear_all_held_sales():
 @sales_bp.route('/hold-sale')
 @login_required
 def hold_sale():
-    cart = session.get('cart', [])
+    cart = get_cart_lines()
     if not cart:
         flash('Cart is empty', 'error')
         return redirect(url_for('sales.pos'))
     
-    # Generate hold ID
-    hold_id = str(uuid.uuid4())[:8]
+    held_sale = hold_cart(cart, current_user.id)
+    clear_stored_cart()
     
-    # Store cart in session with hold ID
-    session[f'hold_{hold_id}'] = cart
-    session.pop('cart', None)
-    
-    flash(f'Sale held with ID: {hold_id}', 'info')
+    flash(f'Sale held with ID: {held_sale.id}', 'info')
     return redirect(url_for('sales.pos'))
 
-@sales_bp.route('/resume-sale/<hold_id>')
+@sales_bp.route('/resume-sale/<int:hold_id>')
 @login_required
 def resume_sale(hold_id):
-    held_cart = session.get(f'hold_{hold_id}')
+    held_cart = take_held_sale(hold_id, current_user.id)
     if held_cart:
-        session['cart'] = held_cart
-        session.pop(f'hold_{hold_id}', None)
+        set_cart_lines(held_cart)
         flash('Sale resumed', 'info')
     else:
         flash('Held sale not found', 'error')
@@ -630,13 +396,26 @@ def refund_sale(sale_id):
     if request.method == 'POST':
         refund_reason = request.form.get('refund_reason')
         
-        # Update sale status
-        sale.status = 'refunded'
+        # Claim the refund with a conditional UPDATE so a concurrent refund
+        # of the same sale cannot restock or adjust the rollup a second time
+        claimed = db.session.execute(
+            db.update(Sale)
+            .where(Sale.id == sale.id, Sale.status == 'completed')
+            .values(status='refunded')
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed != 1:
+            db.session.rollback()
+            flash('Only completed sales can be refunded', 'error')
+            return redirect(url_for('sales.view_sale', sale_id=sale.id))
         
-        # Restore product stock
+        # Update the daily rollup and restore product stock
+        record_refund(sale)
+        quantities = {}
         for item in sale.items:
-            product = Product.query.get(item.product_id)
-            product.stock_quantity += item.quantity
+            if item.product_id is not None:
+                quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        restock(quantities)
         
         # Log activity
         activity = UserActivityLog(
@@ -657,15 +436,10 @@ def sales_history():
     # Get 10 most recent completed sales for the table
     recent_sales = Sale.query.filter_by(status='completed').order_by(Sale.created_at.desc()).limit(10).all()
     
-    # Calculate overall statistics from all completed sales
-    all_completed_sales = Sale.query.filter_by(status='completed').all()
-    total_sales = len(all_completed_sales)
-    total_revenue = sum(sale.total_amount for sale in all_completed_sales)
-    
-    # Calculate today's sales
-    from datetime import datetime, date
-    today = date.today()
-    today_sales_count = sum(1 for sale in all_completed_sales if sale.created_at.date() == today)
+    # Overall and today's statistics from the daily rollup
+    total_sales, total_revenue = summary_totals()
+    today = business_today()
+    today_sales_count, _ = summary_totals(today, today)
     
     # Create a mock pagination object for template compatibility
     class MockPagination:
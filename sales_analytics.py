@@ -0,0 +1,238 @@
+"""
+Ad hoc sales analytics over the columnar snapshot
+
+Reads the column files written by sales_snapshot.py through ``np.memmap``,
+so a report touches only the columns it needs, pages them in from the OS
+cache and puts no load on the database. Results are as fresh as the last
+snapshot refresh.
+
+Group-bys use ``np.unique`` + ``np.bincount``, rolling windows a cumulative
+sum, and top-N ``np.argpartition``; all work on whole columns at once.
+Refunded sales are masked out using the snapshot's refunded id list.
+"""
+import os
+from datetime import timedelta, timezone
+
+import numpy as np
+
+from checkout_engine import PAYMENT_METHODS
+from sales_rollup import business_timezone, utc_bounds
+from sales_snapshot import EPOCH, read_manifest, snapshot_dir
+
+SECONDS_PER_DAY = 86400
+QUARTER_HOUR = 900
+EPOCH_DATE = EPOCH.date()
+
+_cache = {}  # directory -> (manifest mtime, SalesSnapshot)
+
+
+class SalesSnapshot:
+    """Memory-mapped columns of one snapshot manifest."""
+
+    def __init__(self, directory, manifest):
+        self.directory = directory
+        self.manifest = manifest
+        self.sales = self._map('sales', manifest['sale_columns'], manifest['sales'])
+        self.items = self._map('items', manifest['item_columns'], manifest['items'])
+        refunded_path = os.path.join(directory, 'refunded.npy')
+        self.refunded = np.load(refunded_path) if os.path.exists(refunded_path) else np.empty(0, dtype='<i8')
+
+    def _map(self, table, columns, rows):
+        if not rows:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in columns.items()}
+        return {
+            name: np.memmap(os.path.join(self.directory, table, f'{name}.bin'), dtype=dtype, mode='r', shape=(rows,))
+            for name, dtype in columns.items()
+        }
+
+    def _mask(self, columns, id_column, start, end):
+        created = columns['created_at']
+        mask = ~np.isin(columns[id_column], self.refunded)
+        if start is not None:
+            mask &= created >= start
+        if end is not None:
+            mask &= created < end
+        return mask
+
+    def sale_mask(self, start=None, end=None):
+        """Completed sales created in [start, end) (UTC epoch seconds)."""
+        return self._mask(self.sales, 'id', start, end)
+
+    def item_mask(self, start=None, end=None):
+        """Items of completed sales created in [start, end) (UTC epoch seconds)."""
+        return self._mask(self.items, 'sale_id', start, end)
+
+
+def load_snapshot(directory=None):
+    """The current snapshot, reusing the mapping until the manifest changes."""
+    directory = directory or snapshot_dir()
+    manifest_path = os.path.join(directory, 'manifest.json')
+    mtime = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else None
+
+    cached = _cache.get(directory)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    snapshot = SalesSnapshot(directory, read_manifest(directory))
+    _cache[directory] = (mtime, snapshot)
+    return snapshot
+
+
+def epoch_bounds(start_day=None, end_day=None, tz=None):
+    """UTC epoch seconds [start, end) for business days start_day..end_day; None leaves a side open."""
+    tz = tz or business_timezone()
+    start = end = None
+    if start_day:
+        start = int((utc_bounds(start_day, start_day, tz)[0] - EPOCH).total_seconds())
+    if end_day:
+        end = int((utc_bounds(end_day, end_day, tz)[1] - EPOCH).total_seconds())
+    return start, end
+
+
+def local_seconds(created_at, tz=None):
+    """
+    UTC epoch timestamps shifted to business-local wall-clock seconds.
+
+    UTC offsets are multiples of 15 minutes and change on local hour
+    boundaries, so they are looked up once per distinct quarter hour rather
+    than once per row.
+    """
+    tz = tz or business_timezone()
+    created_at = np.asarray(created_at, dtype=np.int64)
+    quarters, inverse = np.unique(created_at // QUARTER_HOUR, return_inverse=True)
+    offsets = np.array([
+        (EPOCH + timedelta(seconds=int(quarter) * QUARTER_HOUR)).replace(tzinfo=timezone.utc)
+        .astimezone(tz).utcoffset().total_seconds()
+        for quarter in quarters
+    ], dtype=np.int64)
+    return created_at + offsets[inverse]
+
+
+def business_days(created_at, tz=None):
+    """Business day of each UTC epoch timestamp, as days since 1970-01-01."""
+    return local_seconds(created_at, tz) // SECONDS_PER_DAY
+
+
+def group_sum(keys, *values):
+    """
+    Sum value columns per distinct key.
+
+    Returns:
+        tuple: (sorted distinct keys, one array of sums per value column)
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return unique, [np.bincount(inverse, weights=column, minlength=len(unique)) for column in values]
+
+
+def top_n(keys, scores, n):
+    """Indices of the n largest scores, largest first."""
+    if len(scores) <= n:
+        return np.argsort(-scores, kind='stable')
+    top = np.argpartition(-scores, n - 1)[:n]
+    return top[np.lexsort((keys[top], -scores[top]))]
+
+
+def revenue_by(by, start_day=None, end_day=None, snapshot=None):
+    """
+    Completed sales per product, cashier, payment method or business day.
+
+    Args:
+        by: 'product', 'cashier', 'payment_method' or 'day'
+        start_day, end_day: optional business days (inclusive)
+        snapshot: defaults to load_snapshot()
+
+    Returns:
+        list: dicts with key, quantity (products) or count, and revenue,
+        ordered by key
+    """
+    snapshot = snapshot or load_snapshot()
+    tz = business_timezone()
+    start, end = epoch_bounds(start_day, end_day, tz)
+
+    if by == 'product':
+        items = snapshot.items
+        mask = snapshot.item_mask(start, end)
+        keys, (quantity, revenue) = group_sum(
+            items['product_id'][mask], items['quantity'][mask], items['total_price'][mask]
+        )
+        return [
+            {'key': int(key), 'quantity': int(q), 'revenue': float(r)}
+            for key, q, r in zip(keys, quantity, revenue)
+        ]
+
+    sales = snapshot.sales
+    mask = snapshot.sale_mask(start, end)
+    if by == 'cashier':
+        keys = sales['cashier_id'][mask]
+    elif by == 'payment_method':
+        keys = sales['payment_method'][mask]
+    elif by == 'day':
+        keys = business_days(sales['created_at'][mask], tz)
+    else:
+        raise ValueError(f'Unknown grouping: {by}')
+
+    totals = sales['total_amount'][mask]
+    unique, (count, revenue) = group_sum(keys, np.ones(len(totals)), totals)
+    rows = []
+    for key, c, r in zip(unique, count, revenue):
+        if by == 'payment_method':
+            key = PAYMENT_METHODS[key] if 0 <= key < len(PAYMENT_METHODS) else None
+        elif by == 'day':
+            key = EPOCH_DATE + timedelta(days=int(key))
+        else:
+            key = int(key)
+        rows.append({'key': key, 'count': int(c), 'revenue': float(r)})
+    return rows
+
+
+def rolling_revenue(start_day, end_day, window=7, snapshot=None):
+    """
+    Daily revenue with a trailing moving average.
+
+    Days before start_day are read so the first points already average a
+    full window.
+
+    Returns:
+        list: dicts with date, revenue and average, one per business day
+    """
+    snapshot = snapshot or load_snapshot()
+    tz = business_timezone()
+    first_day = start_day - timedelta(days=window - 1)
+    start, end = epoch_bounds(first_day, end_day, tz)
+
+    mask = snapshot.sale_mask(start, end)
+    days = business_days(snapshot.sales['created_at'][mask], tz) - (first_day - EPOCH_DATE).days
+    length = (end_day - first_day).days + 1
+    daily = np.bincount(days, weights=snapshot.sales['total_amount'][mask], minlength=length)[:length]
+
+    running = np.cumsum(np.concatenate(([0.0], daily)))
+    averages = (running[window:] - running[:-window]) / window
+
+    offset = window - 1
+    return [
+        {'date': start_day + timedelta(days=i), 'revenue': float(daily[offset + i]), 'average': float(averages[i])}
+        for i in range(length - offset)
+    ]
+
+
+def top_products(n=10, start_day=None, end_day=None, by='revenue', snapshot=None):
+    """
+    The n best selling products by 'revenue' or 'quantity'.
+
+    Returns:
+        list: dicts with product_id, quantity and revenue, best first
+    """
+    if by not in ('revenue', 'quantity'):
+        raise ValueError(f'Unknown ranking: {by}')
+    snapshot = snapshot or load_snapshot()
+    start, end = epoch_bounds(start_day, end_day)
+
+    items = snapshot.items
+    mask = snapshot.item_mask(start, end)
+    keys, (quantity, revenue) = group_sum(
+        items['product_id'][mask], items['quantity'][mask], items['total_price'][mask]
+    )
+    order = top_n(keys, revenue if by == 'revenue' else quantity, n)
+    return [
+        {'product_id': int(keys[i]), 'quantity': int(quantity[i]), 'revenue': float(revenue[i])}
+        for i in order
+    ]
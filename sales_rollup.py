@@ -0,0 +1,225 @@
+"""
+Daily sales rollup for dashboards and sales history
+
+``DailySalesSummary`` holds one row per (business day, payment method,
+cashier) with the count and amounts of completed sales. Checkout, offline
+sale ingest and refunds adjust it in the same transaction as the sale, so
+dashboards read a handful of rows per day instead of every sale.
+
+Business days follow ``BusinessSettings.timezone``; ``Sale.created_at`` is
+stored in UTC. After the timezone changes, or to repair the table, run
+``flask rebuild-sales-summary``.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import click
+
+from extensions import db
+from models import BusinessSettings, DailySalesSummary, Sale
+
+# Settings values that are not IANA zone names
+TIMEZONE_ALIASES = {
+    'GMT+0': 'UTC',
+    'EST': 'America/New_York',
+    'PST': 'America/Los_Angeles',
+}
+
+SUMMARY_FIELDS = ('sales_count', 'total_amount', 'discount_amount', 'refunded_count', 'refunded_amount')
+
+
+def business_timezone(settings=None):
+    """ZoneInfo for BusinessSettings.timezone, UTC if unset or unknown."""
+    if settings is None:
+        settings = BusinessSettings.query.first()
+    name = (settings.timezone if settings else None) or 'UTC'
+    try:
+        return ZoneInfo(TIMEZONE_ALIASES.get(name, name))
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('UTC')
+
+
+def business_date(created_at, tz):
+    """Business day of a naive UTC timestamp."""
+    return created_at.replace(tzinfo=timezone.utc).astimezone(tz).date()
+
+
+def business_today(tz=None):
+    return datetime.now(tz or business_timezone()).date()
+
+
+def utc_bounds(start_day, end_day, tz):
+    """Naive UTC [start, end) covering business days start_day..end_day."""
+    start = datetime.combine(start_day, time.min, tz).astimezone(timezone.utc).replace(tzinfo=None)
+    end = datetime.combine(end_day + timedelta(days=1), time.min, tz).astimezone(timezone.utc).replace(tzinfo=None)
+    return start, end
+
+
+def _rows(deltas):
+    """Summary rows for (day, payment_method, cashier_id) -> field deltas, in key order."""
+    rows = []
+    for (day, payment_method, cashier_id), values in sorted(
+            deltas.items(), key=lambda d: (d[0][0], d[0][1] or '', d[0][2] or 0)):
+        row = {'date': day, 'payment_method': payment_method or '', 'cashier_id': cashier_id}
+        for field in SUMMARY_FIELDS:
+            value = values.get(field, 0)
+            row[field] = int(value) if field.endswith('_count') else value
+        rows.append(row)
+    return rows
+
+
+def _apply(deltas):
+    """
+    Add per-bucket deltas to the summary table with one upsert per bucket.
+
+    Buckets are written in key order so concurrent checkouts touching the
+    same buckets lock them in the same order.
+
+    Args:
+        deltas: dict of (day, payment_method, cashier_id) -> dict of field deltas
+    """
+    if not deltas:
+        return
+    rows = _rows(deltas)
+
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        table = DailySalesSummary.__table__
+        for row in rows:
+            stmt = insert(table).values(**row)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['date', 'payment_method', 'cashier_id'],
+                set_={field: table.c[field] + stmt.excluded[field] for field in SUMMARY_FIELDS}
+            ))
+        return
+
+    for row in rows:
+        result = db.session.execute(
+            db.update(DailySalesSummary)
+            .where(
+                DailySalesSummary.date == row['date'],
+                DailySalesSummary.payment_method == row['payment_method'],
+                DailySalesSummary.cashier_id == row['cashier_id']
+            )
+            .values({field: getattr(DailySalesSummary, field) + row[field] for field in SUMMARY_FIELDS})
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.execute(db.insert(DailySalesSummary), [row])
+
+
+def record_sales(sales):
+    """
+    Stage rollup updates for newly completed sales.
+
+    Args:
+        sales: iterable of objects or dicts with created_at, payment_method,
+            cashier_id, total_amount and discount_amount
+    """
+    tz = business_timezone()
+    deltas = defaultdict(lambda: defaultdict(float))
+    for sale in sales:
+        get = sale.get if isinstance(sale, dict) else lambda name: getattr(sale, name)
+        key = (business_date(get('created_at'), tz), get('payment_method'), get('cashier_id'))
+        deltas[key]['sales_count'] += 1
+        deltas[key]['total_amount'] += get('total_amount') or 0
+        deltas[key]['discount_amount'] += get('discount_amount') or 0
+    _apply(deltas)
+
+
+def record_refund(sale):
+    """Stage the rollup update for a completed sale being refunded."""
+    key = (business_date(sale.created_at, business_timezone()), sale.payment_method, sale.cashier_id)
+    _apply({key: {
+        'sales_count': -1,
+        'total_amount': -(sale.total_amount or 0),
+        'discount_amount': -(sale.discount_amount or 0),
+        'refunded_count': 1,
+        'refunded_amount': sale.total_amount or 0
+    }})
+
+
+def rebuild_summary(start_day=None, end_day=None):
+    """
+    Recompute the rollup from Sale rows, optionally for a range of business days.
+
+    Returns:
+        int: number of summary rows written
+    """
+    tz = business_timezone()
+    query = db.session.query(
+        Sale.created_at, Sale.payment_method, Sale.cashier_id,
+        Sale.total_amount, Sale.discount_amount, Sale.status
+    ).filter(Sale.status.in_(['completed', 'refunded']))
+    delete = db.delete(DailySalesSummary)
+
+    if start_day:
+        query = query.filter(Sale.created_at >= utc_bounds(start_day, start_day, tz)[0])
+        delete = delete.where(DailySalesSummary.date >= start_day)
+    if end_day:
+        query = query.filter(Sale.created_at < utc_bounds(end_day, end_day, tz)[1])
+        delete = delete.where(DailySalesSummary.date <= end_day)
+
+    deltas = defaultdict(lambda: defaultdict(float))
+    for created_at, payment_method, cashier_id, total_amount, discount_amount, status in \
+            query.execution_options(yield_per=5000):
+        if created_at is None:
+            continue
+        key = (business_date(created_at, tz), payment_method or '', cashier_id)
+        if status == 'completed':
+            deltas[key]['sales_count'] += 1
+            deltas[key]['total_amount'] += total_amount or 0
+            deltas[key]['discount_amount'] += discount_amount or 0
+        else:
+            deltas[key]['refunded_count'] += 1
+            deltas[key]['refunded_amount'] += total_amount or 0
+
+    try:
+        db.session.execute(delete.execution_options(synchronize_session=False))
+        if deltas:
+            db.session.execute(db.insert(DailySalesSummary), _rows(deltas))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(deltas)
+
+
+def summary_totals(start_day=None, end_day=None, cashier_id=None):
+    """
+    Completed sales count and revenue over business days (inclusive).
+
+    Returns:
+        tuple: (sales_count: int, total_amount: float)
+    """
+    query = db.session.query(
+        db.func.coalesce(db.func.sum(DailySalesSummary.sales_count), 0),
+        db.func.coalesce(db.func.sum(DailySalesSummary.total_amount), 0)
+    )
+    if start_day:
+        query = query.filter(DailySalesSummary.date >= start_day)
+    if end_day:
+        query = query.filter(DailySalesSummary.date <= end_day)
+    if cashier_id:
+        query = query.filter(DailySalesSummary.cashier_id == cashier_id)
+    count, amount = query.one()
+    return int(count), float(amount)
+
+
+def init_sales_rollup(app):
+    """Register the rollup rebuild command."""
+
+    @app.cli.command('rebuild-sales-summary')
+    @click.option('--start', 'start', default=None, help='First business day (YYYY-MM-DD)')
+    @click.option('--end', 'end', default=None, help='Last business day (YYYY-MM-DD)')
+    def rebuild_sales_summary_command(start, end):
+        """Recompute the daily sales rollup from Sale rows."""
+        start_day = date.fromisoformat(start) if start else None
+        end_day = date.fromisoformat(end) if end else None
+        rows = rebuild_summary(start_day, end_day)
+        print(f"Rebuilt {rows} daily sales summary rows")
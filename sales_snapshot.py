@@ -0,0 +1,299 @@
+"""
+Columnar sales snapshot for analytics
+
+Completed sales and their items are exported from the database into
+append-only column files under ``SALES_SNAPSHOT_DIR``: one raw little-endian
+array per column (``sales/<column>.bin``, ``items/<column>.bin``) plus a
+``manifest.json`` holding the row counts, dtypes and the last exported sale
+id. sales_analytics.py memory-maps the columns, so ad hoc reports read the
+files instead of the OLTP tables.
+
+Each refresh reads only sales after the last exported id, in id order and
+in batches, appends their columns and then replaces the manifest. Readers
+trust the manifest's row counts, so a refresh that dies half way leaves
+bytes past the end that the next refresh truncates. Sales whose ids were
+allocated before the watermark but committed after it (concurrent
+checkouts) are picked up by re-checking the last ``RECHECK_WINDOW`` ids.
+
+Rows are never rewritten. Refunds flip a sale's status after it has been
+exported, so the ids of refunded sales are kept in ``refunded.npy``,
+rewritten on every refresh, and masked out by the readers.
+
+Run ``flask export-sales-snapshot`` from cron, or let the report workers
+refresh it every ``SALES_SNAPSHOT_INTERVAL`` seconds.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from flask import current_app
+
+from checkout_engine import PAYMENT_METHODS
+from extensions import db
+from models import Sale, SaleItem
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+SNAPSHOT_FORMAT = 1
+EXPORT_BATCH_SIZE = 2000  # sales per query; their ids go into an IN (...) list
+RECHECK_WINDOW = 1000  # trailing sale ids re-checked for late commits
+
+# Column name -> dtype. Missing ids are -1, missing costs NaN, and
+# timestamps are UTC seconds since the epoch.
+SALE_COLUMNS = {
+    'id': '<i8',
+    'created_at': '<i8',
+    'cashier_id': '<i4',
+    'customer_id': '<i4',
+    'payment_method': '<i1',  # index into PAYMENT_METHODS
+    'total_amount': '<f8',
+    'discount_amount': '<f8',
+}
+
+ITEM_COLUMNS = {
+    'sale_id': '<i8',
+    'created_at': '<i8',  # copied from the sale so items can be bucketed alone
+    'cashier_id': '<i4',
+    'product_id': '<i4',
+    'quantity': '<i4',
+    'unit_price': '<f8',
+    'unit_cost': '<f8',
+    'total_price': '<f8',
+}
+
+EPOCH = datetime(1970, 1, 1)
+
+_refresh_lock = threading.Lock()
+_last_refresh = None  # time.monotonic() of this process's last refresh
+
+
+def snapshot_dir():
+    return current_app.config.get('SALES_SNAPSHOT_DIR') or os.path.join(os.getcwd(), 'sales_snapshot')
+
+
+def read_manifest(directory):
+    """The snapshot manifest, or an empty one if nothing was exported yet."""
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = None
+    if not manifest or manifest.get('format') != SNAPSHOT_FORMAT:
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'sales': 0,
+            'items': 0,
+            'last_sale_id': 0,
+            'sale_columns': SALE_COLUMNS,
+            'item_columns': ITEM_COLUMNS,
+            'updated_at': None,
+        }
+    return manifest
+
+
+def _write_manifest(directory, manifest):
+    path = os.path.join(directory, 'manifest.json')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _epoch_seconds(value):
+    return int((value - EPOCH).total_seconds()) if value else 0
+
+
+class _ColumnAppender:
+    """Open column files of one table, truncated to the committed row count."""
+
+    def __init__(self, directory, columns, rows):
+        os.makedirs(directory, exist_ok=True)
+        self.columns = columns
+        self.files = {}
+        for name, dtype in columns.items():
+            path = os.path.join(directory, f'{name}.bin')
+            f = open(path, 'ab')
+            f.truncate(rows * np.dtype(dtype).itemsize)  # drop an interrupted append
+            self.files[name] = f
+
+    def append(self, values):
+        for name, dtype in self.columns.items():
+            self.files[name].write(np.asarray(values[name], dtype=dtype).tobytes())
+
+    def close(self):
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+
+def _exported_ids(directory, manifest, low):
+    """Ids of exported sales at or above ``low``."""
+    if not manifest['sales']:
+        return set()
+    ids = np.memmap(os.path.join(directory, 'sales', 'id.bin'), dtype=SALE_COLUMNS['id'],
+                    mode='r', shape=(manifest['sales'],))
+    return set(ids[ids >= low].tolist())
+
+
+def _pending_ids(directory, manifest):
+    """Ids of completed sales not yet in the snapshot, ascending, as a generator of batches."""
+    last_id = manifest['last_sale_id']
+
+    # Late commits below the watermark
+    low = max(last_id - RECHECK_WINDOW, 0) + 1
+    recent = [sale_id for (sale_id,) in db.session.query(Sale.id).filter(
+        Sale.status == 'completed', Sale.id >= low, Sale.id <= last_id
+    )]
+    if recent:
+        exported = _exported_ids(directory, manifest, low)
+        late = [sale_id for sale_id in recent if sale_id not in exported]
+        for start in range(0, len(late), EXPORT_BATCH_SIZE):
+            yield late[start:start + EXPORT_BATCH_SIZE]
+
+    # Everything after it
+    while True:
+        batch = [sale_id for (sale_id,) in db.session.query(Sale.id).filter(
+            Sale.status == 'completed', Sale.id > last_id
+        ).order_by(Sale.id).limit(EXPORT_BATCH_SIZE)]
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def _export_batch(sale_ids, sales_out, items_out):
+    """Append one batch of sales and their items; returns (sales, items) written."""
+    sales = db.session.query(
+        Sale.id, Sale.created_at, Sale.cashier_id, Sale.customer_id,
+        Sale.payment_method, Sale.total_amount, Sale.discount_amount
+    ).filter(Sale.id.in_(sale_ids), Sale.status == 'completed').order_by(Sale.id).all()
+    if not sales:
+        return 0, 0
+
+    sale_columns = {name: [] for name in SALE_COLUMNS}
+    created = {}
+    cashiers = {}
+    for sale_id, created_at, cashier_id, customer_id, payment_method, total, discount in sales:
+        created[sale_id] = _epoch_seconds(created_at)
+        cashiers[sale_id] = cashier_id if cashier_id is not None else -1
+        sale_columns['id'].append(sale_id)
+        sale_columns['created_at'].append(created[sale_id])
+        sale_columns['cashier_id'].append(cashiers[sale_id])
+        sale_columns['customer_id'].append(customer_id if customer_id is not None else -1)
+        sale_columns['payment_method'].append(
+            PAYMENT_METHODS.index(payment_method) if payment_method in PAYMENT_METHODS else -1
+        )
+        sale_columns['total_amount'].append(total or 0.0)
+        sale_columns['discount_amount'].append(discount or 0.0)
+
+    items = db.session.query(
+        SaleItem.sale_id, SaleItem.product_id, SaleItem.quantity,
+        SaleItem.unit_price, SaleItem.unit_cost, SaleItem.total_price
+    ).filter(SaleItem.sale_id.in_(list(created))).order_by(SaleItem.sale_id, SaleItem.id).all()
+
+    item_columns = {name: [] for name in ITEM_COLUMNS}
+    for sale_id, product_id, quantity, unit_price, unit_cost, total_price in items:
+        item_columns['sale_id'].append(sale_id)
+        item_columns['created_at'].append(created[sale_id])
+        item_columns['cashier_id'].append(cashiers[sale_id])
+        item_columns['product_id'].append(product_id if product_id is not None else -1)
+        item_columns['quantity'].append(quantity)
+        item_columns['unit_price'].append(unit_price)
+        item_columns['unit_cost'].append(unit_cost if unit_cost is not None else np.nan)
+        item_columns['total_price'].append(total_price)
+
+    items_out.append(item_columns)
+    sales_out.append(sale_columns)
+    return len(sales), len(items)
+
+
+def refresh_snapshot(directory=None):
+    """
+    Append sales completed since the last refresh to the snapshot.
+
+    Only one refresh runs at a time per snapshot directory; a concurrent
+    call returns None immediately.
+
+    Returns:
+        dict: the new manifest, or None if another refresh was running
+    """
+    directory = directory or snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        elif not _refresh_lock.acquire(blocking=False):
+            return None
+
+        try:
+            manifest = read_manifest(directory)
+            sales_out = _ColumnAppender(os.path.join(directory, 'sales'), SALE_COLUMNS, manifest['sales'])
+            items_out = _ColumnAppender(os.path.join(directory, 'items'), ITEM_COLUMNS, manifest['items'])
+            try:
+                for batch in _pending_ids(directory, manifest):
+                    sales, items = _export_batch(batch, sales_out, items_out)
+                    manifest['sales'] += sales
+                    manifest['items'] += items
+                    manifest['last_sale_id'] = max(manifest['last_sale_id'], batch[-1])
+            finally:
+                sales_out.close()
+                items_out.close()
+
+            refunded = [sale_id for (sale_id,) in db.session.query(Sale.id).filter(
+                Sale.status == 'refunded', Sale.id <= manifest['last_sale_id']
+            )]
+            refunded_path = os.path.join(directory, 'refunded.npy')
+            with open(f'{refunded_path}.tmp', 'wb') as f:
+                np.save(f, np.array(sorted(refunded), dtype='<i8'))
+            os.replace(f'{refunded_path}.tmp', refunded_path)
+
+            manifest['updated_at'] = datetime.utcnow().isoformat()
+            _write_manifest(directory, manifest)
+            db.session.commit()  # end the read transaction
+            return manifest
+        finally:
+            if fcntl is None:
+                _refresh_lock.release()
+
+
+def maybe_refresh_snapshot():
+    """Refresh the snapshot if SALES_SNAPSHOT_INTERVAL has passed in this process."""
+    global _last_refresh
+    interval = current_app.config.get('SALES_SNAPSHOT_INTERVAL', 300)
+    if interval <= 0:
+        return
+    if _last_refresh is not None and time.monotonic() - _last_refresh < interval:
+        return
+    _last_refresh = time.monotonic()
+    try:
+        refresh_snapshot()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not refresh sales snapshot: {str(e)}")
+
+
+def init_sales_snapshot(app):
+    """Register the snapshot export command."""
+
+    @app.cli.command('export-sales-snapshot')
+    def export_sales_snapshot_command():
+        """Append new completed sales to the columnar snapshot."""
+        manifest = refresh_snapshot()
+        if manifest is None:
+            print("Another snapshot refresh is running")
+            return
+        print(f"Snapshot has {manifest['sales']} sales and {manifest['items']} items "
+              f"up to sale #{manifest['last_sale_id']}")
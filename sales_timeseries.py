@@ -0,0 +1,146 @@
+"""
+Sales time series for dashboards and charts
+
+``sales_series`` answers with a single ``GROUP BY`` query and fills empty
+buckets in Python. Day and week buckets are summed from the daily rollup
+(``DailySalesSummary``); hour buckets come from ``Sale`` rows grouped by
+business-local hour. PostgreSQL converts ``created_at`` to the business
+timezone before truncating. SQLite has no timezone data, so it groups by
+UTC quarter hour: every timezone offset is a whole number of quarter hours,
+so each quarter hour lies within one local hour and is shifted and merged
+in Python.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+from extensions import db
+from models import DailySalesSummary, Sale
+from sales_rollup import business_timezone, utc_bounds
+
+GRANULARITIES = ('hour', 'day', 'week')
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _bucket_expression(granularity, dialect, tz):
+    """SQL expression for the bucket, or None to bucket in Python."""
+    if granularity == 'day':
+        return DailySalesSummary.date
+    if granularity == 'week':
+        if dialect == 'postgresql':
+            return db.cast(db.func.date_trunc('week', DailySalesSummary.date), db.Date)
+        if dialect == 'sqlite':
+            # Monday of the week: next Sunday (or today), minus six days
+            return db.func.date(DailySalesSummary.date, 'weekday 0', '-6 days')
+        return None
+    if dialect == 'postgresql':
+        # naive UTC -> naive business-local time, then the local hour
+        local = db.func.timezone(tz.key, db.func.timezone('UTC', Sale.created_at))
+        return db.func.date_trunc('hour', local)
+    if dialect == 'sqlite':
+        quarter = db.cast(db.func.strftime('%M', Sale.created_at), db.Integer) / 15 * 15
+        return db.func.printf('%s:%02d:00', db.func.strftime('%Y-%m-%d %H', Sale.created_at), quarter)
+    return None
+
+
+def _grouped_rows(start_day, end_day, granularity, tz, dialect):
+    """(bucket, count, revenue, discount) rows from one grouped query."""
+    bucket = _bucket_expression(granularity, dialect, tz)
+
+    if granularity == 'hour':
+        start, end = utc_bounds(start_day, end_day, tz)
+        filters = (Sale.status == 'completed', Sale.created_at >= start, Sale.created_at < end)
+        measures = (db.func.count(Sale.id), db.func.sum(Sale.total_amount), db.func.sum(Sale.discount_amount))
+        if bucket is None:
+            bucket = Sale.created_at
+    else:
+        filters = (DailySalesSummary.date >= start_day, DailySalesSummary.date <= end_day)
+        measures = (
+            db.func.sum(DailySalesSummary.sales_count),
+            db.func.sum(DailySalesSummary.total_amount),
+            db.func.sum(DailySalesSummary.discount_amount)
+        )
+        if bucket is None:
+            bucket = DailySalesSummary.date
+
+    return db.session.query(bucket, *measures).filter(*filters).group_by(bucket).all()
+
+
+def sales_series(start_day, end_day, granularity='day'):
+    """
+    Completed sales per bucket between two business days (inclusive).
+
+    Args:
+        start_day: first business day
+        end_day: last business day
+        granularity: 'hour', 'day' or 'week' (weeks start on Monday)
+
+    Returns:
+        list: dicts with bucket (date, or local datetime for hours), count,
+        revenue, discount and average, one per bucket in order
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    tz = business_timezone()
+    dialect = db.engine.dialect.name
+
+    totals = {}
+    for bucket, count, revenue, discount in _grouped_rows(start_day, end_day, granularity, tz, dialect):
+        if granularity == 'hour':
+            bucket = _as_datetime(bucket)
+            if dialect != 'postgresql':
+                # UTC quarter hour or timestamp -> business-local time
+                bucket = bucket.replace(tzinfo=timezone.utc).astimezone(tz).replace(tzinfo=None)
+            bucket = bucket.replace(minute=0, second=0, microsecond=0)
+        elif granularity == 'week':
+            bucket = _week_start(_as_date(bucket))
+        else:
+            bucket = _as_date(bucket)
+        current = totals.setdefault(bucket, [0, 0.0, 0.0])
+        current[0] += int(count or 0)
+        current[1] += float(revenue or 0)
+        current[2] += float(discount or 0)
+
+    if granularity == 'hour':
+        bucket = datetime.combine(start_day, datetime.min.time())
+        last = datetime.combine(end_day, datetime.min.time()) + timedelta(hours=23)
+        step = timedelta(hours=1)
+    elif granularity == 'week':
+        bucket, last, step = _week_start(start_day), end_day, timedelta(days=7)
+    else:
+        bucket, last, step = start_day, end_day, timedelta(days=1)
+
+    series = []
+    while bucket <= last:
+        count, revenue, discount = totals.get(bucket, (0, 0.0, 0.0))
+        series.append({
+            'bucket': bucket,
+            'count': count,
+            'revenue': revenue,
+            'discount': discount,
+            'average': revenue / count if count else 0.0
+        })
+        bucket += step
+    return series
+
+
+def bucket_label(bucket, granularity):
+    """Chart label for a bucket."""
+    if granularity == 'hour':
+        return bucket.strftime('%Y-%m-%d %H:00')
+    return bucket.strftime('%Y-%m-%d')
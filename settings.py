@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from functools import wraps
 from models import db, BusinessSettings, User, UserActivityLog, BackupLog
+from sales_rollup import rebuild_summary
 from datetime import datetime
 import os
 import json
@@ -93,6 +94,7 @@ def update_system_settings():
         db.session.add(settings)
     
     # Update system settings
+    previous_timezone = settings.timezone
     settings.timezone = request.form.get('timezone', 'UTC')
     settings.date_format = request.form.get('date_format', 'DD/MM/YYYY')
     settings.decimal_places = int(request.form.get('decimal_places', 2))
@@ -116,6 +118,10 @@ def update_system_settings():
     
     db.session.commit()
     
+    # Business days moved: re-bucket the daily sales rollup
+    if settings.timezone != previous_timezone:
+        rebuild_summary()
+    
     # Log activity
     activity = UserActivityLog(
         user_id=current_user.id,
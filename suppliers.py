@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from extensions import db
 from models import Supplier, PurchaseOrder, PurchaseItem, Product, UserActivityLog
+from product_index import invalidate_scan_index
 from datetime import datetime
 from functools import wraps
 
@@ -223,6 +224,7 @@ def receive_purchase_order(order_id):
         )
         db.session.add(activity)
         db.session.commit()
+        invalidate_scan_index()
         
         flash('Purchase order received successfully!', 'success')
     
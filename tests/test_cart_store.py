@@ -0,0 +1,58 @@
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app
+from cart_store import DatabaseCartStore, _from_lines, purge_expired_carts
+from extensions import db
+from models import CartSession
+
+
+@pytest.fixture
+def store():
+    with app.test_request_context():
+        db.create_all()
+        yield DatabaseCartStore()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_from_lines_normalises_client_lines():
+    cart = _from_lines([{'product_id': '3', 'name': 'Tea', 'price': '2.5', 'quantity': '4', 'total': 'x'}])
+    assert cart == {3: {'product_id': 3, 'name': 'Tea', 'price': 2.5, 'quantity': 4, 'total': 10.0}}
+
+
+@pytest.mark.parametrize('line', [
+    {'product_id': 'abc', 'price': 1, 'quantity': 1},
+    {'product_id': 1, 'price': 'nan', 'quantity': 1},
+    {'product_id': 1, 'price': -1, 'quantity': 1},
+    {'product_id': 1, 'price': 1, 'quantity': 0},
+    {'product_id': 1, 'price': 1},
+])
+def test_from_lines_rejects_malformed_lines(line):
+    assert _from_lines([line]) == {}
+    with pytest.raises(ValueError):
+        _from_lines([line], strict=True)
+
+
+def test_save_replaces_existing_cart(store):
+    store.save('t1', _from_lines([{'product_id': 1, 'price': 2, 'quantity': 1}]))
+    store.save('t1', _from_lines([{'product_id': 2, 'price': 3, 'quantity': 2}]))
+
+    assert CartSession.query.count() == 1
+    assert list(store.load('t1')) == [2]
+
+
+def test_expired_carts_are_ignored_and_purged(store):
+    store.save('old', _from_lines([{'product_id': 1, 'price': 2, 'quantity': 1}]))
+    store.save('new', _from_lines([{'product_id': 1, 'price': 2, 'quantity': 1}]))
+    db.session.get(CartSession, 'old').updated_at = datetime.utcnow() - timedelta(days=2)
+    db.session.commit()
+
+    assert store.load('old') == {}
+    assert purge_expired_carts() == 1
+    assert [row.id for row in CartSession.query] == ['new']
@@ -0,0 +1,68 @@
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+
+import pytest
+
+from app import app
+from checkout_engine import process_sale_batch
+from extensions import db
+from models import Product, Sale, SaleItem, User
+
+
+@pytest.fixture
+def products():
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='cashier', email='cashier@pos.com', role='cashier'))
+        items = [
+            Product(name=f'Product {i}', sku=f'SKU{i}', price=10.0 + i, cost_price=5.0, stock_quantity=20)
+            for i in range(3)
+        ]
+        db.session.add_all(items)
+        db.session.commit()
+        yield [product.id for product in items]
+        db.session.remove()
+        db.drop_all()
+
+
+def test_ingest_sales_stores_each_sales_own_items(products):
+    p0, p1, p2 = products
+    results = process_sale_batch([
+        {'idempotency_key': 'a', 'payment_method': 'cash',
+         'items': [{'product_id': p0, 'quantity': 1, 'price': 10}]},
+        {'idempotency_key': 'b', 'payment_method': 'card',
+         'items': [{'product_id': p1, 'quantity': 2, 'price': 11}, {'product_id': p2, 'quantity': 3, 'price': 12}]},
+        {'idempotency_key': 'c', 'payment_method': 'cash',
+         'items': [{'product_id': p2, 'quantity': 1, 'price': 12}]},
+    ], cashier_id=1)
+
+    assert [result['status'] for result in results] == ['created'] * 3
+    stored = {
+        sale.client_ref: sorted((item.product_id, item.quantity) for item in
+                                SaleItem.query.filter_by(sale_id=sale.id))
+        for sale in Sale.query
+    }
+    assert stored == {
+        'a': [(p0, 1)],
+        'b': [(p1, 2), (p2, 3)],
+        'c': [(p2, 1)],
+    }
+    assert [db.session.get(Product, pid).stock_quantity for pid in products] == [19, 18, 16]
+    assert {sale.client_ref: sale.total_amount for sale in Sale.query} == {'a': 10, 'b': 58, 'c': 12}
+
+
+@pytest.mark.parametrize('price', ['abc', 'nan', 'inf', -1])
+def test_ingest_sales_rejects_bad_price_per_sale(products, price):
+    p0, p1, _ = products
+    results = process_sale_batch([
+        {'idempotency_key': 'bad', 'payment_method': 'cash',
+         'items': [{'product_id': p0, 'quantity': 1, 'price': price}]},
+        {'idempotency_key': 'good', 'payment_method': 'cash',
+         'items': [{'product_id': p1, 'quantity': 1, 'price': 11}]},
+    ], cashier_id=1)
+
+    assert results[0]['status'] == 'rejected'
+    assert results[0]['error'] == 'Invalid price for Product 0'
+    assert results[1]['status'] == 'created'
+    assert [sale.client_ref for sale in Sale.query] == ['good']
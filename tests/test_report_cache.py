@@ -0,0 +1,53 @@
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+
+import pytest
+
+from app import app
+from extensions import db
+from models import Product
+from report_cache import cached_report, current_version
+
+
+@pytest.fixture
+def context():
+    with app.app_context():
+        db.create_all()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+def test_committed_write_bumps_version_after_commit(context):
+    assert current_version() == 0
+    db.session.add(Product(name='Tea', sku='TEA', price=2.0, cost_price=1.0, stock_quantity=5))
+    db.session.commit()
+    assert current_version() == 1
+
+    db.session.execute(db.update(Product).values(stock_quantity=4))
+    db.session.commit()
+    assert current_version() == 2
+
+
+def test_rolled_back_write_does_not_bump(context):
+    db.session.add(Product(name='Tea', sku='TEA', price=2.0, cost_price=1.0, stock_quantity=5))
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert current_version() == 0
+
+
+def test_cached_report_recomputes_after_write(context):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return Product.query.count()
+
+    assert cached_report('test-count', (), compute) == 0
+    assert cached_report('test-count', (), compute) == 0
+    db.session.add(Product(name='Tea', sku='TEA', price=2.0, cost_price=1.0, stock_quantity=5))
+    db.session.commit()
+    assert cached_report('test-count', (), compute) == 1
+    assert len(calls) == 2
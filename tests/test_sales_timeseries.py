@@ -0,0 +1,37 @@
+import os
+
+os.environ['FLASK_ENV'] = 'testing'
+
+from datetime import date, datetime
+
+import pytest
+
+from app import app
+from extensions import db
+from models import BusinessSettings, Sale
+from sales_timeseries import sales_series
+
+
+@pytest.fixture
+def kolkata():
+    with app.app_context():
+        db.create_all()
+        db.session.add(BusinessSettings(timezone='Asia/Kolkata'))
+        db.session.commit()
+        yield
+        db.session.remove()
+        db.drop_all()
+
+
+def test_hour_buckets_follow_half_hour_offset(kolkata):
+    # 00:20 and 00:40 UTC are 05:50 and 06:10 in Kolkata
+    for minute, amount in ((20, 10.0), (40, 15.0)):
+        db.session.add(Sale(total_amount=amount, discount_amount=0, payment_method='cash',
+                            status='completed', created_at=datetime(2026, 3, 2, 0, minute)))
+    db.session.commit()
+
+    series = {point['bucket']: point['revenue'] for point in sales_series(date(2026, 3, 2), date(2026, 3, 2), 'hour')}
+    assert len(series) == 24
+    assert series[datetime(2026, 3, 2, 5)] == 10.0
+    assert series[datetime(2026, 3, 2, 6)] == 15.0
+    assert sum(series.values()) == 25.0